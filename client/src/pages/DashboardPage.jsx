@@ -5,7 +5,7 @@ import api from '../services/api';
 const DashboardPage = ({ onNavigate, onViewAnalysis }) => {
   const [papers, setPapers] = useState([]);
   const [searchTerm, setSearchTerm] = useState('');
-  const [backendDocs, setBackendDocs] = useState([]);
+  const [backendDocCount, setBackendDocCount] = useState(0);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -22,9 +22,10 @@ const DashboardPage = ({ onNavigate, onViewAnalysis }) => {
 
   const loadBackendDocuments = async () => {
     try {
-      const response = await api.listDocuments();
+      // Only the total is shown, so a one-item page is enough
+      const response = await api.listDocuments({ limit: 1 });
       if (response.success) {
-        setBackendDocs(response.documents || []);
+        setBackendDocCount(response.total ?? response.count ?? 0);
       }
     } catch (error) {
       console.error('Failed to load backend documents:', error);
@@ -120,7 +121,7 @@ const DashboardPage = ({ onNavigate, onViewAnalysis }) => {
               <h1 className="text-4xl font-bold text-gray-900 mb-2">My Research Papers</h1>
               <p className="text-gray-600">
                 {papers.length} paper{papers.length !== 1 ? 's' : ''} analyzed
-                {backendDocs.length > 0 && ` • ${backendDocs.length} in backend`}
+                {backendDocCount > 0 && ` • ${backendDocCount} in backend`}
               </p>
             </div>
             <div className="flex items-center gap-4">
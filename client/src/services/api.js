@@ -1,12 +1,64 @@
 // client/src/services/api.js
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
+// How long a cached GET is reused without asking the server at all (ms)
+const STATUS_TTL = 5000;
+const LIST_TTL = 2000;
+
+// GET responses by URL. Concurrent callers share one request, a fresh entry is
+// served from memory, and a stale one is revalidated with its ETag, so an
+// unchanged list comes back as an empty 304 instead of the full JSON.
+class RequestCache {
+  constructor() {
+    this.entries = new Map();
+    this.inFlight = new Map();
+  }
+
+  // Resolves to { ok, status, data }; only successful responses are cached
+  get(url, ttl = 0) {
+    const entry = this.entries.get(url);
+    if (entry && Date.now() - entry.time < ttl) {
+      return Promise.resolve({ ok: true, status: 200, data: entry.data });
+    }
+    if (this.inFlight.has(url)) {
+      return this.inFlight.get(url);
+    }
+    const request = this.fetch(url, entry).finally(() => this.inFlight.delete(url));
+    this.inFlight.set(url, request);
+    return request;
+  }
+
+  async fetch(url, entry) {
+    const headers = entry?.etag ? { 'If-None-Match': entry.etag } : {};
+    // Bypass the browser's HTTP cache so the 304 reaches us rather than being resolved behind our back
+    const response = await fetch(url, { headers, cache: 'no-store' });
+    if (response.status === 304 && entry) {
+      entry.time = Date.now();
+      return { ok: true, status: 200, data: entry.data };
+    }
+    const data = await response.json();
+    if (response.ok) {
+      this.entries.set(url, { data, etag: response.headers.get('ETag'), time: Date.now() });
+    }
+    return { ok: response.ok, status: response.status, data };
+  }
+
+  // After a write: the next read asks the server again (still with its ETag)
+  expire() {
+    this.entries.forEach((entry) => {
+      entry.time = 0;
+    });
+  }
+}
+
+const requestCache = new RequestCache();
+
 class ApiService {
   // Health check
   async checkHealth() {
     try {
-      const response = await fetch(`${API_BASE_URL}/health`);
-      return await response.json();
+      const response = await requestCache.get(`${API_BASE_URL}/health`, STATUS_TTL);
+      return response.data;
     } catch (error) {
       console.error('Health check failed:', error);
       throw error;
@@ -16,8 +68,8 @@ class ApiService {
   // Check Ollama status
   async checkOllamaStatus() {
     try {
-      const response = await fetch(`${API_BASE_URL}/ollama-status`);
-      return await response.json();
+      const response = await requestCache.get(`${API_BASE_URL}/ollama-status`, STATUS_TTL);
+      return response.data;
     } catch (error) {
       console.error('Ollama status check failed:', error);
       throw error;
@@ -43,6 +95,7 @@ class ApiService {
         throw new Error(error.detail || 'PDF analysis failed');
       }
 
+      requestCache.expire();
       return await response.json();
     } catch (error) {
       console.error('PDF analysis error:', error);
@@ -69,6 +122,7 @@ class ApiService {
         throw new Error(error.detail || 'Image analysis failed');
       }
 
+      requestCache.expire();
       return await response.json();
     } catch (error) {
       console.error('Image analysis error:', error);
@@ -99,32 +153,138 @@ class ApiService {
     }
   }
 
-  // List all documents
-  async listDocuments() {
+  // Ask a question across every stored paper (or just docIds); answer cites papers as [n]
+  async askCorpus(question, maxPapers = 4, { docIds, contentType } = {}) {
+    try {
+      const formData = new FormData();
+      formData.append('question', question);
+      formData.append('max_papers', maxPapers);
+      (docIds || []).forEach((id) => formData.append('doc_ids', id));
+      if (contentType) formData.append('content_type', contentType);
+
+      const response = await fetch(`${API_BASE_URL}/ask-corpus`, {
+        method: 'POST',
+        body: formData,
+      });
+
+      if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.detail || 'Corpus question failed');
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Corpus question error:', error);
+      throw error;
+    }
+  }
+
+  // Keyword search; filters: { docIds, addedAfter, addedBefore, contentType, classification }
+  async search(query, { topK = 5, mode = 'documents', docIds, addedAfter, addedBefore, contentType, classification } = {}) {
     try {
-      const response = await fetch(`${API_BASE_URL}/documents`);
+      const params = new URLSearchParams({ q: query, top_k: topK, mode });
+      (docIds || []).forEach((id) => params.append('doc_id', id));
+      if (addedAfter) params.set('added_after', addedAfter);
+      if (addedBefore) params.set('added_before', addedBefore);
+      if (contentType) params.set('content_type', contentType);
+      if (classification) params.set('classification', classification);
+      const response = await fetch(`${API_BASE_URL}/search?${params.toString()}`);
+
+      if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.detail || 'Search failed');
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Search error:', error);
+      throw error;
+    }
+  }
+
+  // Import a RIS/BibTeX/EndNote export into the citation index
+  async importCitations(file) {
+    try {
+      const formData = new FormData();
+      formData.append('file', file);
+
+      const response = await fetch(`${API_BASE_URL}/citations/import`, {
+        method: 'POST',
+        body: formData,
+      });
+
+      if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.detail || 'Citation import failed');
+      }
+
+      requestCache.expire();
+      return await response.json();
+    } catch (error) {
+      console.error('Citation import error:', error);
+      throw error;
+    }
+  }
+
+  // Look up citation records: { author, year, yearFrom, yearTo, doi, title, limit }
+  async searchCitations({ author, year, yearFrom, yearTo, doi, title, limit } = {}) {
+    try {
+      const params = new URLSearchParams();
+      if (author) params.set('author', author);
+      if (year) params.set('year', year);
+      if (yearFrom) params.set('year_from', yearFrom);
+      if (yearTo) params.set('year_to', yearTo);
+      if (doi) params.set('doi', doi);
+      if (title) params.set('title', title);
+      if (limit) params.set('limit', limit);
+      const response = await fetch(`${API_BASE_URL}/citations/search?${params.toString()}`);
+
+      if (!response.ok) {
+        const error = await response.json();
+        throw new Error(error.detail || 'Citation search failed');
+      }
+
+      return await response.json();
+    } catch (error) {
+      console.error('Citation search error:', error);
+      throw error;
+    }
+  }
+
+  // List documents; pass { limit, cursor } to page through large corpora
+  async listDocuments({ limit, cursor } = {}) {
+    try {
+      const params = new URLSearchParams();
+      if (limit) params.set('limit', limit);
+      if (cursor) params.set('cursor', cursor);
+      const query = params.toString();
+      const response = await requestCache.get(`${API_BASE_URL}/documents${query ? `?${query}` : ''}`, LIST_TTL);
       
       if (!response.ok) {
         throw new Error('Failed to fetch documents');
       }
 
-      return await response.json();
+      return response.data;
     } catch (error) {
       console.error('List documents error:', error);
       throw error;
     }
   }
 
-  // Get paper overview
-  async getPaperOverview() {
+  // Get paper overview; pass { limit, cursor } to page through the per-paper stats
+  async getPaperOverview({ limit, cursor } = {}) {
     try {
-      const response = await fetch(`${API_BASE_URL}/paper-overview`);
+      const params = new URLSearchParams();
+      if (limit) params.set('limit', limit);
+      if (cursor) params.set('cursor', cursor);
+      const query = params.toString();
+      const response = await requestCache.get(`${API_BASE_URL}/paper-overview${query ? `?${query}` : ''}`, LIST_TTL);
       
       if (!response.ok) {
         throw new Error('Failed to fetch paper overview');
       }
 
-      return await response.json();
+      return response.data;
     } catch (error) {
       console.error('Paper overview error:', error);
       throw error;
@@ -0,0 +1,244 @@
+import os
+import json
+import mmap
+import shutil
+import struct
+import hashlib
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, List
+
+import numpy as np
+
+ARCHIVE_FORMAT = 1
+MAGIC = b"RPASNAP\n"
+ALIGNMENT = 64
+# Trailer: manifest length, manifest sha256, magic
+_TRAILER = struct.Struct("<Q32s8s")
+
+
+class ArchiveError(ValueError):
+    """The file is not a snapshot archive, is truncated, or fails its checksums"""
+
+
+class ArchiveWriter:
+    """Writes a versioned, checksummed archive of named sections.
+
+    Sections are laid out back to back, each starting on a 64-byte boundary,
+    and described by a JSON manifest at the end of the file (offset, length,
+    sha256 and, for arrays, dtype and shape). Arrays are stored raw in native
+    layout, so a reader can map the file and use them without copying or
+    parsing. The file is written under a temporary name and renamed into
+    place by :meth:`close`, so a partially written archive is never seen.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tmp_path = path + ".tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(MAGIC)
+        self._sections: List[Dict] = []
+        # Extra manifest fields, merged with those given to close()
+        self.meta: Dict[str, Any] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            os.remove(self._tmp_path)
+
+    def _pad(self):
+        remainder = self._file.tell() % ALIGNMENT
+        if remainder:
+            self._file.write(b"\x00" * (ALIGNMENT - remainder))
+
+    def add_stream(self, name: str, source: BinaryIO, length: int = None, **info) -> Dict:
+        """Copy a section from a file object (up to length bytes), hashing as it goes"""
+        self._pad()
+        offset = self._file.tell()
+        digest = hashlib.sha256()
+        remaining = length
+        while remaining is None or remaining > 0:
+            block = source.read(1 << 20 if remaining is None else min(1 << 20, remaining))
+            if not block:
+                break
+            digest.update(block)
+            self._file.write(block)
+            if remaining is not None:
+                remaining -= len(block)
+        section = {"name": name, "kind": "bytes", "offset": offset, "length": self._file.tell() - offset,
+                   "sha256": digest.hexdigest(), **info}
+        self._sections.append(section)
+        return section
+
+    def add_bytes(self, name: str, data: bytes, **info) -> Dict:
+        self._pad()
+        section = {"name": name, "kind": "bytes", "offset": self._file.tell(), "length": len(data),
+                   "sha256": hashlib.sha256(data).hexdigest(), **info}
+        self._file.write(data)
+        self._sections.append(section)
+        return section
+
+    def add_json(self, name: str, value: Any) -> Dict:
+        section = self.add_bytes(name, json.dumps(value).encode("utf-8"))
+        section["kind"] = "json"
+        return section
+
+    def add_array(self, name: str, array: np.ndarray) -> Dict:
+        array = np.ascontiguousarray(array)
+        section = self.add_bytes(name, array.tobytes())
+        section.update(kind="array", dtype=array.dtype.str, shape=list(array.shape))
+        return section
+
+    def add_group(self, prefix: str, values: Dict[str, Any]):
+        """Store a dict as sections "<prefix>/<key>": arrays raw, anything else as JSON"""
+        for key, value in values.items():
+            if isinstance(value, np.ndarray):
+                self.add_array(f"{prefix}/{key}", value)
+            else:
+                self.add_json(f"{prefix}/{key}", value)
+
+    def close(self, **meta):
+        """Write the manifest (with any extra metadata) and move the archive into place"""
+        manifest = json.dumps({
+            "format": ARCHIVE_FORMAT,
+            "created": datetime.now().isoformat(),
+            **self.meta,
+            **meta,
+            "sections": self._sections,
+        }).encode("utf-8")
+        self._file.write(manifest)
+        self._file.write(_TRAILER.pack(len(manifest), hashlib.sha256(manifest).digest(), MAGIC))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+
+class ArchiveReader:
+    """Memory-mapped view of an archive written by :class:`ArchiveWriter`.
+
+    Opening checks the magic, the format version and the manifest checksum;
+    section checksums are checked by :meth:`verify` (every byte is read) or
+    per section with ``verify=True``. :meth:`array` returns read-only NumPy
+    views straight onto the mapping, so pages are only read when touched.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._file.close()
+            raise ArchiveError(f"{path} is empty")
+        try:
+            self.manifest = self._read_manifest()
+        except ArchiveError:
+            self.close()
+            raise
+        self.sections = {section["name"]: section for section in self.manifest["sections"]}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read_manifest(self) -> Dict:
+        size = len(self._map)
+        if size < len(MAGIC) + _TRAILER.size or self._map[:len(MAGIC)] != MAGIC:
+            raise ArchiveError(f"{self.path} is not a snapshot archive")
+        length, digest, magic = _TRAILER.unpack_from(self._map, size - _TRAILER.size)
+        start = size - _TRAILER.size - length
+        if magic != MAGIC or start < len(MAGIC):
+            raise ArchiveError(f"{self.path} is truncated")
+        manifest = self._map[start:start + length]
+        if hashlib.sha256(manifest).digest() != digest:
+            raise ArchiveError(f"{self.path}: manifest checksum mismatch")
+        manifest = json.loads(manifest)
+        if manifest.get("format") != ARCHIVE_FORMAT:
+            raise ArchiveError(f"{self.path}: unsupported archive format {manifest.get('format')!r}")
+        return manifest
+
+    def close(self):
+        if getattr(self, "_map", None) is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # NumPy views still reference the mapping; it is released with them
+                pass
+            self._map = None
+        self._file.close()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sections
+
+    def _section(self, name: str, verify: bool = False) -> Dict:
+        section = self.sections.get(name)
+        if section is None:
+            raise KeyError(name)
+        if verify:
+            self._check(section)
+        return section
+
+    def _check(self, section: Dict):
+        view = memoryview(self._map)[section["offset"]:section["offset"] + section["length"]]
+        try:
+            if hashlib.sha256(view).hexdigest() != section["sha256"]:
+                raise ArchiveError(f"{self.path}: section {section['name']!r} checksum mismatch")
+        finally:
+            view.release()
+
+    def verify(self):
+        """Check every section's checksum; raises ArchiveError on the first mismatch"""
+        for section in self.manifest["sections"]:
+            self._check(section)
+
+    def bytes(self, name: str, verify: bool = False) -> bytes:
+        section = self._section(name, verify)
+        return self._map[section["offset"]:section["offset"] + section["length"]]
+
+    def json(self, name: str, verify: bool = False) -> Any:
+        return json.loads(self.bytes(name, verify))
+
+    def array(self, name: str, verify: bool = False) -> np.ndarray:
+        section = self._section(name, verify)
+        dtype = np.dtype(section["dtype"])
+        count = section["length"] // dtype.itemsize
+        return np.frombuffer(self._map, dtype=dtype, count=count, offset=section["offset"]).reshape(section["shape"])
+
+    def group(self, prefix: str, verify: bool = False) -> Dict[str, Any]:
+        """Inverse of :meth:`ArchiveWriter.add_group`"""
+        values = {}
+        for name, section in self.sections.items():
+            if name.startswith(prefix + "/"):
+                key = name[len(prefix) + 1:]
+                values[key] = self.array(name, verify) if section["kind"] == "array" else self.json(name, verify)
+        return values
+
+    def copy_to(self, name: str, destination: BinaryIO, verify: bool = False):
+        """Stream a section's bytes into a file object"""
+        section = self._section(name, verify)
+        view = memoryview(self._map)[section["offset"]:section["offset"] + section["length"]]
+        try:
+            shutil.copyfileobj(_MemoryReader(view), destination, 1 << 20)
+        finally:
+            view.release()
+
+
+class _MemoryReader:
+    """Minimal file-like reader over a memoryview, for shutil.copyfileobj"""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size < 0 else min(len(self._view), self._pos + size)
+        block = self._view[self._pos:end].tobytes()
+        self._pos = end
+        return block
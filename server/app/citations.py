@@ -0,0 +1,462 @@
+import re
+import heapq
+import unicodedata
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from app.shared_store import SharedStore
+
+# Prepended by PDFProcessor to text recognised as a citation export
+CITATION_PREAMBLE = "This appears to be a citation file containing bibliographic metadata."
+CITATION_EXTENSIONS = ('.ris', '.bib', '.enw', '.ciw')
+
+_RIS_TAG = re.compile(r"^([A-Z][A-Z0-9])  ?-(?: (.*))?$")
+_BIBTEX_START = re.compile(r"^\s*@\s*(\w+)\s*[{(]")
+_ENDNOTE_TAG = re.compile(r"^%([A-Z0-9@!#$&()*+^~>])\s(.*)$")
+# Line-anchored markers only: a paper that merely mentions "author:" is not a citation export
+_CITATION_LINE = re.compile(
+    r"^(?:[A-Z][A-Z0-9]  ?- |\s*@\s*(?:article|book|inproceedings|incollection|misc|techreport|phdthesis)\s*[{(]"
+    r"|%[0ATDJ] |\s*(?:author|title|journal|year)\s*=|(?:author|title|journal)\s*:)",
+    re.IGNORECASE | re.MULTILINE,
+)
+_YEAR = re.compile(r"\b(1[5-9]\d\d|20\d\d)\b")
+_DOI = re.compile(r"\b(10\.\d{4,9}/[^\s\"<>]+)", re.IGNORECASE)
+_WORD = re.compile(r"\w+")
+# \& \% ... keep their character; accents (\" \' \^ ...) and named commands are dropped
+_LATEX_COMMAND = re.compile(r"\\([&%$_#])|\\[^a-zA-Z\s]|\\[a-zA-Z]+\*?\s*")
+
+_RIS_FIELDS = {
+    "AU": "authors", "A1": "authors",
+    "TI": "title", "T1": "title",
+    "PY": "year", "Y1": "year", "DA": "year",
+    "DO": "doi",
+    "JO": "journal", "JF": "journal", "T2": "journal", "JA": "journal",
+    "ID": "key", "TY": "type", "UR": "url",
+}
+_ENDNOTE_FIELDS = {"A": "authors", "T": "title", "D": "year", "R": "doi", "J": "journal", "B": "journal",
+                   "0": "type", "U": "url"}
+
+
+def looks_like_citations(text: str, sample_chars: int = 4000, min_lines: int = 3) -> bool:
+    """True if the start of ``text`` is structured like a RIS/BibTeX/EndNote export.
+
+    Only a bounded prefix is examined, so the check costs the same for a
+    one-page note and a thousand-page export.
+    """
+    sample = text[:sample_chars]
+    if sample.startswith(CITATION_PREAMBLE):
+        return True
+    return len(_CITATION_LINE.findall(sample)) >= min_lines
+
+
+def _normalize(text: str) -> str:
+    """Lowercase ASCII folding, so "Müller" and "Muller" index alike"""
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+
+
+def _clean_latex(value: str) -> str:
+    value = _LATEX_COMMAND.sub(lambda m: m.group(1) or "", value)
+    return " ".join(value.replace("{", "").replace("}", "").replace("~", " ").split())
+
+
+def _record(fields: Dict[str, List[str]]) -> Optional[Dict]:
+    """Normalised record from raw tag values; None when there is nothing to index"""
+    year = None
+    for value in fields.get("year", []):
+        match = _YEAR.search(value)
+        if match:
+            year = int(match.group(1))
+            break
+    doi = next((m.group(1).rstrip(".,;").lower() for v in fields.get("doi", []) for m in [_DOI.search(v)] if m), None)
+    record = {
+        "type": (fields.get("type") or [""])[0].strip() or None,
+        "key": (fields.get("key") or [""])[0].strip() or None,
+        "title": " ".join(fields.get("title", [""])[0].split()) or None,
+        "authors": [a.strip() for a in fields.get("authors", []) if a.strip()],
+        "year": year,
+        "journal": " ".join((fields.get("journal") or [""])[0].split()) or None,
+        "doi": doi,
+    }
+    if not (record["title"] or record["authors"] or record["doi"]):
+        return None
+    return record
+
+
+def parse_ris(lines: Iterable[str]) -> Iterator[Dict]:
+    """Stream records out of RIS lines (``TY  - `` ... ``ER  - ``)"""
+    fields: Dict[str, List[str]] = {}
+    last = None
+    for line in lines:
+        line = line.rstrip("\r\n").lstrip("\ufeff")
+        match = _RIS_TAG.match(line)
+        if match:
+            tag, value = match.group(1), (match.group(2) or "").strip()
+            if tag == "ER":
+                record = _record(fields)
+                if record:
+                    yield record
+                fields, last = {}, None
+                continue
+            if tag == "TY":
+                fields, last = {}, None
+            last = _RIS_FIELDS.get(tag)
+            if last:
+                fields.setdefault(last, []).append(value)
+        elif last and line.strip():
+            # Wrapped value: continues the previous tag
+            fields[last][-1] += " " + line.strip()
+    record = _record(fields) if fields else None
+    if record:
+        yield record
+
+
+def parse_endnote(lines: Iterable[str]) -> Iterator[Dict]:
+    """Stream records out of EndNote/refer lines (``%A``, ``%T``, ...; blank line between records)"""
+    fields: Dict[str, List[str]] = {}
+    last = None
+    for line in chain(lines, [""]):
+        line = line.rstrip("\r\n").lstrip("\ufeff")
+        match = _ENDNOTE_TAG.match(line)
+        if match:
+            last = _ENDNOTE_FIELDS.get(match.group(1))
+            if last:
+                fields.setdefault(last, []).append(match.group(2).strip())
+        elif not line.strip():
+            record = _record(fields) if fields else None
+            if record:
+                yield record
+            fields, last = {}, None
+        elif last:
+            fields[last][-1] += " " + line.strip()
+
+
+def _bibtex_fields(body: str) -> Dict[str, str]:
+    """``name = {value}`` / ``"value"`` / bare pairs from the inside of one entry"""
+    fields = {}
+    i, n = 0, len(body)
+    while i < n:
+        eq = body.find("=", i)
+        if eq < 0:
+            break
+        name = body[i:eq].strip(" \t\r\n,").lower()
+        i = eq + 1
+        while i < n and body[i] in " \t\r\n":
+            i += 1
+        if i < n and body[i] == "{":
+            depth, start = 0, i
+            while i < n:
+                if body[i] == "{" and body[i - 1] != "\\":
+                    depth += 1
+                elif body[i] == "}" and body[i - 1] != "\\":
+                    depth -= 1
+                    if depth == 0:
+                        break
+                i += 1
+            value = body[start + 1:i]
+            i += 1
+        elif i < n and body[i] == '"':
+            end = i + 1
+            while end < n and (body[end] != '"' or body[end - 1] == "\\"):
+                end += 1
+            value = body[i + 1:end]
+            i = end + 1
+        else:
+            end = body.find(",", i)
+            end = n if end < 0 else end
+            value = body[i:end]
+            i = end
+        comma = body.find(",", i)
+        i = n if comma < 0 else comma + 1
+        fields[name] = _clean_latex(value)
+    return fields
+
+
+def parse_bibtex(lines: Iterable[str]) -> Iterator[Dict]:
+    """Stream records out of BibTeX lines, one ``@type{key, ...}`` entry at a time.
+
+    Only the current entry is buffered. ``@comment``, ``@preamble`` and
+    ``@string`` blocks are skipped.
+    """
+    entry: List[str] = []
+    entry_type = None
+    depth = 0
+    opener, closer = "{", "}"
+    for line in lines:
+        if entry_type is None:
+            match = _BIBTEX_START.match(line)
+            if not match:
+                continue
+            entry_type = match.group(1).lower()
+            line = line[match.end() - 1:]
+            opener, closer = ("{", "}") if line[0] == "{" else ("(", ")")
+            entry, depth = [], 0
+        entry.append(line)
+        unescaped = line.replace("\\" + opener, "").replace("\\" + closer, "")
+        depth += unescaped.count(opener) - unescaped.count(closer)
+        if depth > 0:
+            continue
+
+        text = "".join(entry).strip()[1:-1]
+        kind, entry_type = entry_type, None
+        if kind in ("comment", "preamble", "string"):
+            continue
+        key, _, body = text.partition(",")
+        fields = _bibtex_fields(body)
+        authors = re.split(r"\s+and\s+", fields["author"]) if fields.get("author") else []
+        record = _record({
+            "type": [kind],
+            "key": [key],
+            "title": [fields.get("title", "")],
+            "authors": authors,
+            "year": [fields.get("year", fields.get("date", ""))],
+            "journal": [fields.get("journal", fields.get("booktitle", ""))],
+            "doi": [fields.get("doi", "")],
+        })
+        if record:
+            yield record
+
+
+def parse_citations(lines: Iterable[str]) -> Iterator[Dict]:
+    """Detect the export format from the first tagged line and stream its records"""
+    lines = iter(lines)
+    head = []
+    for line in islice(lines, 200):
+        head.append(line)
+        stripped = line.lstrip("\ufeff")
+        if _BIBTEX_START.match(stripped):
+            return parse_bibtex(chain(head, lines))
+        if _RIS_TAG.match(stripped.rstrip("\r\n")):
+            return parse_ris(chain(head, lines))
+        if _ENDNOTE_TAG.match(stripped.rstrip("\r\n")):
+            return parse_endnote(chain(head, lines))
+    return iter(())
+
+
+def author_key(name: str) -> str:
+    """Index key for an author: the normalised family name"""
+    name = name.strip()
+    family = name.split(",", 1)[0] if "," in name else (name.split() or [""])[-1]
+    return _normalize(family).strip(" .")
+
+
+def _title_tokens(title: str) -> List[str]:
+    return [t for t in _WORD.findall(_normalize(title)) if len(t) > 3]
+
+
+_LOOKUP_INTENT = re.compile(r"\b(papers?|articles?|publications?|works?|references?|citations?|published|wrote|written)\b",
+                            re.IGNORECASE)
+_LOOKUP_AUTHOR = re.compile(r"\b(?:by|from|authored by|written by)\s+((?:[A-Z][\w'\-.]*\s*)+)")
+_LOOKUP_RANGE = re.compile(r"\b(?:between|from)\s+(\d{4})\s+(?:and|to|-)\s+(\d{4})\b", re.IGNORECASE)
+_LOOKUP_SINCE = re.compile(r"\b(?:since|after)\s+(\d{4})\b", re.IGNORECASE)
+_LOOKUP_BEFORE = re.compile(r"\bbefore\s+(\d{4})\b", re.IGNORECASE)
+_LOOKUP_TITLE = re.compile(r"\b(?:titled|called|about)\s+[\"']?([^\"'?]+)", re.IGNORECASE)
+
+
+def parse_lookup(question: str) -> Optional[Dict]:
+    """Filters for a bibliographic lookup such as "papers by Smith in 2021".
+
+    Returns None when the question is not a lookup, so it can go to the LLM.
+    """
+    doi = _DOI.search(question)
+    if doi:
+        return {"doi": doi.group(1).rstrip(".,;?").lower()}
+    if not _LOOKUP_INTENT.search(question):
+        return None
+
+    filters = {}
+    author = _LOOKUP_AUTHOR.search(question)
+    if author:
+        filters["author"] = author.group(1).strip()
+    year_range = _LOOKUP_RANGE.search(question)
+    if year_range:
+        filters["year_from"], filters["year_to"] = sorted(int(y) for y in year_range.groups())
+    else:
+        since = _LOOKUP_SINCE.search(question)
+        before = _LOOKUP_BEFORE.search(question)
+        if since:
+            filters["year_from"] = int(since.group(1)) + (1 if "after" in since.group(0).lower() else 0)
+        if before:
+            filters["year_to"] = int(before.group(1)) - 1
+        if not since and not before:
+            year = _YEAR.search(question)
+            if year:
+                filters["year"] = int(year.group(1))
+    title = _LOOKUP_TITLE.search(question)
+    if title:
+        filters["title"] = title.group(1).strip()
+    # A bare year or topic is not specific enough to be sure it's a lookup
+    return filters if "author" in filters or ("title" in filters and len(filters) > 1) else None
+
+
+class CitationIndex:
+    """Structured records from citation exports, indexed for exact lookups.
+
+    Records are kept per source file. Separate inverted indexes by author
+    family name, year, DOI and title token map to record ids, so a query
+    intersects a few small id sets, smallest first, instead of scanning
+    every record.
+
+    Records persist in a shared ``citations`` store. The indexes are rebuilt
+    in memory from them.
+    """
+
+    def __init__(self, storage_path: str = "data/vector_store"):
+        self.records: Dict[int, Dict] = {}
+        self.sources: Dict[str, List[int]] = {}
+        self.by_author: Dict[str, set] = {}
+        self.by_year: Dict[int, set] = {}
+        self.by_doi: Dict[str, set] = {}
+        self.by_title: Dict[str, set] = {}
+        self._next_id = 0
+        self.store = SharedStore(
+            storage_path, "citations",
+            load_state=self._load_state,
+            apply_op=self._apply_op,
+            dump_state=self._dump_state,
+        )
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _load_state(self, data: Dict):
+        self._clear()
+        for source, records in data.get("sources", {}).items():
+            self._index_source(source, records)
+
+    def _dump_state(self) -> Dict:
+        return {"sources": {source: [self.records[rid] for rid in rids] for source, rids in self.sources.items()}}
+
+    def _apply_op(self, op: Dict):
+        kind = op.get("op")
+        if kind == "put":
+            self._unindex_source(op["source"])
+            self._index_source(op["source"], op["records"])
+        elif kind == "delete":
+            self._unindex_source(op["source"])
+        elif kind == "clear":
+            self._clear()
+
+    def _clear(self):
+        self.records, self.sources = {}, {}
+        self.by_author, self.by_year, self.by_doi, self.by_title = {}, {}, {}, {}
+
+    def _postings(self, record: Dict):
+        for author in record["authors"]:
+            yield self.by_author, author_key(author)
+        if record["year"] is not None:
+            yield self.by_year, record["year"]
+        if record["doi"]:
+            yield self.by_doi, record["doi"]
+        for token in set(_title_tokens(record["title"] or "")):
+            yield self.by_title, token
+
+    def _index_source(self, source: str, records: List[Dict]):
+        rids = []
+        for record in records:
+            rid = self._next_id
+            self._next_id += 1
+            self.records[rid] = {**record, "source": source}
+            for index, key in self._postings(record):
+                index.setdefault(key, set()).add(rid)
+            rids.append(rid)
+        self.sources[source] = rids
+
+    def _unindex_source(self, source: str):
+        for rid in self.sources.pop(source, []):
+            record = self.records.pop(rid)
+            for index, key in self._postings(record):
+                ids = index.get(key)
+                if ids is not None:
+                    ids.discard(rid)
+                    if not ids:
+                        del index[key]
+
+    def add_source(self, source: str, records: Iterable[Dict]) -> int:
+        """Store the parsed records of one export file, replacing an earlier import of it"""
+        records = [{k: v for k, v in record.items() if k != "source"} for record in records]
+        with self.store.transaction() as ops:
+            ops.append({"op": "put", "source": source, "records": records})
+        return len(records)
+
+    def remove_source(self, source: str):
+        with self.store.transaction() as ops:
+            if source in self.sources:
+                ops.append({"op": "delete", "source": source})
+
+    def clear(self):
+        with self.store.transaction() as ops:
+            ops.append({"op": "clear"})
+
+    def stats(self) -> Dict:
+        self.store.refresh()
+        return {"records": len(self.records), "sources": len(self.sources),
+                "authors": len(self.by_author), "years": len(self.by_year)}
+
+    def query(self, author: str = None, year: int = None, year_from: int = None, year_to: int = None,
+              doi: str = None, title: str = None, limit: int = 50) -> List[Dict]:
+        """Records matching every given filter, newest first"""
+        self.store.refresh()
+        candidate_sets = []
+        if doi:
+            candidate_sets.append(self.by_doi.get(doi.strip().lower(), set()))
+        if author:
+            # "John Smith and Jane Doe" -> both family names must appear
+            for name in re.split(r"\s+(?:and|&)\s+|;", author):
+                if name.strip():
+                    candidate_sets.append(self.by_author.get(author_key(name), set()))
+        if year is not None:
+            candidate_sets.append(self.by_year.get(int(year), set()))
+        elif year_from is not None or year_to is not None:
+            low = year_from if year_from is not None else min(self.by_year, default=0)
+            high = year_to if year_to is not None else max(self.by_year, default=0)
+            candidate_sets.append(set().union(*(ids for y, ids in self.by_year.items() if low <= y <= high)))
+        if title:
+            candidate_sets.extend(self.by_title.get(token, set()) for token in _title_tokens(title))
+        if not candidate_sets:
+            return []
+
+        candidate_sets.sort(key=len)
+        matches = set(candidate_sets[0])
+        for ids in candidate_sets[1:]:
+            if not matches:
+                break
+            matches &= ids
+        best = heapq.nlargest(limit, matches, key=lambda rid: (self.records[rid]["year"] or 0, -rid))
+        return [self.records[rid] for rid in best]
+
+    def answer(self, question: str, limit: int = 25) -> Optional[Dict]:
+        """Answer a bibliographic lookup straight from the index.
+
+        Returns None unless the question is clearly a lookup and something
+        matches, so the caller can fall back to the LLM. "From BERT" or "from
+        Google" parse like an author, so an author only counts as lookup
+        intent when it is actually in the index; a DOI or a year always does.
+        """
+        self.store.refresh()
+        filters = parse_lookup(question) if self.records else None
+        if filters is None or not self._is_lookup(filters):
+            return None
+        records = self.query(limit=limit, **filters)
+        if not records:
+            return None
+        lines = []
+        for record in records:
+            authors = ", ".join(record["authors"][:3]) + (" et al." if len(record["authors"]) > 3 else "")
+            line = f"- {authors or 'Unknown author'} ({record['year'] or 'n.d.'}). {record['title'] or 'Untitled'}"
+            if record["journal"]:
+                line += f". {record['journal']}"
+            if record["doi"]:
+                line += f". doi:{record['doi']}"
+            lines.append(line)
+        text = f"Found {len(records)} matching citation record{'s' if len(records) != 1 else ''}:\n" + "\n".join(lines)
+        return {"answer": text, "filters": filters, "records": records}
+
+    def _is_lookup(self, filters: Dict) -> bool:
+        """Whether parsed filters show real lookup intent: a DOI, a year, or an indexed author"""
+        if filters.get("doi") or any(key in filters for key in ("year", "year_from", "year_to")):
+            return True
+        author = filters.get("author")
+        if not author:
+            return False
+        names = [name for name in re.split(r"\s+(?:and|&)\s+|;", author) if name.strip()]
+        return bool(names) and all(author_key(name) in self.by_author for name in names)
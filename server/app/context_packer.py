@@ -0,0 +1,196 @@
+import os
+import re
+import math
+from collections import Counter
+from typing import Dict, List
+
+from app.text_chunker import TextChunker
+from app.metrics import LLM_PROMPT_TOKENS
+
+# Context windows (tokens) of the models the README suggests. Keyed by the
+# model family, i.e. the Ollama tag without its ":variant" suffix.
+MODEL_CONTEXT_WINDOWS = {
+    "llama3": 8192,
+    "llama3.1": 131072,
+    "llama2": 4096,
+    "mistral": 8192,
+    "codellama": 16384,
+    "gemma": 8192,
+    "phi3": 4096,
+}
+DEFAULT_CONTEXT_WINDOW = 4096
+# Llama-family BPE averages roughly 4 characters per token on English prose.
+# CONTEXT_TOKEN_SCALE recalibrates the estimator for other tokenizers.
+TOKEN_SCALE = float(os.getenv("CONTEXT_TOKEN_SCALE", "1.0"))
+# Headroom for the estimator's error and the chat template Ollama wraps around the prompt
+SAFETY_TOKENS = 64
+# Placeholder for packed context inside prompt templates; cannot collide with user text
+CONTEXT_SLOT = "\x00context\x00"
+
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+_TERM_RE = re.compile(r"[a-z0-9]{3,}")
+_EXCERPT_HEADER = "Relevant excerpts from the research paper:"
+_EXCERPT_MARKER_RE = re.compile(r"\[Excerpt \d+\].*?:\s*")
+_PAGE_NUMBER_RE = re.compile(r"^\s*(?:page\s+)?\d{1,4}(?:\s*(?:/|of)\s*\d{1,4})?\s*$", re.IGNORECASE)
+_HYPHEN_BREAK_RE = re.compile(r"(\w)-\n(\w)")
+_BLANK_RUN_RE = re.compile(r"\n{3,}")
+_STOPWORDS = frozenset(
+    "the and for are but not you all any can had her was one our out has have this that with what "
+    "from they will would there their which when where who how why does did about into than then "
+    "them these those been were its also paper research".split()
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Calibrated token estimate for Llama-style BPE vocabularies.
+
+    Common short words are one token and longer ones split roughly every six
+    letters. Digits group in threes and each punctuation mark is its own
+    token. Runs in one regex pass without loading a tokenizer model.
+    """
+    if not text:
+        return 0
+    tokens = 0
+    for match in _PIECE_RE.finditer(text):
+        piece = match.group()
+        if piece[0].isalpha():
+            tokens += 1 + (len(piece) - 1) // 6
+        elif piece[0].isdigit():
+            tokens += (len(piece) + 2) // 3
+        else:
+            tokens += 1
+    return int(math.ceil(tokens * TOKEN_SCALE))
+
+
+def context_window(model: str) -> int:
+    """Token window for an Ollama model tag; OLLAMA_NUM_CTX overrides it"""
+    override = os.getenv("OLLAMA_NUM_CTX")
+    if override:
+        return int(override)
+    family = (model or "").split(":", 1)[0].lower()
+    return MODEL_CONTEXT_WINDOWS.get(family, DEFAULT_CONTEXT_WINDOW)
+
+
+def clean_context(text: str) -> str:
+    """Strip boilerplate that costs tokens without informing the answer.
+
+    Removes RAG excerpt headers and markers, bare page numbers, and running
+    headers/footers (short lines repeated on many pages). It also re-joins
+    words hyphenated across line breaks.
+    """
+    if not text:
+        return ""
+    if _EXCERPT_HEADER in text:
+        text = text[text.find(_EXCERPT_HEADER) + len(_EXCERPT_HEADER):].strip()
+        text = _EXCERPT_MARKER_RE.sub("", text)
+
+    text = _HYPHEN_BREAK_RE.sub(r"\1\2", text)
+    lines = text.split("\n")
+    counts = Counter(line.strip() for line in lines if 0 < len(line.strip()) <= 80)
+    repeated = {line for line, n in counts.items() if n >= 3}
+    kept = [
+        line for line in lines
+        if not _PAGE_NUMBER_RE.match(line) and line.strip() not in repeated
+    ]
+    return _BLANK_RUN_RE.sub("\n\n", "\n".join(kept)).strip()
+
+
+def _terms(text: str) -> List[str]:
+    return [t for t in _TERM_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class ContextPacker:
+    """Fit document text into a model's context window.
+
+    The text is cleaned and split into chunks. Chunks are ranked against the
+    query with BM25, or by lead/tail position when there is no query, and
+    packed greedily until the token budget is spent. The chosen chunks are
+    emitted in document order so the model reads them as the paper flows.
+    """
+
+    def __init__(self, model: str, chunk_size: int = 800):
+        self.model = model
+        self.window = context_window(model)
+        self.chunker = TextChunker(chunk_size=chunk_size)
+
+    def budget(self, prompt_overhead: str, max_new_tokens: int) -> int:
+        """Tokens left for context once the prompt template and the reply are accounted for"""
+        used = estimate_tokens(prompt_overhead) + max_new_tokens + SAFETY_TOKENS
+        return max(0, self.window - used)
+
+    def pack(self, text: str, query: str = None, budget_tokens: int = None) -> str:
+        text = clean_context(text)
+        if budget_tokens is None:
+            budget_tokens = self.window // 2
+        if estimate_tokens(text) <= budget_tokens:
+            return text
+
+        chunks = self.chunker.chunk(text)
+        for chunk in chunks:
+            chunk["tokens"] = estimate_tokens(chunk["text"])
+        ranked = self._rank(chunks, query)
+
+        chosen, remaining = [], budget_tokens
+        for chunk in ranked:
+            cost = chunk["tokens"] + 1  # separator
+            if cost <= remaining:
+                chosen.append(chunk)
+                remaining -= cost
+            if remaining < 16:
+                break
+
+        if not chosen and ranked:
+            # Budget smaller than any chunk: cut the best one down to size
+            best = ranked[0]
+            ratio = budget_tokens / max(best["tokens"], 1)
+            return best["text"][:int(len(best["text"]) * ratio)].rstrip()
+
+        chosen.sort(key=lambda c: c["index"])
+        parts, previous = [], None
+        for chunk in chosen:
+            if previous is not None and chunk["index"] != previous + 1:
+                parts.append("...")
+            parts.append(chunk["text"])
+            previous = chunk["index"]
+        return "\n".join(parts)
+
+    def _rank(self, chunks: List[Dict], query: str) -> List[Dict]:
+        query_terms = set(_terms(query or ""))
+        if not query_terms:
+            # No query (e.g. summaries): abstract and conclusion first, then the body in order
+            if len(chunks) <= 2:
+                return list(chunks)
+            return [chunks[0], chunks[-1]] + chunks[1:-1]
+
+        term_counts = [Counter(_terms(c["text"])) for c in chunks]
+        lengths = [sum(tc.values()) for tc in term_counts]
+        avg_length = (sum(lengths) / len(lengths)) or 1.0
+        n = len(chunks)
+        idf = {}
+        for term in query_terms:
+            df = sum(1 for tc in term_counts if term in tc)
+            idf[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+        k1, b = 1.2, 0.75
+        scored = []
+        for chunk, tc, length in zip(chunks, term_counts, lengths):
+            score = 0.0
+            for term in query_terms:
+                tf = tc.get(term, 0)
+                if tf:
+                    score += idf[term] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+            # Ties (including zero-score chunks) fall back to document order
+            scored.append((-score, chunk["index"], chunk))
+        scored.sort(key=lambda item: item[:2])
+        return [chunk for _, _, chunk in scored]
+
+    def build_prompt(self, template: str, context: str, query: str = None, max_new_tokens: int = 512) -> str:
+        """Fill CONTEXT_SLOT in template with as much relevant text as the window allows"""
+        budget = self.budget(template.replace(CONTEXT_SLOT, ""), max_new_tokens)
+        prompt = template.replace(CONTEXT_SLOT, self.pack(context, query, budget), 1)
+        LLM_PROMPT_TOKENS.observe(estimate_tokens(prompt), model=self.model)
+        return prompt
+
+    def options(self) -> Dict:
+        """Ollama options that make the server allocate the window we packed for"""
+        return {"num_ctx": self.window}
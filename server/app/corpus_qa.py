@@ -0,0 +1,128 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from app.context_packer import ContextPacker, CONTEXT_SLOT
+from app.llm_scheduler import Priority
+from app.metrics import STAGE_SECONDS, log_event
+from app.ollama_client import OllamaClient
+from app.search_filter import SearchFilter
+
+NOT_ADDRESSED = "NOT ADDRESSED"
+PAPER_TOKENS = 400
+MERGE_TOKENS = 1200
+
+PAPER_TEMPLATE = f"""You are given excerpts from one research paper, "{{doc_id}}".
+
+{CONTEXT_SLOT}
+
+Using only these excerpts, answer the question below in a few sentences.
+If the excerpts do not address it, reply with exactly "{NOT_ADDRESSED}".
+
+Question: {{question}}
+Answer:"""
+
+MERGE_TEMPLATE = f"""Several research papers were asked the same question. Their individual answers follow,
+each labelled with a reference number.
+
+{CONTEXT_SLOT}
+
+Question: {{question}}
+
+Write one answer that compares and combines what the papers say. Point out where they agree or
+differ. Cite papers inline with their reference numbers, e.g. [1] or [2][3]. Use no other sources.
+Answer:"""
+
+
+class CorpusQA:
+    """Answer a question from the whole corpus with per-paper citations.
+
+    Retrieval asks the document store for the best chunks across every paper
+    (an inverted-index lookup, not a scan), groups them by paper and keeps the
+    strongest few papers. Each paper is answered from its own excerpts, with
+    fan-out capped by the LLM scheduler's in-flight limit. A final merge step
+    combines the per-paper answers into one comparative answer citing [n]
+    references.
+    """
+
+    def __init__(self, rag_system, client: OllamaClient, model: str):
+        self.rag_system = rag_system
+        self.client = client
+        self.model = model
+        self.packer = ContextPacker(model)
+
+    def retrieve(self, question: str, max_papers: int = 4, chunks_per_paper: int = 4,
+                 pool: int = 40, filters: SearchFilter = None) -> List[Dict]:
+        """Group the top chunks by paper, best paper first; chunks stay in reading order"""
+        papers = {}
+        shadowed = set()
+        for hit in self.rag_system.search_chunks(question, top_k=pool, filters=filters):
+            paper = papers.get(hit["doc_id"])
+            if paper is None:
+                if len(papers) >= max_papers or hit["doc_id"] in shadowed:
+                    continue
+                # Another version of a paper already chosen would only repeat its answer
+                shadowed.update(match["doc_id"] for match in self.rag_system.find_duplicates(hit["doc_id"]))
+                paper = papers[hit["doc_id"]] = {"doc_id": hit["doc_id"], "score": hit["score"], "excerpts": []}
+            if len(paper["excerpts"]) < chunks_per_paper:
+                paper["excerpts"].append(hit)
+        for paper in papers.values():
+            paper["excerpts"].sort(key=lambda hit: hit["chunk_index"])
+        return list(papers.values())
+
+    def _generate(self, prompt: str, max_tokens: int, caller: str) -> str:
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "options": {"temperature": 0.2, "num_predict": max_tokens, **self.packer.options()},
+        }
+        return self.client.generate(payload, timeout=120, caller=caller, priority=Priority.INTERACTIVE).strip()
+
+    def _answer_paper(self, question: str, paper: Dict) -> str:
+        template = PAPER_TEMPLATE.replace("{doc_id}", paper["doc_id"]).replace("{question}", question)
+        excerpts = "\n\n".join(hit["text"] for hit in paper["excerpts"])
+        prompt = self.packer.build_prompt(template, excerpts, query=question, max_new_tokens=PAPER_TOKENS)
+        return self._generate(prompt, PAPER_TOKENS, "corpus_paper")
+
+    def answer(self, question: str, max_papers: int = 4, chunks_per_paper: int = 4,
+               filters: SearchFilter = None) -> Dict:
+        papers = self.retrieve(question, max_papers, chunks_per_paper, filters=filters)
+        if not papers:
+            return {"answer": "No papers in the corpus matched this question.", "papers": []}
+
+        with STAGE_SECONDS.time(stage="corpus_fanout"):
+            workers = max(1, min(len(papers), self.client.scheduler.max_in_flight))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                answers = list(pool.map(lambda paper: self._answer_paper(question, paper), papers))
+
+        citations = []
+        for paper, paper_answer in zip(papers, answers):
+            addressed = NOT_ADDRESSED not in paper_answer.upper()
+            citations.append({
+                "doc_id": paper["doc_id"],
+                "score": paper["score"],
+                "addressed": addressed,
+                "answer": paper_answer if addressed else None,
+                "excerpts": [
+                    {"chunk_index": hit["chunk_index"], "score": hit["score"],
+                     "text": hit["text"][:300] + "..." if len(hit["text"]) > 300 else hit["text"]}
+                    for hit in paper["excerpts"]
+                ],
+            })
+
+        relevant = [c for c in citations if c["addressed"]]
+        for ref, citation in enumerate(relevant, start=1):
+            citation["ref"] = ref
+        log_event("corpus_qa", papers=len(papers), addressed=len(relevant))
+
+        if not relevant:
+            answer = "None of the most relevant papers address this question directly."
+        elif len(relevant) == 1:
+            answer = f"{relevant[0]['answer']} [1]"
+        else:
+            labelled = "\n\n".join(f"[{c['ref']}] {c['doc_id']}:\n{c['answer']}" for c in relevant)
+            template = MERGE_TEMPLATE.replace("{question}", question)
+            with STAGE_SECONDS.time(stage="corpus_merge"):
+                prompt = self.packer.build_prompt(template, labelled, max_new_tokens=MERGE_TOKENS)
+                answer = self._generate(prompt, MERGE_TOKENS, "corpus_merge")
+
+        return {"answer": answer, "papers": citations}
@@ -0,0 +1,188 @@
+import os
+import re
+import zlib
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from app.shared_store import SharedStore
+
+NUM_PERM = 128
+BANDS = 16          # 16 bands x 8 rows: pairs above ~0.7 Jaccard almost always share a bucket
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 5
+_PRIME = np.uint64(4294967291)  # largest 32-bit prime; (a * h + b) stays below 2**64
+_WORD_RE = re.compile(r"\w+")
+
+_rng = np.random.RandomState(20240501)  # fixed so signatures persisted by any process agree
+_A = _rng.randint(1, 2 ** 32 - 5, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 2 ** 32 - 5, size=NUM_PERM, dtype=np.uint64)
+
+
+def minhash_signature(text: str) -> List[int]:
+    """128-permutation MinHash over word 5-gram shingles"""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+    signature = np.full(NUM_PERM, _PRIME, dtype=np.uint64)
+    # Blocks keep the (shingles x permutations) matrix small for long papers
+    for start in range(0, len(hashes), 2048):
+        block = hashes[start:start + 2048, None]
+        np.minimum(signature, ((block * _A + _B) % _PRIME).min(axis=0), out=signature)
+    return signature.tolist()
+
+
+def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """Estimated Jaccard similarity: the fraction of matching MinHash slots"""
+    return float(np.mean(np.asarray(sig_a) == np.asarray(sig_b)))
+
+
+def _band_keys(signature: List[int]) -> List[Tuple[int, int]]:
+    return [(band, hash(tuple(signature[band * ROWS:(band + 1) * ROWS]))) for band in range(BANDS)]
+
+
+def flag_metadata(metadata: Dict, matches: List[Dict]) -> Dict:
+    """Metadata marked with its closest near-duplicate, if there is one"""
+    if not matches:
+        return metadata
+    return {**(metadata or {}), "near_duplicate_of": matches[0]["doc_id"],
+            "duplicate_similarity": matches[0]["similarity"]}
+
+
+class NearDuplicateIndex:
+    """MinHash signatures with an LSH band index for near-duplicate papers.
+
+    Different versions of one paper (arXiv v1/v2, camera-ready, publisher
+    PDF) share most of their 5-word shingles. Each document's signature is
+    split into bands, and documents landing in the same bucket for any band
+    are candidates. Candidates are then confirmed against the threshold.
+    Insert and lookup cost depends on the number of bands and candidates,
+    not on corpus size.
+
+    Signatures persist in a shared ``minhash`` store. The buckets are
+    rebuilt in memory from them.
+    """
+
+    def __init__(self, storage_path: str = "data/vector_store", threshold: float = None):
+        self.threshold = threshold if threshold is not None else float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+        self.signatures: Dict[str, List[int]] = {}
+        self.buckets: Dict[Tuple[int, int], set] = {}
+        self.store = SharedStore(
+            storage_path, "minhash",
+            load_state=self._load_state,
+            apply_op=self._apply_op,
+            dump_state=self._dump_state,
+        )
+
+    def _load_state(self, data: Dict):
+        self.signatures = {}
+        self.buckets = {}
+        for doc_id, signature in data.get("signatures", {}).items():
+            self._index(doc_id, signature)
+
+    def _dump_state(self) -> Dict:
+        return {"signatures": self.signatures}
+
+    def _apply_op(self, op: Dict):
+        kind = op.get("op")
+        if kind == "put":
+            self._unindex(op["doc_id"])
+            self._index(op["doc_id"], op["signature"])
+        elif kind == "delete":
+            self._unindex(op["doc_id"])
+        elif kind == "clear":
+            self._load_state({})
+
+    def _index(self, doc_id: str, signature: List[int]):
+        self.signatures[doc_id] = signature
+        for key in _band_keys(signature):
+            self.buckets.setdefault(key, set()).add(doc_id)
+
+    def _unindex(self, doc_id: str):
+        signature = self.signatures.pop(doc_id, None)
+        if signature is None:
+            return
+        for key in _band_keys(signature):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self.buckets[key]
+
+    def _matches(self, doc_id: str, signature: List[int], batch: Dict[str, List[int]] = None,
+                 batch_buckets: Dict[Tuple[int, int], set] = None) -> List[Dict]:
+        """Stored (and, if given, earlier batch) documents similar to signature"""
+        candidates = set()
+        for key in _band_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+            if batch_buckets:
+                candidates.update(batch_buckets.get(key, ()))
+        candidates.discard(doc_id)
+        matches = []
+        for other in candidates:
+            # A batch entry supersedes a stored signature under the same id
+            score = similarity(signature, batch[other] if batch and other in batch else self.signatures[other])
+            if score >= self.threshold:
+                matches.append({"doc_id": other, "similarity": round(score, 3)})
+        matches.sort(key=lambda m: (-m["similarity"], m["doc_id"]))
+        return matches
+
+    def match_many(self, documents: List[Tuple[str, str]]) -> Tuple[List[Tuple[str, List[int]]], Dict[str, List[Dict]]]:
+        """Sign (doc_id, content) pairs and find their near-duplicates, without storing anything.
+
+        Later documents in the batch are matched against earlier ones too.
+        Returns (signatures, near-duplicates per doc_id); hand the signatures
+        to :meth:`store_signatures` once the documents themselves are
+        committed, so a failed write leaves no orphan signature behind.
+        """
+        self.store.refresh()
+        signed = [(doc_id, minhash_signature(content)) for doc_id, content in documents]
+        found = {}
+        batch: Dict[str, List[int]] = {}
+        batch_buckets: Dict[Tuple[int, int], set] = {}
+        for doc_id, signature in signed:
+            found[doc_id] = self._matches(doc_id, signature, batch, batch_buckets)
+            batch[doc_id] = signature
+            for key in _band_keys(signature):
+                batch_buckets.setdefault(key, set()).add(doc_id)
+        return signed, found
+
+    def store_signatures(self, signed: List[Tuple[str, List[int]]]):
+        with self.store.transaction() as ops:
+            for doc_id, signature in signed:
+                ops.append({"op": "put", "doc_id": doc_id, "signature": signature})
+
+    def add_many(self, documents: List[Tuple[str, str]]) -> Dict[str, List[Dict]]:
+        """Index (doc_id, content) pairs; returns each one's near-duplicates already in the corpus"""
+        signed, found = self.match_many(documents)
+        self.store_signatures(signed)
+        return found
+
+    def add(self, doc_id: str, content: str) -> List[Dict]:
+        return self.add_many([(doc_id, content)])[doc_id]
+
+    def remove(self, doc_id: str):
+        with self.store.transaction() as ops:
+            if doc_id in self.signatures:
+                ops.append({"op": "delete", "doc_id": doc_id})
+
+    def clear(self):
+        with self.store.transaction() as ops:
+            ops.append({"op": "clear"})
+
+    def find(self, doc_id: str, load_content: Callable[[str], str] = None) -> List[Dict]:
+        """Stored near-duplicates of doc_id, most similar first.
+
+        Documents stored before they were signed are signed on first lookup
+        when ``load_content`` is given.
+        """
+        self.store.refresh()
+        signature = self.signatures.get(doc_id)
+        if signature is None:
+            content = load_content(doc_id) if load_content else ""
+            return self.add(doc_id, content) if content else []
+        return self._matches(doc_id, signature)
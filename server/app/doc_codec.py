@@ -0,0 +1,139 @@
+import os
+import zlib
+import base64
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, Optional
+
+# Marks encoded text in the JSON store. Extracted PDF text never starts with NUL.
+_TEXT_PREFIX = "\x00zlib:"
+# Marks encoded bytes in the SQLite store: magic + one byte of dictionary id
+_BLOB_MAGIC = b"\x00Z"
+MAX_DICT_SIZE = 32 * 1024  # zlib's window; a larger preset dictionary is never referenced
+DICT_MIN_DOCUMENTS = int(os.getenv("ZDICT_MIN_DOCUMENTS", "20"))
+COMPRESSION_ENABLED = os.getenv("DOC_COMPRESSION", "true").lower() == "true"
+
+
+def train_dictionary(samples: Iterable[str], size: int = MAX_DICT_SIZE, sample_chars: int = 20000) -> bytes:
+    """Build a zlib preset dictionary from the phrases papers share.
+
+    Counts 1-4 word phrases across the samples and keeps those that recur in
+    several documents, weighted by the bytes they would save. The most
+    valuable phrases go last, because deflate reaches the end of the
+    dictionary with the shortest distances.
+    """
+    phrase_docs = Counter()
+    documents = 0
+    for text in samples:
+        documents += 1
+        words = text[:sample_chars].split()
+        seen = set()
+        for n in (1, 2, 3, 4):
+            for i in range(len(words) - n + 1):
+                seen.add(" ".join(words[i:i + n]))
+        phrase_docs.update(seen)
+
+    min_docs = max(2, documents // 10)
+    scored = [(count * len(phrase), phrase) for phrase, count in phrase_docs.items()
+              if count >= min_docs and len(phrase) > 3]
+    scored.sort(reverse=True)
+
+    chosen, used = [], 0
+    for _, phrase in scored:
+        cost = len(phrase.encode("utf-8")) + 1
+        if used + cost > size:
+            break
+        chosen.append(phrase)
+        used += cost
+    return " ".join(reversed(chosen)).encode("utf-8")[:size]
+
+
+class DocumentCodec:
+    """Per-document zlib compression with shared preset dictionaries.
+
+    Every encoded document records the id of the dictionary it was
+    compressed with (0 means none), so a dictionary trained later never
+    invalidates older documents. Text that was stored before compression
+    existed passes through :meth:`decode` unchanged.
+    """
+
+    def __init__(self, level: int = 6, enabled: bool = COMPRESSION_ENABLED):
+        self.level = level
+        self.enabled = enabled
+        self.dictionaries: Dict[int, bytes] = {0: b""}
+
+    @property
+    def current_id(self) -> int:
+        return max(self.dictionaries)
+
+    def add_dictionary(self, dict_id: int, data: bytes):
+        self.dictionaries[dict_id] = data
+
+    def export_dictionaries(self) -> Dict[str, str]:
+        """JSON-safe form for snapshots (the empty dictionary 0 is implied)"""
+        return {str(k): base64.b64encode(v).decode("ascii") for k, v in self.dictionaries.items() if k}
+
+    def import_dictionaries(self, data: Dict[str, str]):
+        self.dictionaries = {0: b""}
+        for dict_id, encoded in (data or {}).items():
+            self.dictionaries[int(dict_id)] = base64.b64decode(encoded)
+
+    def compress(self, text: str) -> bytes:
+        dict_id = self.current_id
+        compressor = zlib.compressobj(self.level, zdict=self.dictionaries[dict_id]) if dict_id else \
+            zlib.compressobj(self.level)
+        return _BLOB_MAGIC + bytes([dict_id]) + compressor.compress(text.encode("utf-8")) + compressor.flush()
+
+    def decompress(self, blob) -> str:
+        """Inverse of compress; str values (uncompressed rows) are returned as-is"""
+        if isinstance(blob, str):
+            return blob
+        if not blob.startswith(_BLOB_MAGIC):
+            return blob.decode("utf-8")
+        dict_id = blob[len(_BLOB_MAGIC)]
+        zdict = self.dictionaries[dict_id]
+        decompressor = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+        payload = blob[len(_BLOB_MAGIC) + 1:]
+        return (decompressor.decompress(payload) + decompressor.flush()).decode("utf-8")
+
+    def encode(self, text: str) -> str:
+        """Compressed text for JSON storage (base64), or the text itself when disabled"""
+        if not self.enabled:
+            return text
+        return _TEXT_PREFIX + base64.b64encode(self.compress(text)).decode("ascii")
+
+    def decode(self, stored: str) -> str:
+        if not stored.startswith(_TEXT_PREFIX):
+            return stored
+        return self.decompress(base64.b64decode(stored[len(_TEXT_PREFIX):]))
+
+
+class DecodedCache:
+    """Small LRU of recently read documents so hot papers are not re-inflated per request"""
+
+    def __init__(self, capacity: int = 32):
+        self.capacity = capacity
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def discard(self, key: str):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
@@ -0,0 +1,283 @@
+import os
+import re
+import time
+import queue
+import hashlib
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from app.llm_scheduler import Priority, SchedulerSaturated
+from app.metrics import STAGE_SECONDS, log_event, new_trace_id, trace_id_var
+from app.shared_store import FileLock, SharedStore
+from app.summarizer import MapReduceSummarizer
+
+_KNOWN_SECTION_RE = re.compile(
+    r"^\s*(?:(\d+(?:\.\d+)*)\.?\s+)?"
+    r"(abstract|introduction|background|related work|preliminaries|method(?:s|ology)?|approach|"
+    r"experiments?|experimental setup|evaluation|results(?: and discussion)?|discussion|limitations|"
+    r"conclusions?(?: and future work)?|future work|references|bibliography|acknowledge?ments?|appendix)"
+    r"\s*[:.]?\s*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+# "3 Proposed Model", "4.2 Ablation Study": numbered, short, no trailing period
+_NUMBERED_SECTION_RE = re.compile(
+    r"^\s*(\d{1,2}(?:\.\d{1,2})?)\.?\s+([A-Z][A-Za-z0-9\-,:&' ]{2,70})\s*$", re.MULTILINE)
+_BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(.*\S)")
+
+# A failed analysis is retried after this many seconds, doubling per consecutive failure up to the cap
+ENRICHMENT_RETRY_SECONDS = float(os.getenv("ENRICHMENT_RETRY_SECONDS", "300"))
+ENRICHMENT_RETRY_MAX_SECONDS = 6 * 3600
+
+SUMMARY_INSTRUCTION = "Write a concise summary of the paper covering its topic, method and main findings."
+CONTRIBUTIONS_INSTRUCTION = "List the paper's main contributions, one per line, each starting with '- '."
+LIMITATIONS_INSTRUCTION = "List the paper's limitations or open problems, one per line, each starting with '- '."
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def section_map(text: str) -> List[Dict]:
+    """Locate section headings and return their character spans.
+
+    Recognises the usual paper headings (Abstract, Introduction, Methods,
+    Results, ...) with or without numbering, plus other short numbered
+    headings. Cheap enough to run on every document without the LLM.
+    """
+    headings = {}
+    for match in _KNOWN_SECTION_RE.finditer(text):
+        number, title = match.group(1), match.group(2)
+        headings[match.start()] = (number, title.strip().title(), match.end())
+    for match in _NUMBERED_SECTION_RE.finditer(text):
+        if match.start() in headings or len(match.group(2).split()) > 8:
+            continue
+        headings[match.start()] = (match.group(1), match.group(2).strip(), match.end())
+
+    sections = []
+    starts = sorted(headings)
+    for i, start in enumerate(starts):
+        number, title, body_start = headings[start]
+        end = starts[i + 1] if i + 1 < len(starts) else len(text)
+        sections.append({
+            "title": f"{number} {title}" if number else title,
+            "level": number.count(".") + 1 if number else 1,
+            "start": start,
+            "end": end,
+            "words": len(text[body_start:end].split()),
+        })
+    return sections
+
+
+def _bullets(response: str) -> List[str]:
+    items = [m.group(1) for m in map(_BULLET_RE.match, response.splitlines()) if m]
+    if items:
+        return items
+    # Model ignored the list format; fall back to one item per sentence
+    return [s.strip() for s in re.split(r"(?<=[.!?])\s+", response) if s.strip()]
+
+
+class PaperEnricher:
+    """Precompute per-paper analysis once, off the request path.
+
+    Uploads call :meth:`schedule`; a background thread then computes the
+    summary, contributions, limitations and section map at batch priority
+    (so interactive traffic is served first) and stores them in a shared
+    ``enrichment`` store keyed by document id. Each record carries the hash
+    of the content it was computed from, and :meth:`get` only returns it
+    while that hash still matches, so re-uploading changed text invalidates
+    it. The three LLM fields share one map stage through the summarizer's
+    chunk cache. Failures are usually transient (a saturated queue, Ollama
+    restarting), so a "failed" record is rescheduled once its backoff has
+    passed, by :meth:`schedule` or the analysis endpoint.
+    """
+
+    def __init__(self, summarizer: MapReduceSummarizer, load_content: Callable[[str], str],
+                 storage_path: str = "data/vector_store", enabled: bool = True, max_attempts: int = 3,
+                 retry_seconds: float = None):
+        self.summarizer = summarizer
+        self.load_content = load_content
+        self.enabled = enabled
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds if retry_seconds is not None else ENRICHMENT_RETRY_SECONDS
+        self.records = {}
+        self.store = SharedStore(
+            storage_path, "enrichment",
+            load_state=self._load_state,
+            apply_op=self._apply_op,
+            dump_state=self._dump_state,
+        )
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._backfill_lock = FileLock(os.path.join(storage_path, "enrichment_backfill.lock"))
+
+    def _load_state(self, data: Dict):
+        self.records = data.get("records", {})
+
+    def _dump_state(self) -> Dict:
+        return {"records": self.records}
+
+    def _apply_op(self, op: Dict):
+        kind = op.get("op")
+        if kind == "put":
+            self.records[op["doc_id"]] = op["record"]
+        elif kind == "delete":
+            self.records.pop(op["doc_id"], None)
+
+    @property
+    def generation(self) -> int:
+        """Monotonic counter bumped by every stored or removed record"""
+        self.store.refresh()
+        return self.store.generation
+
+    def get(self, doc_id: str, content: str = None) -> Optional[Dict]:
+        """Stored record for doc_id, or None if missing or computed from other content"""
+        self.store.refresh()
+        record = self.records.get(doc_id)
+        if record is None:
+            return None
+        if content is not None and record.get("content_hash") != content_hash(content):
+            return None
+        return record
+
+    def get_many(self, doc_ids: List[str]) -> Dict[str, Dict]:
+        """Stored records for a page of documents, without content hash checks"""
+        self.store.refresh()
+        return {doc_id: self.records[doc_id] for doc_id in doc_ids if doc_id in self.records}
+
+    def status(self, doc_id: str, content: str = None) -> str:
+        """One of ready, failed, pending, stale or missing"""
+        with self._lock:
+            # Checked first: a failed record being retried is pending
+            if doc_id in self._pending:
+                return "pending"
+        record = self.get(doc_id, content)
+        if record is not None:
+            return record["status"]
+        return "stale" if doc_id in self.records else "missing"
+
+    def retry_due(self, record: Dict) -> bool:
+        """Whether a failed record has waited out its backoff"""
+        if record.get("status") != "failed":
+            return False
+        delay = min(self.retry_seconds * 2 ** (record.get("failures", 1) - 1), ENRICHMENT_RETRY_MAX_SECONDS)
+        try:
+            age = (datetime.now() - datetime.fromisoformat(record["updated"])).total_seconds()
+        except (KeyError, ValueError):
+            return True
+        return age >= delay
+
+    def schedule(self, doc_id: str, content: str = None) -> bool:
+        """Queue doc_id for enrichment unless it is already fresh (or failed recently) or queued"""
+        if not self.enabled:
+            return False
+        if content is not None:
+            record = self.get(doc_id, content)
+            if record is not None and not self.retry_due(record):
+                return False
+            if record is None and doc_id in self.records:
+                # Content changed: drop the old analysis now rather than serve it until the rerun
+                self.forget(doc_id)
+        with self._lock:
+            if doc_id in self._pending:
+                return False
+            self._pending.add(doc_id)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="paper-enricher", daemon=True)
+                self._worker.start()
+        self._queue.put(doc_id)
+        return True
+
+    def forget(self, doc_id: str):
+        with self.store.transaction() as ops:
+            if doc_id in self.records:
+                ops.append({"op": "delete", "doc_id": doc_id})
+
+    def backfill(self, page_documents: Callable, page_size: int = 500) -> int:
+        """Queue every stored document whose analysis is missing or stale"""
+        queued, cursor = 0, None
+        while True:
+            documents, cursor = page_documents(limit=page_size, cursor=cursor)
+            for doc in documents:
+                if self.schedule(doc["id"], self.load_content(doc["id"])):
+                    queued += 1
+            if not cursor:
+                return queued
+
+    def start_backfill(self, page_documents: Callable) -> threading.Thread:
+        """Run :meth:`backfill` on a background thread in one server process only.
+
+        Every worker calls this at startup; the one that gets the
+        ``enrichment_backfill.lock`` file runs the backfill (and its queue)
+        while the others skip it, so stored papers are loaded and hashed once
+        rather than once per worker.
+        """
+        def run():
+            with self._backfill_lock.try_acquire() as leader:
+                if not leader:
+                    log_event("enrichment_backfill_skipped", reason="running in another worker")
+                    return
+                try:
+                    log_event("enrichment_backfill", queued=self.backfill(page_documents))
+                except Exception as e:
+                    log_event("enrichment_backfill_failed", error=str(e))
+
+        thread = threading.Thread(target=run, name="enrichment-backfill", daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self):
+        while True:
+            doc_id = self._queue.get()
+            # Each job gets its own trace id rather than the uploading request's
+            trace_id_var.set(new_trace_id())
+            try:
+                self._enrich(doc_id)
+            except Exception as e:
+                log_event("enrichment_failed", doc_id=doc_id, error=str(e))
+            finally:
+                with self._lock:
+                    self._pending.discard(doc_id)
+
+    def _enrich(self, doc_id: str):
+        content = self.load_content(doc_id)
+        if not content:
+            return
+        self.store.refresh()
+        digest = content_hash(content)
+        previous = self.records.get(doc_id)
+        if previous is not None and previous.get("content_hash") == digest and not self.retry_due(previous):
+            return
+
+        record = {"content_hash": digest, "sections": section_map(content)}
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with STAGE_SECONDS.time(stage="enrichment"):
+                    record["summary"] = self.summarizer.summarize(
+                        content, SUMMARY_INSTRUCTION, priority=Priority.BATCH)
+                    record["contributions"] = _bullets(self.summarizer.summarize(
+                        content, CONTRIBUTIONS_INSTRUCTION, priority=Priority.BATCH, max_tokens=400))
+                    record["limitations"] = _bullets(self.summarizer.summarize(
+                        content, LIMITATIONS_INSTRUCTION, priority=Priority.BATCH, max_tokens=400))
+                record["status"] = "ready"
+                break
+            except SchedulerSaturated as e:
+                # Busy with interactive work; back off and try again later
+                if attempt == self.max_attempts:
+                    record["status"], record["error"] = "failed", str(e)
+                else:
+                    time.sleep(e.retry_after)
+            except Exception as e:
+                record["status"], record["error"] = "failed", str(e)
+                break
+
+        if record["status"] == "failed":
+            # Consecutive failures on the same content lengthen the backoff
+            same = previous is not None and previous.get("content_hash") == digest and previous.get("status") == "failed"
+            record["failures"] = previous.get("failures", 1) + 1 if same else 1
+        record["updated"] = datetime.now().isoformat()
+        with self.store.transaction() as ops:
+            ops.append({"op": "put", "doc_id": doc_id, "record": record})
+        log_event("enrichment", doc_id=doc_id, status=record["status"], sections=len(record["sections"]))
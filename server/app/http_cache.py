@@ -0,0 +1,90 @@
+import time
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+from app.metrics import record_cache
+
+# Clients may keep the body but must revalidate it (If-None-Match) before each reuse
+REVALIDATE = "no-cache"
+
+
+def etag_for(*parts: Any) -> str:
+    """Weak ETag from whatever determines a response (store generations, query params).
+
+    Weak because the GZip middleware may re-encode the body; the JSON it
+    carries is what the tag vouches for.
+    """
+    digest = hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against etag"""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any((tag.strip()[2:] if tag.strip().startswith("W/") else tag.strip()) == opaque
+               for tag in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": REVALIDATE})
+
+
+def conditional_json(request: Request, etag: str, build: Callable[[], Any]) -> Response:
+    """304 if the client holds etag, otherwise build() as JSON tagged with it.
+
+    etag must be cheap to compute (from generations, not from the body), so
+    an unchanged list costs one comparison instead of a re-serialization.
+    """
+    if etag_matches(request, etag):
+        record_cache("http_etag", True)
+        return not_modified(etag)
+    record_cache("http_etag", False)
+    return JSONResponse(content=build(), headers={"ETag": etag, "Cache-Control": REVALIDATE})
+
+
+def hashed_json(request: Request, content: Any) -> Response:
+    """JSON tagged with a hash of its own body, for small responses with no generation to key on"""
+    body = JSONResponse(content=content).body
+    etag = f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return Response(content=body, media_type="application/json",
+                    headers={"ETag": etag, "Cache-Control": REVALIDATE})
+
+
+class TTLValue:
+    """One value recomputed at most every ttl seconds, with concurrent refreshes collapsed.
+
+    While a refresh is running, other callers wait for it instead of
+    starting their own, so a burst of polls costs a single upstream call.
+    """
+
+    def __init__(self, ttl: float, name: str):
+        self.ttl = ttl
+        self.name = name
+        self._value: Optional[Any] = None
+        self._expires = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, compute: Callable[[], Awaitable[Any]]) -> Any:
+        if time.monotonic() < self._expires:
+            record_cache(self.name, True)
+            return self._value
+        async with self._lock:
+            # Another caller may have refreshed it while this one waited
+            if time.monotonic() < self._expires:
+                record_cache(self.name, True)
+                return self._value
+            record_cache(self.name, False)
+            self._value = await compute()
+            self._expires = time.monotonic() + self.ttl
+            return self._value
@@ -6,6 +6,21 @@ import os
 import subprocess
 from typing import Dict, List
 
+from app.metrics import OCR_SECONDS
+from app.keyword_matcher import KeywordMatcher
+
+# Declaration order breaks ties between equally scored categories
+RESEARCH_CATEGORIES = {
+    "algorithm": ["algorithm", "pseudocode", "procedure", "function", "input", "output"],
+    "graph_chart": ["graph", "plot", "chart", "curve", "figure", "axis", "x-axis", "y-axis"],
+    "data_table": ["table", "data", "results", "statistics", "mean", "std", "p-value"],
+    "architecture": ["architecture", "framework", "model", "flowchart", "diagram", "system"],
+    "mathematical": ["equation", "formula", "math", "calculate", "derivative", "integral"],
+    "abstract": ["abstract", "summary", "introduction", "conclusion"],
+    "methodology": ["method", "methodology", "experiment", "procedure", "setup"]
+}
+_CATEGORY_MATCHER = KeywordMatcher(RESEARCH_CATEGORIES)
+
 class ImageProcessor:
     def __init__(self):
         self.supported_formats = ['.png', '.jpg', '.jpeg', '.bmp', '.tiff']
@@ -84,10 +99,11 @@ class ImageProcessor:
             
             for config in configs:
                 try:
-                    if config:
-                        text = pytesseract.image_to_string(image, config=config)
-                    else:
-                        text = pytesseract.image_to_string(image)
+                    with OCR_SECONDS.time(config=config or "default"):
+                        if config:
+                            text = pytesseract.image_to_string(image, config=config)
+                        else:
+                            text = pytesseract.image_to_string(image)
                     
                     if text.strip() and len(text.strip()) > len(best_text.strip()):
                         best_text = text
@@ -133,13 +149,16 @@ class ImageProcessor:
         ocr_result = self.extract_text_from_image(image_data)
         
         content_type = "unknown"
+        content_scores = {}
         if ocr_result["success"] and ocr_result["extracted_text"]:
-            content_type = self.classify_image_content(ocr_result["extracted_text"])
+            content_scores = dict(self.score_image_content(ocr_result["extracted_text"]))
+            content_type = self.classify_image_content(ocr_result["extracted_text"], content_scores)
             print(f" 📊 Content classified as: {content_type}")
         
         analysis = {
             "analysis_type": "research_image",
             "content_classification": content_type,
+            "content_scores": content_scores,
             "ocr_results": ocr_result,
             "tesseract_available": self.tesseract_available,
             "tesseract_path": self.tesseract_path,
@@ -148,28 +167,20 @@ class ImageProcessor:
         
         return analysis
     
-    def classify_image_content(self, text: str) -> str:
-        """Classify the type of research image based on text content"""
+    def score_image_content(self, text: str) -> Dict[str, int]:
+        """Keyword hits per research category, from a single pass over the text"""
+        return _CATEGORY_MATCHER.counts(text)
+    
+    def classify_image_content(self, text: str, scores: Dict[str, int] = None) -> str:
+        """Classify the type of research image as its highest-scoring category"""
         if not text.strip():
             return "unknown"
-            
-        text_lower = text.lower()
-        
-        research_categories = {
-            "algorithm": ["algorithm", "pseudocode", "procedure", "function", "input", "output"],
-            "graph_chart": ["graph", "plot", "chart", "curve", "figure", "axis", "x-axis", "y-axis"],
-            "data_table": ["table", "data", "results", "statistics", "mean", "std", "p-value"],
-            "architecture": ["architecture", "framework", "model", "flowchart", "diagram", "system"],
-            "mathematical": ["equation", "formula", "math", "calculate", "derivative", "integral"],
-            "abstract": ["abstract", "summary", "introduction", "conclusion"],
-            "methodology": ["method", "methodology", "experiment", "procedure", "setup"]
-        }
-        
-        for category, keywords in research_categories.items():
-            if any(keyword in text_lower for keyword in keywords):
-                return category
         
-        return "text_content"
+        if scores is None:
+            scores = self.score_image_content(text)
+        if not scores:
+            return "text_content"
+        return max(RESEARCH_CATEGORIES, key=lambda category: scores.get(category, 0))
     
     def get_suggested_actions(self, ocr_result: Dict) -> List[str]:
         """Get suggested actions based on image content"""
@@ -0,0 +1,79 @@
+import re
+from collections import Counter
+from typing import Dict, Iterable, List
+
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    """Regex for a set of keywords, factored into a trie.
+
+    Keywords that share a prefix share one branch (``method(?:ology)?``), so
+    at each text position the engine follows a single path of at most the
+    longest keyword's length. Adding keywords adds branches, not passes.
+    """
+    trie: Dict = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def emit(node: Dict) -> str:
+        ends = "" in node
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # Longer continuations are tried first, so the longest keyword wins
+        if ends:
+            body = "(?:" + body + ")?"
+        return body
+
+    return emit(trie)
+
+
+class KeywordMatcher:
+    """Scores text against keyword categories in one linear pass.
+
+    All keywords of all categories are compiled once into a single
+    case-insensitive trie regex, wrapped in a lookahead so a match is tried
+    at every position. Scanning returns how often each category's keywords
+    occur as substrings, overlaps included: "flowchart" counts both "flow"
+    and "chart", and the longest match at a position also counts the
+    keywords that are its prefixes. Callers can rank categories instead of
+    taking the first one that hits.
+    A keyword listed under several categories counts for each of them.
+    """
+
+    def __init__(self, categories: Dict[str, Iterable[str]]):
+        self.categories: List[str] = list(categories)
+        self._owners: Dict[str, List[str]] = {}
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                self._owners.setdefault(keyword.lower(), []).append(category)
+        # Keywords found by a longest match: itself and every keyword it starts with
+        self._found: Dict[str, List[str]] = {
+            keyword: [prefix for prefix in self._owners if keyword.startswith(prefix)]
+            for keyword in self._owners
+        }
+        self._pattern = re.compile("(?=(" + _trie_pattern(self._owners) + "))", re.IGNORECASE)
+
+    def counts(self, text: str) -> Counter:
+        """Hits per category; categories with no hits are absent"""
+        hits = Counter(match.lower() for match in self._pattern.findall(text))
+        scores = Counter()
+        for longest, count in hits.items():
+            for keyword in self._found[longest]:
+                for category in self._owners[keyword]:
+                    scores[category] += count
+        return scores
+
+    def best(self, text: str, default: str = None) -> str:
+        """Category with the most hits; ties go to the category declared first"""
+        scores = self.counts(text)
+        if not scores:
+            return default
+        return max(self.categories, key=lambda category: (scores[category], -self.categories.index(category)))
+
+    def search(self, text: str) -> bool:
+        """True if any keyword occurs; stops at the first hit"""
+        return self._pattern.search(text) is not None
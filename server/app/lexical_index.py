@@ -0,0 +1,286 @@
+import re
+import math
+import heapq
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.text_chunker import TextChunker
+
+_TERM_RE = re.compile(r"\w+")
+
+
+def query_terms(text: str) -> List[str]:
+    """Index/query terms: lowercase words longer than 3 characters (the FTS backend's rule)"""
+    return [t for t in _TERM_RE.findall(text.lower()) if len(t) > 3]
+
+
+class LexicalIndex:
+    """In-memory inverted index over document chunks with bm25 ranking.
+
+    Postings map each term to the chunks containing it, so a query only
+    touches the postings of its own terms rather than every document. Chunks
+    are kept as character spans; callers slice text back out of the document
+    they already hold.
+
+    Postings are keyed by ``(doc_id, slot)``, where a slot is a chunk id that
+    stays fixed for the life of the chunk. When a document is re-added, its
+    chunks are matched to the previous version by content hash. Unchanged
+    chunks keep their slot and postings even if they moved, and only new or
+    edited chunks are tokenized.
+    """
+
+    def __init__(self, chunker: TextChunker = None, k1: float = 1.2, b: float = 0.75):
+        self.chunker = chunker or TextChunker()
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[Tuple[str, int], int]] = {}
+        self.chunk_lengths: Dict[Tuple[str, int], int] = {}
+        self.spans: Dict[str, List[Tuple[int, int]]] = {}  # by position in the document
+        self._slots: Dict[str, List[int]] = {}  # slot of each position
+        self._positions: Dict[str, Dict[int, int]] = {}  # position of each slot
+        self._hashes: Dict[str, List[Optional[str]]] = {}  # chunk hash of each position
+        self._chunk_terms: Dict[str, Dict[int, List[str]]] = {}  # terms of each slot, for removal
+        self._doc_sizes: Dict[str, int] = {}  # postings per document
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.chunk_lengths)
+
+    def _index_chunk(self, doc_id: str, slot: int, text: str):
+        key = (doc_id, slot)
+        counts = Counter(query_terms(text))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[key] = tf
+        self._chunk_terms[doc_id][slot] = list(counts)
+        self._doc_sizes[doc_id] += len(counts)
+        length = sum(counts.values())
+        self.chunk_lengths[key] = length
+        self._total_length += length
+
+    def _drop_chunk(self, doc_id: str, slot: int):
+        key = (doc_id, slot)
+        terms = self._chunk_terms[doc_id].pop(slot, ())
+        # Only this chunk's own entries are touched, not whole postings lists
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self.postings[term]
+        self._doc_sizes[doc_id] -= len(terms)
+        self._total_length -= self.chunk_lengths.pop(key, 0)
+
+    def add(self, doc_id: str, text: str) -> int:
+        """Index a document's chunks, replacing any previous version.
+
+        Returns how many chunks had to be tokenized; chunks whose hash
+        matches one of the previous version are carried over as they are.
+        """
+        chunks = self.chunker.chunk(text)
+        old_slots = self._slots.get(doc_id, [])
+        reusable: Dict[str, List[int]] = {}
+        for slot, digest in zip(old_slots, self._hashes.get(doc_id, [])):
+            if digest is not None:
+                reusable.setdefault(digest, []).append(slot)
+        self._chunk_terms.setdefault(doc_id, {})
+        self._doc_sizes.setdefault(doc_id, 0)
+
+        next_slot = max(old_slots, default=-1) + 1
+        slots = []
+        indexed = 0
+        for chunk in chunks:
+            candidates = reusable.get(chunk["hash"])
+            if candidates:
+                slots.append(candidates.pop(0))
+                continue
+            self._index_chunk(doc_id, next_slot, chunk["text"])
+            slots.append(next_slot)
+            next_slot += 1
+            indexed += 1
+        for leftover in reusable.values():
+            for slot in leftover:
+                self._drop_chunk(doc_id, slot)
+
+        self._slots[doc_id] = slots
+        self._positions[doc_id] = {slot: position for position, slot in enumerate(slots)}
+        self._hashes[doc_id] = [chunk["hash"] for chunk in chunks]
+        self.spans[doc_id] = [(chunk["start"], chunk["end"]) for chunk in chunks]
+        return indexed
+
+    def remove(self, doc_id: str):
+        if doc_id not in self._slots:
+            return
+        for slot in self._slots.pop(doc_id):
+            self._drop_chunk(doc_id, slot)
+        for index in (self._positions, self._hashes, self._chunk_terms, self._doc_sizes, self.spans):
+            index.pop(doc_id, None)
+
+    def clear(self):
+        self.postings.clear()
+        self.chunk_lengths.clear()
+        for index in (self._slots, self._positions, self._hashes, self._chunk_terms, self._doc_sizes, self.spans):
+            index.clear()
+        self._total_length = 0
+
+    def to_arrays(self) -> Dict[str, Any]:
+        """The index in flat form (CSR postings plus per-chunk columns), for snapshot archives.
+
+        ``docs`` and ``terms`` are lists; everything else is a NumPy array.
+        Chunk ids number chunks in document order, and each term's postings
+        are ``post_chunk/post_tf[term_offsets[t]:term_offsets[t + 1]]``.
+        """
+        docs = list(self.spans)
+        chunk_ids: Dict[Tuple[str, int], int] = {}
+        chunk_doc, chunk_start, chunk_end, chunk_length, hashes = [], [], [], [], []
+        for d, doc_id in enumerate(docs):
+            for slot, (start, end), digest in zip(self._slots[doc_id], self.spans[doc_id], self._hashes[doc_id]):
+                chunk_ids[(doc_id, slot)] = len(chunk_doc)
+                chunk_doc.append(d)
+                chunk_start.append(start)
+                chunk_end.append(end)
+                chunk_length.append(self.chunk_lengths[(doc_id, slot)])
+                hashes.append(digest or "")
+
+        terms = sorted(self.postings)
+        term_offsets, post_chunk, post_tf = [0], [], []
+        for term in terms:
+            for key, tf in self.postings[term].items():
+                post_chunk.append(chunk_ids[key])
+                post_tf.append(tf)
+            term_offsets.append(len(post_chunk))
+        return {
+            "docs": docs,
+            "terms": terms,
+            "term_offsets": np.array(term_offsets, dtype=np.int64),
+            "post_chunk": np.array(post_chunk, dtype=np.int32),
+            "post_tf": np.array(post_tf, dtype=np.int32),
+            "chunk_doc": np.array(chunk_doc, dtype=np.int32),
+            "chunk_start": np.array(chunk_start, dtype=np.int64),
+            "chunk_end": np.array(chunk_end, dtype=np.int64),
+            "chunk_length": np.array(chunk_length, dtype=np.int32),
+            "chunk_hash": np.array(hashes, dtype="S16"),
+        }
+
+    def load_arrays(self, arrays: Dict[str, Any]):
+        """Replace the index with one exported by :meth:`to_arrays`, without re-chunking or tokenizing"""
+        self.clear()
+        docs = arrays["docs"]
+        chunk_doc = arrays["chunk_doc"]
+        # Indexes exported before chunk hashes existed re-tokenize each document on its next update
+        hashes = [digest.decode("ascii") or None for digest in arrays["chunk_hash"].tolist()] \
+            if "chunk_hash" in arrays else [None] * len(chunk_doc)
+        keys = []
+        for d, start, end, length, digest in zip(chunk_doc.tolist(), arrays["chunk_start"].tolist(),
+                                                 arrays["chunk_end"].tolist(), arrays["chunk_length"].tolist(),
+                                                 hashes):
+            doc_id = docs[d]
+            spans = self.spans.setdefault(doc_id, [])
+            key = (doc_id, len(spans))
+            spans.append((start, end))
+            self._hashes.setdefault(doc_id, []).append(digest)
+            self.chunk_lengths[key] = length
+            self._total_length += length
+            keys.append(key)
+        for doc_id in docs:
+            slots = list(range(len(self.spans.setdefault(doc_id, []))))
+            self._slots[doc_id] = slots
+            self._positions[doc_id] = {slot: slot for slot in slots}
+            self._hashes.setdefault(doc_id, [])
+            self._chunk_terms[doc_id] = {}
+            self._doc_sizes[doc_id] = 0
+
+        offsets = arrays["term_offsets"]
+        post_chunk = arrays["post_chunk"]
+        terms = arrays["terms"]
+        chunks, tfs, bounds = post_chunk.tolist(), arrays["post_tf"].tolist(), offsets.tolist()
+        for t, term in enumerate(terms):
+            start, end = bounds[t], bounds[t + 1]
+            self.postings[term] = dict(zip(map(keys.__getitem__, chunks[start:end]), tfs[start:end]))
+
+        # Per-chunk term lists: postings regrouped by chunk id
+        posting_term = np.repeat(np.arange(len(terms)), np.diff(offsets))
+        order = np.argsort(post_chunk, kind="stable")
+        by_chunk_terms = list(map(terms.__getitem__, posting_term[order].tolist()))
+        chunk_bounds = np.searchsorted(post_chunk[order], np.arange(len(keys) + 1)).tolist()
+        for chunk, (doc_id, slot) in enumerate(keys):
+            chunk_terms = by_chunk_terms[chunk_bounds[chunk]:chunk_bounds[chunk + 1]]
+            self._chunk_terms[doc_id][slot] = chunk_terms
+            self._doc_sizes[doc_id] += len(chunk_terms)
+
+    def _matching_postings(self, terms: List[str], doc_ids: Optional[Iterable[str]]):
+        """(term, chunk key, tf) for every query term occurrence, within doc_ids if given.
+
+        A restricted search walks the candidate documents' own postings when
+        that is cheaper than walking the query terms' corpus-wide postings,
+        so scoped queries cost about as much as the subset they cover.
+        """
+        if doc_ids is None:
+            for term in terms:
+                for key, tf in self.postings.get(term, {}).items():
+                    yield term, key, tf
+            return
+        doc_ids = [doc_id for doc_id in doc_ids if doc_id in self._chunk_terms]
+        subset_cost = sum(self._doc_sizes[doc_id] for doc_id in doc_ids)
+        corpus_cost = sum(len(self.postings.get(term, ())) for term in terms)
+        if subset_cost < corpus_cost:
+            wanted = set(terms)
+            for doc_id in doc_ids:
+                for slot, chunk_terms in self._chunk_terms[doc_id].items():
+                    key = (doc_id, slot)
+                    for term in chunk_terms:
+                        if term in wanted:
+                            yield term, key, self.postings[term][key]
+        else:
+            allowed = set(doc_ids)
+            for term in terms:
+                for key, tf in self.postings.get(term, {}).items():
+                    if key[0] in allowed:
+                        yield term, key, tf
+
+    def _score(self, query: str, doc_ids: Iterable[str] = None) -> Dict[Tuple[str, int], float]:
+        """bm25 score of every chunk that shares a term with the query (optionally within doc_ids).
+
+        Statistics (idf, average length) are always corpus-wide, so scores
+        are comparable with and without a restriction.
+        """
+        terms = list(dict.fromkeys(query_terms(query)))
+        n = len(self.chunk_lengths)
+        if not terms or not n:
+            return {}
+        avg_length = self._total_length / n or 1.0
+        idf = {}
+        for term in terms:
+            df = len(self.postings.get(term, ()))
+            idf[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+        scores: Dict[Tuple[str, int], float] = {}
+        for term, key, tf in self._matching_postings(terms, doc_ids):
+            norm = self.k1 * (1 - self.b + self.b * self.chunk_lengths[key] / avg_length)
+            scores[key] = scores.get(key, 0.0) + idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, top_k: int = 10, doc_ids: Iterable[str] = None) -> List[Tuple[str, int, float]]:
+        """Best chunks for a query as (doc_id, chunk_index, score), highest score first"""
+        best = heapq.nlargest(top_k, self._score(query, doc_ids).items(), key=lambda item: item[1])
+        return [(doc_id, self._positions[doc_id][slot], score) for (doc_id, slot), score in best]
+
+    def best_per_document(self, query: str, top_k: int = 3,
+                          doc_ids: Iterable[str] = None) -> List[Tuple[str, int, float]]:
+        """Top documents ranked by their best chunk, as (doc_id, chunk_index, score)"""
+        best = {}
+        for (doc_id, slot), score in self._score(query, doc_ids).items():
+            if doc_id not in best or score > best[doc_id][2]:
+                best[doc_id] = (doc_id, slot, score)
+        top = heapq.nlargest(top_k, best.values(), key=lambda item: item[2])
+        return [(doc_id, self._positions[doc_id][slot], score) for doc_id, slot, score in top]
+
+    def chunk_span(self, doc_id: str, index: int) -> Tuple[int, int]:
+        return self.spans[doc_id][index]
+
+    def spans_by_hash(self, doc_id: str) -> Dict[str, Tuple[int, int]]:
+        """Span of each indexed chunk of a document, keyed by its chunk hash"""
+        return {digest: span for digest, span in zip(self._hashes.get(doc_id, []), self.spans.get(doc_id, []))
+                if digest is not None}
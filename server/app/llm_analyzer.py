@@ -1,9 +1,13 @@
 ﻿import requests
 import json
-import re
 import os
 from dotenv import load_dotenv
 
+from app.llm_scheduler import Priority, SchedulerSaturated
+from app.ollama_client import OllamaClient
+from app.context_packer import ContextPacker, CONTEXT_SLOT, clean_context
+from app.summarizer import MapReduceSummarizer
+
 # Load environment variables
 load_dotenv()
 
@@ -16,6 +20,9 @@ class LLMAnalyzer:
         
         # Construct the full API URL
         self.ollama_url = f"{self.ollama_base_url}/api/generate"
+        self.client = OllamaClient(self.ollama_base_url)
+        self.packer = ContextPacker(self.model)
+        self.summarizer = MapReduceSummarizer(self.client, self.model)
         
         print(f"🔧 Ollama Configuration:")
         print(f"   URL: {self.ollama_url}")
@@ -54,18 +61,12 @@ class LLMAnalyzer:
             return self._fallback_analysis(text_content)
             
         try:
-            truncated_text = text_content[:3000] + "..." if len(text_content) > 3000 else text_content
-            
-            prompt = f"""
-            Analyze this research paper and provide key insights:
-
-            {truncated_text}
-
-            Focus on the main topic, methodology, and findings.
-            Provide a concise summary.
-            """
-            
-            response = self._call_ollama(prompt, max_tokens=800)
+            # Map-reduce over the whole paper rather than only its opening pages
+            response = self.summarizer.summarize(
+                text_content,
+                instruction="Focus on the main topic, methodology, and findings. Provide a concise summary.",
+                priority=Priority.BATCH,
+            )
             
             return {
                 "summary": response[:400] + "..." if len(response) > 400 else response,
@@ -76,6 +77,8 @@ class LLMAnalyzer:
                 "future_work": "Ask specific questions for detailed insights"
             }
             
+        except SchedulerSaturated:
+            raise
         except Exception as e:
             print(f"Analysis error: {e}")
             return self._fallback_analysis(text_content)
@@ -86,49 +89,41 @@ class LLMAnalyzer:
             return self._fallback_answer(context, question)
             
         try:
-            clean_context = self._clean_context(context)
-            
-            prompt = f"""
-            Based on this research paper content: {clean_context[:1800]}
+            template = f"""
+            Based on this research paper content: {CONTEXT_SLOT}
             
             Question: {question}
             
             Provide a direct, evidence-based answer:
             """
+            prompt = self.packer.build_prompt(template, context, query=question, max_new_tokens=600)
             
-            response = self._call_ollama(prompt, max_tokens=600)
+            response = self._call_ollama(prompt, max_tokens=600, priority=Priority.INTERACTIVE)
             return response.strip()
             
+        except SchedulerSaturated:
+            raise
         except Exception as e:
             print(f"Q&A error: {e}")
             return self._fallback_answer(context, question)
     
-    def _call_ollama(self, prompt: str, max_tokens: int = 500) -> str:
+    def _call_ollama(self, prompt: str, max_tokens: int = 500, priority: Priority = Priority.INTERACTIVE) -> str:
         """Make API call to Ollama"""
         payload = {
             "model": self.model,
             "prompt": prompt,
-            "stream": False,
             "options": {
                 "temperature": 0.3,
-                "num_predict": max_tokens
+                "num_predict": max_tokens,
+                **self.packer.options()
             }
         }
         
-        response = requests.post(self.ollama_url, json=payload, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
-        return result['response']
+        return self.client.generate(payload, timeout=30, caller="llm_analyzer", priority=priority)
     
     def _clean_context(self, context: str) -> str:
         """Clean the context by removing boilerplate text"""
-        if "Relevant excerpts from the research paper:" in context:
-            content_start = context.find("Relevant excerpts from the research paper:") + len("Relevant excerpts from the research paper:")
-            actual_content = context[content_start:].strip()
-            clean_content = re.sub(r'\[Excerpt \d+\].*?:\s*', '', actual_content)
-            return clean_content
-        return context
+        return clean_context(context)
     
     def _fallback_answer(self, context: str, question: str) -> str:
         """Fallback answer if Ollama fails"""
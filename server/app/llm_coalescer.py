@@ -0,0 +1,93 @@
+import json
+import hashlib
+import threading
+import contextvars
+from typing import Callable, Dict, Iterator
+
+from app.metrics import record_cache, log_event
+
+
+def payload_key(payload: Dict) -> str:
+    """Stable hash of a generation request (model, prompt and options)"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+        self.subscribers = 0
+
+
+class SingleFlight:
+    """Share one upstream stream between identical concurrent requests.
+
+    The first caller for a key starts the producer in a pump thread; every
+    caller (leader included) reads fragments from a shared buffer, so late
+    joiners replay what was already produced and then follow live. A caller
+    that stops reading early does not stall the others. Once the producer
+    finishes the key is released, so later requests start a fresh generation.
+    """
+
+    def __init__(self, name: str = "llm_inflight"):
+        self.name = name
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def stream(self, key: str, producer: Callable[[], Iterator[str]]) -> Iterator[str]:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            flight.subscribers += 1
+        record_cache(self.name, hit=not leader)
+
+        if leader:
+            # Run the pump under the leader's context so its trace id tags the upstream call
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(self._pump, key, flight, producer), daemon=True).start()
+        else:
+            log_event("llm_coalesced", key=key[:12])
+
+        return self._follow(flight)
+
+    def _pump(self, key: str, flight: _Flight, producer: Callable[[], Iterator[str]]):
+        try:
+            for chunk in producer():
+                with flight.cond:
+                    flight.chunks.append(chunk)
+                    flight.cond.notify_all()
+        except BaseException as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+
+    @staticmethod
+    def _follow(flight: _Flight) -> Iterator[str]:
+        position = 0
+        while True:
+            with flight.cond:
+                while position >= len(flight.chunks) and not flight.done:
+                    flight.cond.wait()
+                new_chunks = flight.chunks[position:]
+                finished = flight.done
+            for chunk in new_chunks:
+                yield chunk
+            position += len(new_chunks)
+            if finished and position >= len(flight.chunks):
+                if flight.error is not None:
+                    raise flight.error
+                return
@@ -0,0 +1,184 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from enum import IntEnum
+from contextlib import ExitStack, contextmanager
+from typing import Dict
+
+from app.metrics import LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT_SECONDS, LLM_REJECTED, log_event
+from app.shared_store import FileLock
+
+
+class Priority(IntEnum):
+    """Lower value is served first"""
+    INTERACTIVE = 0  # Q&A a user is waiting on
+    SUMMARY = 1      # paper summaries
+    BATCH = 2        # background / ingest-time analysis
+
+
+class SchedulerSaturated(Exception):
+    """Raised when a request cannot get an LLM slot; maps to HTTP 429"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("priority", "granted", "cancelled")
+
+    def __init__(self, priority: Priority):
+        self.priority = priority
+        self.granted = False
+        self.cancelled = False
+
+
+class LLMScheduler:
+    """Priority admission control in front of Ollama.
+
+    At most ``max_in_flight`` generations run at once. Everyone else waits in
+    a priority queue (FIFO within a class) and is rejected with
+    :class:`SchedulerSaturated` if their class's queue is full or their
+    queue-time deadline passes before a slot frees up.
+
+    The queue is per process. With ``slot_dir`` set, a generation also holds
+    one of ``max_in_flight`` slot files (``llm_slot.<n>.lock``, flocked) in
+    that directory, so the limit holds across every API worker instead of
+    being multiplied by their number.
+    """
+
+    def __init__(self, max_in_flight: int = 2, max_queue: Dict[Priority, int] = None,
+                 queue_timeout: Dict[Priority, float] = None, slot_dir: str = None):
+        self.max_in_flight = max_in_flight
+        self._slot_files = []
+        if slot_dir:
+            os.makedirs(slot_dir, exist_ok=True)
+            self._slot_files = [FileLock(os.path.join(slot_dir, f"llm_slot.{n}.lock"))
+                                for n in range(max_in_flight)]
+        self.max_queue = max_queue or {p: 32 for p in Priority}
+        self.queue_timeout = queue_timeout or {
+            Priority.INTERACTIVE: 30.0, Priority.SUMMARY: 60.0, Priority.BATCH: 300.0
+        }
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._queued = {p: 0 for p in Priority}
+        self._in_flight = 0
+        # Exponentially weighted service time, used for Retry-After hints
+        self._avg_service = 5.0
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        max_queue = int(os.getenv("LLM_MAX_QUEUE", "32"))
+        return cls(
+            max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "2")),
+            max_queue={p: max_queue for p in Priority},
+            queue_timeout={
+                Priority.INTERACTIVE: float(os.getenv("LLM_QUEUE_TIMEOUT_INTERACTIVE", "30")),
+                Priority.SUMMARY: float(os.getenv("LLM_QUEUE_TIMEOUT_SUMMARY", "60")),
+                Priority.BATCH: float(os.getenv("LLM_QUEUE_TIMEOUT_BATCH", "300")),
+            },
+            slot_dir=os.getenv("LLM_SLOT_DIR", "data/vector_store"),
+        )
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "in_flight": self._in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queued": {p.name.lower(): n for p, n in self._queued.items()},
+                "avg_service_seconds": round(self._avg_service, 3),
+            }
+
+    def _retry_after(self) -> int:
+        backlog = sum(self._queued.values()) + self._in_flight
+        return max(1, int(self._avg_service * backlog / max(self.max_in_flight, 1) + 0.5))
+
+    def _set_depth(self, priority: Priority, delta: int):
+        self._queued[priority] += delta
+        LLM_QUEUE_DEPTH.set(self._queued[priority], priority=priority.name.lower())
+
+    def _grant_next(self):
+        """Hand free slots to the highest-priority live waiters. Caller holds the lock."""
+        while self._heap and self._in_flight < self.max_in_flight:
+            _, _, waiter = heapq.heappop(self._heap)
+            if waiter.cancelled:
+                continue
+            waiter.granted = True
+            self._in_flight += 1
+            self._set_depth(waiter.priority, -1)
+        self._cond.notify_all()
+
+    def _reject(self, priority: Priority, reason: str, message: str):
+        LLM_REJECTED.inc(priority=priority.name.lower(), reason=reason)
+        retry_after = self._retry_after()
+        log_event("llm_rejected", priority=priority.name.lower(), reason=reason, retry_after=retry_after)
+        raise SchedulerSaturated(message, retry_after)
+
+    def acquire(self, priority: Priority = Priority.INTERACTIVE, timeout: float = None):
+        label = priority.name.lower()
+        start = time.perf_counter()
+        with self._cond:
+            if self._in_flight < self.max_in_flight and not self._heap:
+                self._in_flight += 1
+                LLM_QUEUE_WAIT_SECONDS.observe(0.0, priority=label)
+                return
+            if self._queued[priority] >= self.max_queue[priority]:
+                self._reject(priority, "queue_full", "The AI model is busy; too many requests are queued.")
+
+            waiter = _Waiter(priority)
+            heapq.heappush(self._heap, (int(priority), next(self._seq), waiter))
+            self._set_depth(priority, 1)
+            # Slots may be free with only cancelled entries ahead of us
+            self._grant_next()
+            deadline = start + (timeout if timeout is not None else self.queue_timeout[priority])
+            while not waiter.granted:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    waiter.cancelled = True
+                    self._set_depth(priority, -1)
+                    LLM_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - start, priority=label)
+                    self._reject(priority, "deadline", "The AI model is busy; request waited too long in the queue.")
+                self._cond.wait(remaining)
+        LLM_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - start, priority=label)
+
+    def release(self, service_seconds: float = None):
+        with self._cond:
+            self._in_flight -= 1
+            if service_seconds is not None:
+                self._avg_service = 0.8 * self._avg_service + 0.2 * service_seconds
+            self._grant_next()
+
+    def _hold_slot_file(self, stack: ExitStack, priority: Priority, deadline: float):
+        """Take a free server-wide slot file onto stack, polling until deadline"""
+        while True:
+            for slot_file in self._slot_files:
+                with ExitStack() as attempt:
+                    if attempt.enter_context(slot_file.try_acquire()):
+                        stack.push(attempt.pop_all())
+                        return
+            if time.perf_counter() >= deadline:
+                self._reject(priority, "deadline", "The AI model is busy; request waited too long in the queue.")
+            time.sleep(0.05)
+
+    @contextmanager
+    def slot(self, priority: Priority = Priority.INTERACTIVE, timeout: float = None):
+        """Hold one generation slot for the duration of the block"""
+        deadline = time.perf_counter() + (timeout if timeout is not None else self.queue_timeout[priority])
+        self.acquire(priority, timeout)
+        service_seconds = None
+        try:
+            with ExitStack() as stack:
+                if self._slot_files:
+                    self._hold_slot_file(stack, priority, deadline)
+                start = time.perf_counter()
+                yield
+                service_seconds = time.perf_counter() - start
+        finally:
+            self.release(service_seconds)
+
+
+# Process-wide scheduler shared by every Ollama client
+scheduler = LLMScheduler.from_env()
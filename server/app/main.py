@@ -1,9 +1,14 @@
-﻿from fastapi import FastAPI, File, UploadFile, HTTPException, Form
+﻿from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 import os
+import hmac
+import time
 import requests
+import io
 import base64
+from typing import List
 from dotenv import load_dotenv
 
 # Import all your components
@@ -11,7 +16,25 @@ from app.pdf_processor import PDFProcessor
 from app.image_processor import ImageProcessor
 from app.llm_analyzer import LLMAnalyzer
 from app.rag_system import RAGSystem
+from app.sqlite_store import SQLiteRAGSystem
 from app.vector_store import VectorStore
+from app.ollama_client import OllamaClient
+from app.context_packer import ContextPacker, CONTEXT_SLOT
+from app.summarizer import MapReduceSummarizer
+from app.enrichment import PaperEnricher
+from app.corpus_qa import CorpusQA
+from app.citations import CitationIndex, CITATION_PREAMBLE, looks_like_citations, parse_citations
+from app.keyword_matcher import KeywordMatcher
+from app.table_store import TableStore, TABLE_EXTRACTION_ENABLED
+from app.search_filter import SearchFilter
+from app.llm_scheduler import Priority, SchedulerSaturated, scheduler as llm_scheduler
+from app.profiling import (
+    SamplingProfiler, RequestProfiler, MemoryProfiler, PROFILE_MAX_SECONDS, run_in_threadpool
+)
+from app.http_cache import TTLValue, conditional_json, etag_for, hashed_json
+from app.metrics import (
+    REGISTRY, HTTP_REQUEST_SECONDS, STAGE_SECONDS, trace_id_var, new_trace_id, log_event
+)
 
 # Try to load .env file
 load_dotenv()
@@ -20,6 +43,21 @@ load_dotenv()
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
 OLLAMA_ENABLED = os.getenv("OLLAMA_ENABLED", "true").lower() == "true"
+# /ollama-status answers from a cached probe this many seconds old at most
+OLLAMA_STATUS_TTL = float(os.getenv("OLLAMA_STATUS_TTL", "10"))
+
+# Responses at least this large are gzipped for clients that accept it
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
+
+# Document store backend: "json" (in-memory + journal) or "sqlite" (FTS5)
+RAG_BACKEND = os.getenv("RAG_BACKEND", "json").lower()
+
+# Background per-paper analysis after upload; backfill also queues already stored papers at startup
+ENRICHMENT_ENABLED = os.getenv("ENRICHMENT_ENABLED", "true").lower() == "true"
+ENRICHMENT_BACKFILL = os.getenv("ENRICHMENT_BACKFILL", "false").lower() == "true"
+
+# Profiling endpoints (/admin/profile/...) exist only when an admin token is configured
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 
 print("🔍 Checking Ollama configuration...")
 print(f"OLLAMA_BASE_URL: {OLLAMA_BASE_URL}")
@@ -34,7 +72,63 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "ETag"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES)
+
+@app.exception_handler(SchedulerSaturated)
+async def llm_saturated_handler(request: Request, exc: SchedulerSaturated):
+    """The LLM queue is full or the request outwaited its deadline"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+def _is_admin(request: Request) -> bool:
+    supplied = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(supplied.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+def _require_admin(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not _is_admin(request):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+request_profiler = RequestProfiler()
+memory_profiler = MemoryProfiler()
+
+# Registered before trace_requests, so it runs inside it and sees the trace id
+@app.middleware("http")
+async def profile_tagged_requests(request: Request, call_next):
+    """cProfile requests sent with ``X-Profile: cpu`` and a valid admin token"""
+    if request.headers.get("X-Profile", "").lower() != "cpu" or not _is_admin(request):
+        return await call_next(request)
+    response, session = await request_profiler.profile(
+        trace_id_var.get(), request.url.path, lambda: call_next(request))
+    # "busy" when another tagged request holds the profiler
+    response.headers["X-Profile-Id"] = session.trace_id if session else "busy"
+    return response
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Tag each request with a trace id and record its latency"""
+    trace_id = request.headers.get("X-Request-ID") or new_trace_id()
+    token = trace_id_var.set(trace_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = trace_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", request.url.path)
+        HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, route=route_path, status=status)
+        log_event("request", method=request.method, route=route_path, status=status, seconds=round(elapsed, 6))
+        trace_id_var.reset(token)
 
 print("🚀 Initializing AI Research Paper Analyzer components...")
 
@@ -91,44 +185,77 @@ except Exception as e:
     print(f"❌ LLM Analyzer failed: {e}")
     llm_analyzer = None
 
-try:
-    rag_system = RAGSystem()
-    print("✅ RAG System initialized")
-except Exception as e:
-    print(f"❌ RAG System failed: {e}")
-    rag_system = None
+rag_system = None
+if RAG_BACKEND == "sqlite":
+    try:
+        rag_system = SQLiteRAGSystem()
+        print("✅ RAG System initialized (SQLite FTS5 backend)")
+    except Exception as e:
+        print(f"❌ SQLite RAG backend failed, falling back to JSON store: {e}")
+
+if rag_system is None:
+    try:
+        rag_system = RAGSystem()
+        print("✅ RAG System initialized")
+    except Exception as e:
+        print(f"❌ RAG System failed: {e}")
+        rag_system = None
+
+ollama_client = OllamaClient(OLLAMA_BASE_URL)
+context_packer = ContextPacker(OLLAMA_MODEL)
+summarizer = MapReduceSummarizer(ollama_client, OLLAMA_MODEL)
+enricher = PaperEnricher(
+    summarizer,
+    load_content=lambda doc_id: rag_system.get_document_content(doc_id) if rag_system else "",
+    enabled=OLLAMA_AVAILABLE and ENRICHMENT_ENABLED,
+)
+corpus_qa = CorpusQA(rag_system, ollama_client, OLLAMA_MODEL)
+citation_index = CitationIndex()
+table_store = TableStore()
+# Reply length for call_ollama_api; reserved out of the context window
+MAX_ANSWER_TOKENS = 2000
+# Markers of a context that was only partly extracted; compiled once, checked in one pass
+EXTRACTION_ISSUE_MARKERS = KeywordMatcher({"extraction_issue": ["corrupted", "partial"]})
 
 # Create necessary directories
 os.makedirs("data/uploads", exist_ok=True)
 os.makedirs("data/vector_store", exist_ok=True)
 
-def call_ollama_api(prompt: str, context: str = None, document_type: str = "research") -> str:
-    """Call Ollama local LLM API with smarter context handling"""
+
+@app.on_event("startup")
+def start_enrichment_backfill():
+    # Off the import path, and only one worker runs it (see PaperEnricher.start_backfill)
+    if enricher.enabled and ENRICHMENT_BACKFILL and rag_system:
+        enricher.start_backfill(rag_system.page_documents)
+
+
+def call_ollama_api(prompt: str, context: str = None, document_type: str = "research",
+                    priority: Priority = Priority.INTERACTIVE) -> str:
+    """Call Ollama local LLM API with smarter context handling.
+    
+    Raises SchedulerSaturated when no generation slot is available in time.
+    """
     if not OLLAMA_AVAILABLE:
         return "Ollama is not available. Please ensure Ollama is installed and running."
     
     try:
         # Check if context is citation metadata
-        is_citation_context = False
-        if context:
-            context_lower = context.lower()
-            citation_indicators = ["au -", "py -", "t1 -", "do -", "jo -", "author:", "title:", "journal:", "citation file", "bibliographic"]
-            is_citation_context = any(indicator in context_lower for indicator in citation_indicators)
+        is_citation_context = bool(context) and looks_like_citations(context)
         
         # Build intelligent prompt based on context type
         if is_citation_context:
             full_prompt = f"""The user asked: "{prompt}"
 
 Available context (this is citation metadata, not full paper content):
-{context}
+{CONTEXT_SLOT}
 
 Please provide a helpful but accurate response. Clearly indicate that this is bibliographic metadata and not the full paper content. Do not speculate about the paper's actual content beyond what's provided in the metadata."""
         
-        elif context and ("corrupted" in context.lower() or "partial" in context.lower()):
+        elif context and EXTRACTION_ISSUE_MARKERS.search(context):
             full_prompt = f"""The user asked: "{prompt}"
 
 Available context (limited due to extraction issues):
-{context}
+{CONTEXT_SLOT}
 
 Please provide a helpful response but be clear about the limitations of the available content."""
         
@@ -137,7 +264,7 @@ Please provide a helpful response but be clear about the limitations of the avai
             full_prompt = f"""You are an expert research paper analyzer. Please answer the user's question based on the provided research paper content.
 
 Research Paper Content:
-{context[:3500]}
+{CONTEXT_SLOT}
 
 User's Question: {prompt}
 
@@ -150,6 +277,11 @@ Question: {prompt}
 
 Please provide a detailed, well-structured response that would be helpful for someone analyzing research papers."""
         
+        if context:
+            # Fill the model's window with the passages most relevant to the question
+            full_prompt = context_packer.build_prompt(full_prompt, context, query=prompt,
+                                                      max_new_tokens=MAX_ANSWER_TOKENS)
+        
         payload = {
             "model": OLLAMA_MODEL,
             "prompt": full_prompt,
@@ -157,27 +289,40 @@ Please provide a detailed, well-structured response that would be helpful for so
             "options": {
                 "temperature": 0.3,
                 "top_p": 0.8,
-                "num_predict": 2000,
-                "repeat_penalty": 1.1
+                "num_predict": MAX_ANSWER_TOKENS,
+                "repeat_penalty": 1.1,
+                **context_packer.options()
             }
         }
         
         print(f"🤖 Calling Ollama for: {prompt[:100]}...")
-        response = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json=payload, timeout=120)
-        
-        if response.status_code == 200:
-            result = response.json()
-            answer = result.get("response", "").strip()
-            print(f"✅ Ollama response received ({len(answer)} characters)")
-            return answer
-        else:
-            print(f"❌ Ollama API error: {response.status_code}")
-            return f"I apologize, but I encountered an error while processing your question. Please try again."
-            
+        answer = ollama_client.generate(payload, timeout=120, caller=document_type, priority=priority).strip()
+        print(f"✅ Ollama response received ({len(answer)} characters)")
+        return answer
+    
+    except SchedulerSaturated:
+        raise
+    except requests.HTTPError as e:
+        print(f"❌ Ollama API error: {e.response.status_code if e.response is not None else e}")
+        return f"I apologize, but I encountered an error while processing your question. Please try again."
     except Exception as e:
         print(f"❌ Ollama API call failed: {e}")
         return f"I apologize, but I'm currently unable to process your question. Please try again later."
 
+def summarize_paper(text_content: str, instruction: str, priority: Priority = Priority.SUMMARY) -> str:
+    """Whole-paper summary via map-reduce; same error contract as call_ollama_api"""
+    if not OLLAMA_AVAILABLE:
+        return "Ollama is not available. Please ensure Ollama is installed and running."
+    
+    try:
+        print(f"📝 Summarizing {len(text_content)} characters with map-reduce...")
+        return summarizer.summarize(text_content, instruction=instruction, priority=priority)
+    except SchedulerSaturated:
+        raise
+    except Exception as e:
+        print(f"❌ Summarization failed: {e}")
+        return "I apologize, but I'm currently unable to summarize this paper. Please try again later."
+
 def _is_valid_pdf(file_path: str) -> bool:
     """Check if file is a valid PDF"""
     try:
@@ -219,21 +364,103 @@ async def root():
             "ask_question": "/ask-question",
             "documents": "/documents",
             "paper_overview": "/paper-overview",
-            "ollama_status": "/ollama-status"
+            "ollama_status": "/ollama-status",
+            "metrics": "/metrics"
         }
     }
 
 @app.get("/health")
-async def health_check():
-    return {
+async def health_check(request: Request):
+    return hashed_json(request, {
         "status": "healthy", 
         "message": "Backend server is working correctly",
-        "ollama_available": OLLAMA_AVAILABLE
-    }
+        "ollama_available": OLLAMA_AVAILABLE,
+        "llm_scheduler": llm_scheduler.stats(),
+        "retrieval_cache": rag_system.retrieval_cache.stats() if rag_system else None
+    })
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint (per worker process)"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/admin/profile/cpu")
+async def profile_cpu(request: Request, seconds: float = Query(10.0, gt=0),
+                      interval_ms: float = Query(5.0, ge=1, le=1000), include_idle: bool = False):
+    """Sample every thread for a time window; returns a speedscope profile"""
+    _require_admin(request)
+    if seconds > PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be at most {PROFILE_MAX_SECONDS:g}")
+    profile = await run_in_threadpool(SamplingProfiler(interval_ms / 1000, include_idle).run, seconds)
+    return JSONResponse(content=profile, headers={
+        "Content-Disposition": f'attachment; filename="profile-{int(time.time())}.speedscope.json"'})
+
+@app.get("/admin/profile/requests")
+async def list_request_profiles(request: Request):
+    """Recently profiled requests (sent with X-Profile: cpu)"""
+    _require_admin(request)
+    return {"profiles": request_profiler.list()}
+
+@app.get("/admin/profile/requests/{trace_id}")
+async def get_request_profile(request: Request, trace_id: str, format: str = Query("pstats", regex="^(pstats|text)$"),
+                              sort: str = "cumulative", limit: int = Query(40, ge=1, le=1000)):
+    """A tagged request's cProfile: pstats file (load with pstats / snakeviz) or a text table"""
+    _require_admin(request)
+    session = request_profiler.get(trace_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"No profile for request {trace_id}")
+    if format == "text":
+        try:
+            return PlainTextResponse(session.text(sort, limit))
+        except KeyError:
+            raise HTTPException(status_code=400, detail=f"Unknown sort key: {sort}")
+    return Response(content=session.pstats_bytes(), media_type="application/octet-stream", headers={
+        "Content-Disposition": f'attachment; filename="profile-{trace_id}.pstats"'})
+
+@app.post("/admin/profile/memory/start")
+async def start_memory_profile(request: Request, frames: int = Query(25, ge=1, le=100)):
+    """Start tracemalloc and take the baseline snapshot"""
+    _require_admin(request)
+    return await run_in_threadpool(memory_profiler.start, frames)
+
+@app.get("/admin/profile/memory")
+async def memory_profile(request: Request, limit: int = Query(25, ge=1, le=500),
+                         group_by: str = Query("lineno", regex="^(lineno|filename|traceback)$"),
+                         rebase: bool = False):
+    """Top allocation sites and growth since the baseline (rebase=true makes this snapshot the new baseline)"""
+    _require_admin(request)
+    try:
+        return await run_in_threadpool(memory_profiler.report, limit, group_by, rebase)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/admin/profile/memory/dump")
+async def dump_memory_profile(request: Request):
+    """The current tracemalloc snapshot (load with tracemalloc.Snapshot.load)"""
+    _require_admin(request)
+    try:
+        data = await run_in_threadpool(memory_profiler.dump)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(content=data, media_type="application/octet-stream", headers={
+        "Content-Disposition": f'attachment; filename="memory-{int(time.time())}.tracemalloc"'})
+
+@app.post("/admin/profile/memory/stop")
+async def stop_memory_profile(request: Request):
+    _require_admin(request)
+    return memory_profiler.stop()
+
+ollama_status_cache = TTLValue(OLLAMA_STATUS_TTL, "ollama_status")
 
 @app.get("/ollama-status")
-async def ollama_status():
+async def ollama_status(request: Request):
     """Check Ollama status and available models"""
+    # Polling clients share one probe per TTL, and the probe runs off the event loop
+    status = await ollama_status_cache.get(lambda: run_in_threadpool(_probe_ollama))
+    return hashed_json(request, status)
+
+def _probe_ollama():
+    """One round trip to Ollama's model list"""
     try:
         response = requests.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=10)
         if response.status_code == 200:
@@ -268,12 +495,15 @@ async def analyze_pdf(file: UploadFile = File(...), question: str = Form(None)):
         
         # Save uploaded file
         file_path = f"data/uploads/{file.filename}"
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        with STAGE_SECONDS.time(stage="upload"):
+            with open(file_path, "wb") as buffer:
+                content = await file.read()
+                buffer.write(content)
         
         # Validate PDF file first
-        if not _is_valid_pdf(file_path):
+        with STAGE_SECONDS.time(stage="validation"):
+            is_valid = _is_valid_pdf(file_path)
+        if not is_valid:
             # Try to read the file to get more specific error
             try:
                 with open(file_path, "rb") as f:
@@ -284,8 +514,9 @@ async def analyze_pdf(file: UploadFile = File(...), question: str = Form(None)):
             
             raise HTTPException(status_code=400, detail="Invalid or corrupted PDF file. Please upload a valid PDF.")
         
-        # Extract text from PDF
-        text_content = pdf_processor.extract_text(file_path)
+        # Extract text (and tables, in the same pass) from PDF
+        tables = [] if TABLE_EXTRACTION_ENABLED else None
+        text_content = pdf_processor.extract_text(file_path, tables)
         print(f"📊 Extracted {len(text_content)} characters")
         
         if not text_content.strip():
@@ -293,19 +524,54 @@ async def analyze_pdf(file: UploadFile = File(...), question: str = Form(None)):
         
         # Add to RAG system
         if rag_system:
-            rag_system.add_document(file.filename, text_content)
+            content_type = "citation" if text_content.startswith(CITATION_PREAMBLE) else "paper"
+            with STAGE_SECONDS.time(stage="rag_index"):
+                near_duplicates = rag_system.add_document(file.filename, text_content,
+                                                          {"content_type": content_type})
+            enricher.schedule(file.filename, text_content)
+        else:
+            near_duplicates = []
+        if tables is not None:
+            table_store.add(file.filename, tables)
+        
+        # Citation exports are also parsed into structured records for direct lookups
+        citation_records = 0
+        if text_content.startswith(CITATION_PREAMBLE):
+            with STAGE_SECONDS.time(stage="citation_parse"):
+                citation_records = citation_index.add_source(
+                    file.filename, parse_citations(io.StringIO(text_content)))
         
         response_data = {
             "success": True,
             "filename": file.filename,
             "text_length": len(text_content),
-            "extracted_text": text_content[:500] + "..." if len(text_content) > 500 else text_content
+            "extracted_text": text_content[:500] + "..." if len(text_content) > 500 else text_content,
+            "near_duplicates": near_duplicates,
+            "citation_records": citation_records,
+            "tables": len(tables or [])
         }
         
+        # If user wants a summary, map-reduce over the whole paper
+        if question and any(keyword in question.lower() for keyword in ['summary', 'summarize', 'simplify', 'overview']):
+            stored = enricher.get(file.filename, text_content)
+            if stored and stored.get("status") == "ready":
+                # Precomputed at upload time for this exact content
+                summary = stored["summary"]
+                response_data["analysis"] = stored
+            else:
+                print("📝 Generating summary with Ollama...")
+                summary = await run_in_threadpool(summarize_paper, text_content, question)
+            response_data["summary"] = summary
+            response_data["answer"] = {
+                "answer": summary,
+                "question": question,
+                "ai_model": OLLAMA_MODEL,
+                "paper_specific": True
+            }
         # If user asked a question, use Ollama to answer it
-        if question and question.strip():
+        elif question and question.strip():
             print(f"❓ Answering question with Ollama: {question}")
-            ollama_answer = call_ollama_api(question, text_content, "research_paper")
+            ollama_answer = await run_in_threadpool(call_ollama_api, question, text_content, "research_paper")
             
             response_data["answer"] = {
                 "answer": ollama_answer,
@@ -313,16 +579,10 @@ async def analyze_pdf(file: UploadFile = File(...), question: str = Form(None)):
                 "ai_model": OLLAMA_MODEL,
                 "paper_specific": True
             }
-        # If no specific question but user wants summary
-        elif question and any(keyword in question.lower() for keyword in ['summary', 'summarize', 'simplify', 'overview']):
-            print("📝 Generating summary with Ollama...")
-            summary_prompt = "Please provide a comprehensive summary of this research paper:"
-            summary = call_ollama_api(summary_prompt, text_content, "research_paper")
-            response_data["summary"] = summary
         
         return JSONResponse(content=response_data)
     
-    except HTTPException:
+    except (HTTPException, SchedulerSaturated):
         raise
     except Exception as e:
         print(f"❌ PDF analysis error: {str(e)}")
@@ -347,7 +607,8 @@ async def analyze_image(file: UploadFile = File(...), question: str = Form(None)
         print(f"🖼️ Processing image: {file.filename}")
         
         # Read the uploaded file
-        content = await file.read()
+        with STAGE_SECONDS.time(stage="upload"):
+            content = await file.read()
         
         # Convert to base64 for the image processor
         image_data = base64.b64encode(content).decode('utf-8')
@@ -369,12 +630,16 @@ async def analyze_image(file: UploadFile = File(...), question: str = Form(None)
             
             # Add to RAG system
             if rag_system:
-                rag_system.add_document(file.filename, text_content)
+                with STAGE_SECONDS.time(stage="rag_index"):
+                    rag_system.add_document(file.filename, text_content, {
+                        "content_type": "image_ocr",
+                        "classification": analysis.get("content_classification")
+                    })
             
             # If user asked a question, use Ollama
             if question:
                 print(f"❓ Answering question from image with Ollama: {question}")
-                ollama_answer = call_ollama_api(question, text_content, "research_image")
+                ollama_answer = await run_in_threadpool(call_ollama_api, question, text_content, "research_image")
                 
                 response_data["answer"] = {
                     "answer": ollama_answer,
@@ -387,11 +652,13 @@ async def analyze_image(file: UploadFile = File(...), question: str = Form(None)
             elif question and any(keyword in question.lower() for keyword in ['summary', 'summarize', 'simplify', 'overview']):
                 print("📝 Generating summary from image with Ollama...")
                 summary_prompt = "Please summarize the content extracted from this research image:"
-                summary = call_ollama_api(summary_prompt, text_content, "research_image")
+                summary = await run_in_threadpool(call_ollama_api, summary_prompt, text_content, "research_image", Priority.SUMMARY)
                 response_data["summary"] = summary
         
         return JSONResponse(content=response_data)
         
+    except SchedulerSaturated:
+        raise
     except Exception as e:
         print(f"❌ Image analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
@@ -403,10 +670,26 @@ async def ask_question(question: str = Form(...)):
         if not question.strip():
             raise HTTPException(status_code=400, detail="Question cannot be empty")
         
+        # Bibliographic lookups ("papers by X in 2021") are answered from the citation index
+        lookup = await run_in_threadpool(citation_index.answer, question)
+        if lookup is not None:
+            return JSONResponse(content={
+                "success": True,
+                "answer": {
+                    "answer": lookup["answer"],
+                    "question": question,
+                    "ai_model": "citation_index",
+                    "paper_specific": False,
+                    "records": lookup["records"],
+                    "filters": lookup["filters"]
+                },
+                "question": question
+            })
+        
         print(f"❓ Answering general question with Ollama: {question}")
         
         # Use Ollama for all general questions
-        ollama_answer = call_ollama_api(question)
+        ollama_answer = await run_in_threadpool(call_ollama_api, question)
         
         return JSONResponse(content={
             "success": True,
@@ -418,35 +701,244 @@ async def ask_question(question: str = Form(...)):
             },
             "question": question
         })
+    except (HTTPException, SchedulerSaturated):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error answering question: {str(e)}")
 
-@app.get("/documents")
-async def list_documents():
+def _search_filter(doc_ids: List[str] = None, added_after: str = None, added_before: str = None,
+                   content_type: str = None, classification: str = None) -> SearchFilter:
+    try:
+        return SearchFilter(doc_ids=doc_ids, added_after=added_after, added_before=added_before,
+                            content_type=content_type, classification=classification)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/search")
+async def search(q: str, top_k: int = Query(5, ge=1, le=100), mode: str = Query("documents", regex="^(documents|chunks)$"),
+                 doc_id: List[str] = Query(None), added_after: str = None, added_before: str = None,
+                 content_type: str = None, classification: str = None):
+    """Keyword search over the corpus, optionally scoped by metadata filters.
+    
+    Filters are applied inside the index before scoring, so a search scoped to
+    a few papers only touches those papers.
+    """
+    if not rag_system:
+        raise HTTPException(status_code=500, detail="RAG system not available")
+    filters = _search_filter(doc_id, added_after, added_before, content_type, classification)
+    
+    if mode == "chunks":
+        results = await run_in_threadpool(rag_system.search_chunks, q, top_k, filters)
+    else:
+        results = await run_in_threadpool(rag_system.search_documents, q, top_k, filters)
+    return JSONResponse(content={
+        "success": True,
+        "query": q,
+        "mode": mode,
+        "filters": filters.to_dict(),
+        "results": results,
+        "count": len(results)
+    })
+
+@app.post("/ask-corpus")
+async def ask_corpus(question: str = Form(...), max_papers: int = Form(4), doc_ids: List[str] = Form(None),
+                     content_type: str = Form(None), classification: str = Form(None),
+                     added_after: str = Form(None), added_before: str = Form(None)):
+    """Answer a question from every stored paper (or the filtered subset), with per-paper citations"""
     if not rag_system:
         raise HTTPException(status_code=500, detail="RAG system not available")
+    if not question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    max_papers = max(1, min(max_papers, 8))
+    filters = _search_filter(doc_ids, added_after, added_before, content_type, classification)
     
     try:
-        documents = rag_system.list_documents()
+        if not OLLAMA_AVAILABLE:
+            papers = await run_in_threadpool(corpus_qa.retrieve, question, max_papers, filters=filters)
+            result = {
+                "answer": "Ollama is not available. Showing the most relevant papers only.",
+                "papers": [{"doc_id": p["doc_id"], "score": p["score"], "excerpts": p["excerpts"]} for p in papers]
+            }
+        else:
+            print(f"📚 Answering corpus question: {question}")
+            result = await run_in_threadpool(corpus_qa.answer, question, max_papers, filters=filters)
+        
         return JSONResponse(content={
             "success": True,
-            "documents": documents,
-            "count": len(documents)
+            "question": question,
+            "answer": result["answer"],
+            "papers": result["papers"],
+            "ai_model": OLLAMA_MODEL
         })
+    except (HTTPException, SchedulerSaturated):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error answering corpus question: {str(e)}")
+
+@app.post("/citations/import")
+async def import_citations(file: UploadFile = File(...)):
+    """Parse a RIS/BibTeX/EndNote export into the citation index, streaming it line by line"""
+    def parse_upload():
+        lines = io.TextIOWrapper(file.file, encoding="utf-8-sig", errors="replace")
+        with STAGE_SECONDS.time(stage="citation_parse"):
+            return citation_index.add_source(file.filename, parse_citations(lines))
+    
+    try:
+        count = await run_in_threadpool(parse_upload)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error importing citations: {str(e)}")
+    if not count:
+        raise HTTPException(status_code=400, detail="No RIS, BibTeX or EndNote records found in this file")
+    
+    return JSONResponse(content={
+        "success": True,
+        "filename": file.filename,
+        "records": count,
+        "index": citation_index.stats()
+    })
+
+@app.get("/citations/search")
+async def search_citations(author: str = None, year: int = None, year_from: int = None, year_to: int = None,
+                           doi: str = None, title: str = None, limit: int = Query(50, ge=1, le=1000)):
+    """Look up imported citation records by author, year (or range), DOI and title words"""
+    if not any([author, year, year_from, year_to, doi, title]):
+        raise HTTPException(status_code=400, detail="Give at least one of author, year, year_from, year_to, doi, title")
+    
+    records = citation_index.query(author=author, year=year, year_from=year_from, year_to=year_to,
+                                   doi=doi, title=title, limit=limit)
+    return JSONResponse(content={
+        "success": True,
+        "records": records,
+        "count": len(records)
+    })
+
+@app.get("/tables/query")
+async def query_tables(column: str = None, mention: str = None, doc_id: List[str] = Query(None),
+                       min_value: float = None, max_value: float = None, numeric: bool = True,
+                       group_by: str = None, limit: int = Query(100, ge=1, le=5000)):
+    """Filter and aggregate cells across every extracted table.
+    
+    e.g. all reported accuracies on ImageNet: ?column=acc&mention=imagenet&group_by=doc
+    """
+    if not any([column, mention, doc_id]):
+        raise HTTPException(status_code=400, detail="Give at least one of column, mention, doc_id")
+    
+    try:
+        result = await run_in_threadpool(table_store.query, column=column, mention=mention, doc_ids=doc_id,
+                                         min_value=min_value, max_value=max_value, numeric=numeric,
+                                         group_by=group_by, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return JSONResponse(content={"success": True, **result})
+
+@app.get("/documents/{doc_id}/tables")
+async def get_document_tables(doc_id: str):
+    """Tables extracted from one paper, with their page numbers"""
+    tables = table_store.get(doc_id)
+    return JSONResponse(content={
+        "success": True,
+        "doc_id": doc_id,
+        "tables": tables,
+        "count": len(tables)
+    })
+
+@app.get("/documents")
+async def list_documents(request: Request, limit: int = Query(None, ge=1, le=1000), cursor: str = None):
+    if not rag_system:
+        raise HTTPException(status_code=500, detail="RAG system not available")
+    
+    def build():
+        documents, next_cursor = rag_system.page_documents(limit=limit, cursor=cursor)
+        return {
+            "success": True,
+            "documents": documents,
+            "count": len(documents),
+            "total": rag_system.count_documents(),
+            "next_cursor": next_cursor
+        }
+    
+    try:
+        # Unchanged store, unchanged page: revalidating clients get a 304 without the page being built
+        etag = etag_for("documents", RAG_BACKEND, rag_system.generation, limit, cursor)
+        return conditional_json(request, etag, build)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing documents: {str(e)}")
 
+@app.get("/documents/{doc_id}/duplicates")
+async def get_document_duplicates(doc_id: str):
+    """Other stored versions of the same paper (MinHash/LSH near-duplicates)"""
+    if not rag_system:
+        raise HTTPException(status_code=500, detail="RAG system not available")
+    
+    duplicates = await run_in_threadpool(rag_system.find_duplicates, doc_id)
+    if not duplicates and not rag_system.get_document_content(doc_id):
+        raise HTTPException(status_code=404, detail=f"Document not found: {doc_id}")
+    
+    return JSONResponse(content={
+        "success": True,
+        "doc_id": doc_id,
+        "duplicates": duplicates,
+        "count": len(duplicates)
+    })
+
+@app.get("/documents/{doc_id}/analysis")
+async def get_document_analysis(doc_id: str):
+    """Precomputed summary, contributions, limitations and section map for one paper"""
+    if not rag_system:
+        raise HTTPException(status_code=500, detail="RAG system not available")
+    
+    content = rag_system.get_document_content(doc_id)
+    if not content:
+        raise HTTPException(status_code=404, detail=f"Document not found: {doc_id}")
+    
+    record = enricher.get(doc_id, content)
+    # A failure older than its backoff is retried; until the rerun finishes the paper reads as pending
+    if record is not None and record["status"] == "failed" and enricher.schedule(doc_id, content):
+        record = None
+    if record is None:
+        if not enricher.enabled:
+            raise HTTPException(status_code=503, detail="Background analysis is disabled or Ollama is unavailable")
+        enricher.schedule(doc_id, content)
+        return JSONResponse(status_code=202, content={
+            "success": True,
+            "doc_id": doc_id,
+            "status": enricher.status(doc_id, content)
+        })
+    
+    return JSONResponse(content={
+        "success": record["status"] == "ready",
+        "doc_id": doc_id,
+        "status": record["status"],
+        "analysis": record
+    })
+
 @app.get("/paper-overview")
-async def get_paper_overview():
+async def get_paper_overview(request: Request, limit: int = Query(None, ge=1, le=1000), cursor: str = None):
     if not rag_system:
         raise HTTPException(status_code=500, detail="RAG system not available")
     
-    try:
-        overview = rag_system.get_paper_overview()
-        return JSONResponse(content={
+    def build():
+        overview = rag_system.get_paper_overview(limit=limit, cursor=cursor)
+        records = enricher.get_many([doc["id"] for doc in overview["documents"]])
+        for doc in overview["documents"]:
+            record = records.get(doc["id"])
+            doc["analysis_status"] = record["status"] if record else "missing"
+            if record and record["status"] == "ready":
+                doc["summary"] = record["summary"]
+        return {
             "success": True,
             "overview": overview
-        })
+        }
+    
+    try:
+        # Summaries come from the enrichment store, so its generation is part of the tag
+        etag = etag_for("paper-overview", RAG_BACKEND, rag_system.generation, enricher.generation, limit, cursor)
+        return conditional_json(request, etag, build)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting paper overview: {str(e)}")
 
@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import uuid
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# Per-request trace id, propagated into worker threads by Starlette's threadpool
+trace_id_var = contextvars.ContextVar("trace_id", default=None)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _format_labels(self, key: Tuple, extra: Dict = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        escaped = [(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs]
+        return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{self._format_labels(k)} {v}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{self._format_labels(k)} {v}" for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket_counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            idx = bisect.bisect_left(self.buckets, value)
+            if idx < len(self.buckets):
+                series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the block and log it as a stage event"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(elapsed, **labels)
+            log_event(self.name, seconds=round(elapsed, 6), **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (bucket_counts, total, count) in self._series.items():
+                cumulative = 0
+                for bound, n in zip(self.buckets, bucket_counts):
+                    cumulative += n
+                    lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': bound})} {cumulative}")
+                lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': '+Inf'})} {count}")
+                lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 6),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+            "trace_id": trace_id_var.get(),
+        }
+        payload.update(getattr(record, "fields", {}))
+        return json.dumps(payload, default=str)
+
+
+def _build_logger() -> logging.Logger:
+    logger = logging.getLogger("paper_analyzer.trace")
+    logger.propagate = False
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(_JsonFormatter())
+        logger.addHandler(handler)
+    enabled = os.getenv("STRUCTURED_LOGS", "true").lower() == "true"
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper() if enabled else logging.CRITICAL + 1)
+    return logger
+
+
+trace_logger = _build_logger()
+
+
+def log_event(event: str, level: int = logging.INFO, **fields):
+    """Emit one structured JSON log line tagged with the current trace id"""
+    if trace_logger.isEnabledFor(level):
+        trace_logger.log(level, event, extra={"fields": fields})
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# --- Pipeline metrics -------------------------------------------------------
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "HTTP request latency by route", ("method", "route", "status"))
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_seconds",
+    "Time spent per pipeline stage (upload, validation, pdfplumber, pypdf2, rag_index, retrieval)",
+    ("stage",))
+OCR_SECONDS = Histogram(
+    "ocr_seconds", "Tesseract time per page-segmentation config", ("config",))
+LLM_SECONDS = Histogram(
+    "llm_request_seconds", "Ollama generation latency: time to first token and total", ("caller", "phase"))
+LLM_REQUESTS = Counter(
+    "llm_requests_total", "Ollama generation requests by outcome", ("caller", "outcome"))
+LLM_IN_FLIGHT = Gauge(
+    "llm_in_flight", "Ollama generations currently running")
+LLM_QUEUE_DEPTH = Gauge(
+    "llm_queue_depth", "LLM requests waiting for a generation slot", ("priority",))
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "llm_queue_wait_seconds", "Time LLM requests spent queued before getting a slot", ("priority",))
+LLM_REJECTED = Counter(
+    "llm_rejected_total", "LLM requests rejected by admission control", ("priority", "reason"))
+LLM_PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens", "Estimated prompt size after context packing", ("model",),
+    buckets=(256, 512, 1024, 2048, 4096, 8192, 16384, 32768))
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit/miss)", ("cache", "result"))
+CACHE_ENTRIES = Gauge(
+    "cache_entries", "Entries held by size-bounded caches", ("cache",))
+CACHE_BYTES = Gauge(
+    "cache_bytes", "Estimated memory held by size-bounded caches", ("cache",))
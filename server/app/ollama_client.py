@@ -0,0 +1,81 @@
+import json
+import time
+from typing import Dict, Iterator
+
+import requests
+
+from app.llm_coalescer import SingleFlight, payload_key
+from app.llm_scheduler import Priority, scheduler as default_scheduler
+from app.metrics import LLM_SECONDS, LLM_REQUESTS, LLM_IN_FLIGHT, log_event
+
+# Shared by every client in the process so identical prompts coalesce
+# whichever component issued them.
+_inflight = SingleFlight()
+
+
+class OllamaClient:
+    """Thin wrapper around Ollama's /api/generate.
+
+    Always talks to Ollama in streaming mode so time-to-first-token can be
+    measured, and records latency/outcome metrics for every call. Identical
+    requests that overlap in time share a single upstream generation.
+    """
+
+    def __init__(self, base_url: str, scheduler=None):
+        self.base_url = base_url
+        self.generate_url = f"{base_url}/api/generate"
+        self.scheduler = scheduler or default_scheduler
+
+    def stream(self, payload: Dict, timeout: float = 120, caller: str = "api",
+               priority: Priority = Priority.INTERACTIVE, coalesce: bool = True) -> Iterator[str]:
+        """Yield response fragments as Ollama produces them.
+
+        Raises ``requests.HTTPError`` on a non-200 status and
+        ``SchedulerSaturated`` when no generation slot is available in time.
+        """
+        payload = {**payload, "stream": True}
+        if not coalesce:
+            return self._stream_upstream(payload, timeout, caller, priority)
+        key = payload_key({"url": self.generate_url, **payload})
+        return _inflight.stream(key, lambda: self._stream_upstream(payload, timeout, caller, priority))
+
+    def _stream_upstream(self, payload: Dict, timeout: float, caller: str, priority: Priority) -> Iterator[str]:
+        # Only real upstream generations take a slot; coalesced followers don't
+        with self.scheduler.slot(priority):
+            yield from self._generate_upstream(payload, timeout, caller)
+
+    def _generate_upstream(self, payload: Dict, timeout: float, caller: str) -> Iterator[str]:
+        start = time.perf_counter()
+        first_token_at = None
+        outcome = "error"
+        LLM_IN_FLIGHT.inc()
+        try:
+            with requests.post(self.generate_url, json=payload, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    message = json.loads(line)
+                    if message.get("error"):
+                        raise RuntimeError(f"Ollama error: {message['error']}")
+                    fragment = message.get("response", "")
+                    if fragment:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            LLM_SECONDS.observe(first_token_at - start, caller=caller, phase="time_to_first_token")
+                        yield fragment
+                    if message.get("done"):
+                        break
+            outcome = "success"
+        finally:
+            LLM_IN_FLIGHT.dec()
+            elapsed = time.perf_counter() - start
+            LLM_SECONDS.observe(elapsed, caller=caller, phase="total")
+            LLM_REQUESTS.inc(caller=caller, outcome=outcome)
+            log_event("llm_call", caller=caller, outcome=outcome, seconds=round(elapsed, 6),
+                      ttft_seconds=round(first_token_at - start, 6) if first_token_at else None)
+
+    def generate(self, payload: Dict, timeout: float = 120, caller: str = "api",
+                 priority: Priority = Priority.INTERACTIVE) -> str:
+        """Run a generation to completion and return the full response text"""
+        return "".join(self.stream(payload, timeout=timeout, caller=caller, priority=priority))
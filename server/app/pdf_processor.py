@@ -1,37 +1,44 @@
 ﻿import os
+from typing import Dict, List
+
 import PyPDF2
 import pdfplumber
 
+from app.metrics import STAGE_SECONDS
+from app.citations import CITATION_PREAMBLE, CITATION_EXTENSIONS, looks_like_citations
+from app.table_store import clean_table
+
 class PDFProcessor:
     def __init__(self):
         pass
     
-    def extract_text(self, pdf_path: str) -> str:
-        """Extract text from PDF file using multiple methods"""
+    def extract_text(self, pdf_path: str, tables: List[Dict] = None) -> str:
+        """Extract text from PDF file using multiple methods.
+        
+        Pass a list as ``tables`` to also collect the PDF's tables (with page
+        numbers) during the same pdfplumber pass.
+        """
         try:
             # Check if file exists
             if not os.path.exists(pdf_path):
                 raise FileNotFoundError(f"PDF file not found: {pdf_path}")
             
             # Try pdfplumber first (more robust)
-            text = self._extract_with_pdfplumber(pdf_path)
+            with STAGE_SECONDS.time(stage="pdfplumber"):
+                text = self._extract_with_pdfplumber(pdf_path, tables)
             
             # If pdfplumber fails or returns little text, try PyPDF2
             if not text or len(text.strip()) < 10:
                 print("pdfplumber returned little text, trying PyPDF2...")
-                text = self._extract_with_pypdf2(pdf_path)
+                with STAGE_SECONDS.time(stage="pypdf2"):
+                    text = self._extract_with_pypdf2(pdf_path)
             
-            # Check for citation file patterns
-            text_lower = text.lower()
+            # Check for citation file patterns (tagged lines near the start, not substrings anywhere)
             file_ext = os.path.splitext(pdf_path)[1].lower()
-            citation_indicators = ["au -", "py -", "t1 -", "do -", "jo -", "author:", "title:", "journal:"]
-            citation_extensions = ['.ris', '.bib', '.enw', '.ciw']
-            
-            is_citation_file = (any(indicator in text_lower for indicator in citation_indicators) or 
-                               file_ext in citation_extensions)
+            is_citation_file = file_ext in CITATION_EXTENSIONS or looks_like_citations(text)
             
             if is_citation_file:
-                return f"This appears to be a citation file containing bibliographic metadata.\n\nExtracted content:\n{text.strip()}"
+                return f"{CITATION_PREAMBLE}\n\nExtracted content:\n{text.strip()}"
             
             if not text.strip():
                 raise Exception("No text content could be extracted from the PDF")
@@ -41,16 +48,22 @@ class PDFProcessor:
         except Exception as e:
             raise Exception(f"PDF processing failed: {str(e)}")
     
-    def _extract_with_pdfplumber(self, pdf_path: str) -> str:
-        """Extract text using pdfplumber"""
+    def _extract_with_pdfplumber(self, pdf_path: str, tables: List[Dict] = None) -> str:
+        """Extract text (and optionally tables) using pdfplumber"""
         try:
             text = ""
             with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
+                for page_number, page in enumerate(pdf.pages, start=1):
                     page_text = page.extract_text()
                     if page_text:
                         text += page_text + "\n"
-            print(f"pdfplumber extracted {len(text)} characters")
+                    if tables is not None:
+                        for rows in page.extract_tables():
+                            table = clean_table(rows, page_number, len(tables))
+                            if table:
+                                tables.append(table)
+            print(f"pdfplumber extracted {len(text)} characters" +
+                  (f" and {len(tables)} tables" if tables else ""))
             return text
         except Exception as e:
             print(f"pdfplumber extraction failed: {e}")
@@ -80,6 +93,15 @@ class PDFProcessor:
             print(f"PyPDF2 extraction failed: {e}")
             return ""
     
+    def count_pages(self, pdf_path: str) -> int:
+        """Page count from the PDF's page tree (no text extraction)"""
+        try:
+            with open(pdf_path, "rb") as file:
+                return len(PyPDF2.PdfReader(file).pages)
+        except Exception as e:
+            print(f"Page count failed: {e}")
+            return 0
+    
     def extract_metadata(self, pdf_path: str) -> dict:
         """Extract PDF metadata"""
         try:
@@ -0,0 +1,279 @@
+import os
+import sys
+import time
+import pstats
+import marshal
+import cProfile
+import tempfile
+import threading
+import contextvars
+import tracemalloc
+from io import StringIO
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool as _run_in_threadpool
+
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+
+# Leaf frames of threads that are parked rather than working (thread pools, the event loop's poll)
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+
+class SamplingProfiler:
+    """Wall-clock sampling profiler across every thread.
+
+    Every ``interval`` seconds it snapshots all Python stacks with
+    ``sys._current_frames()``. Nothing is installed in the profiled threads,
+    so the overhead stays flat however busy the server is. Work in the
+    event loop thread, the request threadpool and background workers
+    (pdfplumber, Tesseract, Ollama calls) is covered alike. The result is a
+    speedscope document with one sampled profile per thread.
+    """
+
+    def __init__(self, interval: float = 0.005, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+
+    def run(self, seconds: float) -> Dict:
+        own = threading.get_ident()
+        frames: List[Dict] = []
+        frame_ids: Dict = {}
+        threads: Dict[int, Dict] = {}
+        names: Dict[int, str] = {}
+        start = last = time.perf_counter()
+        deadline = start + min(seconds, PROFILE_MAX_SECONDS)
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            weight, last = now - last, now
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                leaf = frame
+                while frame is not None:
+                    code = frame.f_code
+                    key = (code.co_filename, code.co_firstlineno, code.co_qualname)
+                    index = frame_ids.get(key)
+                    if index is None:
+                        index = frame_ids[key] = len(frames)
+                        frames.append({"name": code.co_qualname, "file": code.co_filename,
+                                       "line": code.co_firstlineno})
+                    stack.append(index)
+                    frame = frame.f_back
+                if not self.include_idle and \
+                        (os.path.basename(leaf.f_code.co_filename), leaf.f_code.co_name) in IDLE_FRAMES:
+                    continue
+                if ident not in names:
+                    # Looked up while the thread is alive; short-lived ones are gone by the end
+                    names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                thread = threads.setdefault(ident, {"samples": [], "weights": []})
+                thread["samples"].append(stack[::-1])
+                thread["weights"].append(weight)
+            if now >= deadline:
+                break
+
+        elapsed = last - start
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "exporter": "ai-research-paper-analyzer",
+            "name": f"{elapsed:.1f}s sampled every {self.interval * 1000:g} ms",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": names.get(ident, f"thread {ident}"),
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": elapsed,
+                    "samples": thread["samples"],
+                    "weights": thread["weights"],
+                }
+                # Busiest thread first; speedscope opens the first profile
+                for ident, thread in sorted(threads.items(), key=lambda item: -len(item[1]["samples"]))
+            ],
+        }
+
+
+class RequestProfile:
+    """Deterministic (cProfile) profile of one tagged request.
+
+    The event loop thread is profiled while the request runs, and every call
+    the request hands to the threadpool through :func:`run_in_threadpool`
+    is profiled in its worker thread. All the parts are merged into one
+    pstats table. Coroutine steps of other requests that happen to run on
+    the event loop while this one awaits are included too.
+    """
+
+    def __init__(self, trace_id: str, route: str):
+        self.trace_id = trace_id
+        self.route = route
+        self.started = time.time()
+        self.seconds = 0.0
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def _new_profile(self) -> cProfile.Profile:
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        return profile
+
+    def runcall(self, func: Callable, *args, **kwargs):
+        return self._new_profile().runcall(func, *args, **kwargs)
+
+    def stats(self) -> pstats.Stats:
+        with self._lock:
+            stats = pstats.Stats(self._profiles[0], stream=StringIO())
+            for profile in self._profiles[1:]:
+                stats.add(profile)
+        return stats
+
+    def pstats_bytes(self) -> bytes:
+        """The merged profile in the format ``pstats.Stats(path)`` / snakeviz load"""
+        return marshal.dumps(self.stats().stats)
+
+    def text(self, sort: str = "cumulative", limit: int = 40) -> str:
+        stream = StringIO()
+        stats = self.stats()
+        stats.stream = stream
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def info(self) -> Dict:
+        return {"trace_id": self.trace_id, "route": self.route, "started": self.started,
+                "seconds": round(self.seconds, 6), "threadpool_calls": len(self._profiles) - 1}
+
+
+_active_request = contextvars.ContextVar("active_request_profile", default=None)
+
+
+class RequestProfiler:
+    """Profiles tagged requests one at a time and keeps the most recent results"""
+
+    def __init__(self, keep: int = 16):
+        self.keep = keep
+        self._profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+
+    async def profile(self, trace_id: str, route: str, call: Callable):
+        """Await call() under the profiler; returns (result, profile or None if another one is running)"""
+        # cProfile hooks the whole event loop thread, so only one request can own it
+        if not self._busy.acquire(blocking=False):
+            return await call(), None
+        session = RequestProfile(trace_id, route)
+        token = _active_request.set(session)
+        profile = session._new_profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            return await call(), session
+        finally:
+            profile.disable()
+            session.seconds = time.perf_counter() - start
+            _active_request.reset(token)
+            self._busy.release()
+            with self._lock:
+                self._profiles[trace_id] = session
+                while len(self._profiles) > self.keep:
+                    self._profiles.popitem(last=False)
+
+    def get(self, trace_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            return self._profiles.get(trace_id)
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            return [session.info() for session in reversed(self._profiles.values())]
+
+
+async def run_in_threadpool(func: Callable, *args, **kwargs):
+    """Starlette's run_in_threadpool, profiling the call if its request is being profiled"""
+    session = _active_request.get()
+    if session is not None:
+        return await _run_in_threadpool(session.runcall, func, *args, **kwargs)
+    return await _run_in_threadpool(func, *args, **kwargs)
+
+
+class MemoryProfiler:
+    """tracemalloc snapshots with top allocation sites and diffs against a baseline.
+
+    Tracing is started on demand, because it slows allocation-heavy code
+    down noticeably. :meth:`start` records a baseline. :meth:`report` shows
+    the current top sites together with what grew since the baseline.
+    """
+
+    FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self):
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.Lock()
+
+    def start(self, frames: int = 25) -> Dict:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self.baseline = self._snapshot()
+        return self.status()
+
+    def stop(self) -> Dict:
+        with self._lock:
+            tracemalloc.stop()
+            self.baseline = None
+        return self.status()
+
+    def status(self) -> Dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {"tracing": tracing, "frames": tracemalloc.get_traceback_limit() if tracing else 0,
+                "traced_bytes": current, "peak_bytes": peak, "has_baseline": self.baseline is not None}
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(self.FILTERS)
+
+    @staticmethod
+    def _site(stat) -> Dict:
+        entry = {"size_bytes": stat.size, "count": stat.count,
+                 "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]}
+        if hasattr(stat, "size_diff"):
+            entry.update(size_diff_bytes=stat.size_diff, count_diff=stat.count_diff)
+        return entry
+
+    def report(self, limit: int = 25, group_by: str = "lineno", rebase: bool = False) -> Dict:
+        """Top allocation sites now and the biggest changes since the baseline"""
+        if group_by not in ("lineno", "filename", "traceback"):
+            raise ValueError(f"group_by must be one of lineno, filename, traceback (got {group_by!r})")
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc is not running; start it first")
+            snapshot = self._snapshot()
+            result = {**self.status(), "top": [self._site(stat) for stat in snapshot.statistics(group_by)[:limit]]}
+            if self.baseline is not None:
+                diff = snapshot.compare_to(self.baseline, group_by)
+                result["growth"] = [self._site(stat) for stat in diff[:limit] if stat.size_diff]
+            if rebase or self.baseline is None:
+                self.baseline = snapshot
+        return result
+
+    def dump(self) -> bytes:
+        """The current snapshot in tracemalloc's own format (``tracemalloc.Snapshot.load``)"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc is not running; start it first")
+            snapshot = self._snapshot()
+        with tempfile.NamedTemporaryFile(suffix=".tracemalloc") as f:
+            snapshot.dump(f.name)
+            return f.read()
@@ -1,123 +1,421 @@
 ﻿import os
 import json
+import base64
+import bisect
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Optional
+
+from app.metrics import STAGE_SECONDS
+from app.shared_store import SharedStore
+from app.text_chunker import count_words
+from app.lexical_index import LexicalIndex
+from app.dedup import NearDuplicateIndex, flag_metadata
+from app.doc_codec import DocumentCodec, DecodedCache, train_dictionary, DICT_MIN_DOCUMENTS
+from app.search_filter import AttributeIndex, SearchFilter
+from app.retrieval_cache import RetrievalCache
+from app.archive import ArchiveReader, ArchiveWriter, ArchiveError
+
+# Lexical index written next to metadata.json at every compaction and by a snapshot restore
+LEXICAL_SNAPSHOT_FILE = "lexical.rpsnap"
+
+def encode_cursor(key: Tuple) -> str:
+    """Opaque pagination cursor for a sort key"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple:
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor"""
+    try:
+        return tuple(json.loads(base64.urlsafe_b64decode(cursor.encode("ascii"))))
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
 
 class RAGSystem:
     def __init__(self, storage_path: str = "data/vector_store"):
         self.storage_path = storage_path
+        # Document text is held (and persisted) zlib-compressed; read through get_document_content
+        self.codec = DocumentCodec()
+        self._decoded = DecodedCache()
         self.documents = {}
         self.document_metadata = {}
+        # Running aggregates and sorted indexes, maintained on every put/delete so
+        # overview and list calls never rescan or re-sort the corpus.
+        self._total_words = 0
+        self._total_chars = 0
+        self._by_words = []  # sorted (-word_count, doc_id)
+        self._by_added = []  # sorted (added_date, doc_id)
+        # Id sets per metadata attribute, so filtered searches only score the matching documents
+        self.attributes = AttributeIndex()
+        # Chunk-level inverted index so search cost follows the query's postings, not corpus size
+        self.lexical = LexicalIndex()
+        # Search results keyed on the store generation, so writes invalidate them implicitly
+        self.retrieval_cache = RetrievalCache()
         os.makedirs(storage_path, exist_ok=True)
-        self._load_documents()
-    
-    def _load_documents(self):
-        """Load documents from storage"""
-        metadata_file = os.path.join(self.storage_path, "metadata.json")
-        if os.path.exists(metadata_file):
-            try:
-                with open(metadata_file, 'r') as f:
-                    data = json.load(f)
-                    self.documents = data.get("documents", {})
-                    self.document_metadata = data.get("metadata", {})
-            except Exception as e:
-                print(f"Error loading documents: {e}")
-                self.documents = {}
-                self.document_metadata = {}
-    
-    def _save_documents(self):
-        """Save documents to storage"""
-        metadata_file = os.path.join(self.storage_path, "metadata.json")
-        try:
-            data = {
-                "documents": self.documents,
-                "metadata": self.document_metadata,
-                "last_updated": datetime.now().isoformat()
-            }
-            with open(metadata_file, 'w') as f:
-                json.dump(data, f, indent=2)
-        except Exception as e:
-            print(f"Error saving documents: {e}")
-    
-    def add_document(self, doc_id: str, content: str, metadata: Dict = None):
-        """Add a document to the RAG system"""
-        self.documents[doc_id] = content
+        # metadata.json stays the snapshot format; writes go through a locked journal
+        # so several uvicorn workers can share the same corpus.
+        self.store = SharedStore(
+            storage_path, "metadata",
+            load_state=self._load_state,
+            apply_op=self._apply_op,
+            dump_state=self._dump_state,
+        )
+        self.duplicates = NearDuplicateIndex(storage_path)
+    
+    def _load_state(self, data: Dict):
+        """Reset in-memory state from a storage snapshot.
         
+        The lexical index comes from the sidecar written when this snapshot
+        was compacted, so no document is decompressed. Only if the sidecar is
+        missing or belongs to another generation is every document decoded
+        and re-tokenized. Journal entries after the snapshot are applied
+        one by one and decode just their own documents.
+        """
+        self.codec.import_dictionaries(data.get("zdicts"))
+        self.documents = data.get("documents", {})
+        self.document_metadata = data.get("metadata", {})
+        self._decoded.clear()
+        self._rebuild_aggregates()
+        self.lexical.clear()
+        if not self._load_lexical_snapshot(data.get("generation", 0)):
+            for doc_id, stored in self.documents.items():
+                self.lexical.add(doc_id, self.codec.decode(stored))
+    
+    def _load_lexical_snapshot(self, generation: int) -> bool:
+        """Load the lexical index from a restored snapshot if it matches this state"""
+        path = os.path.join(self.storage_path, LEXICAL_SNAPSHOT_FILE)
+        if not generation or not os.path.exists(path):
+            return False
+        try:
+            with ArchiveReader(path) as archive:
+                if archive.manifest.get("generation") != generation:
+                    return False
+                arrays = archive.group("lexical")
+                if set(arrays["docs"]) != set(self.documents):
+                    return False
+                self.lexical.load_arrays(arrays)
+                return True
+        except (ArchiveError, KeyError) as e:
+            print(f"Ignoring {path}: {e}")
+            self.lexical.clear()
+            return False
+    
+    def _save_lexical_snapshot(self, generation: int):
+        """Write the lexical index as the sidecar of the snapshot at this generation"""
+        path = os.path.join(self.storage_path, LEXICAL_SNAPSHOT_FILE)
+        with ArchiveWriter(path) as archive:
+            archive.add_group("lexical", self.lexical.to_arrays())
+            archive.meta.update(generation=generation)
+    
+    def _rebuild_aggregates(self):
+        """Recompute aggregates from scratch (only on a full snapshot load)"""
+        metas = self.document_metadata
+        self._total_words = sum(meta.get("word_count", 0) for meta in metas.values())
+        self._total_chars = sum(meta.get("content_length", 0) for meta in metas.values())
+        self._by_words = sorted((-meta.get("word_count", 0), doc_id) for doc_id, meta in metas.items())
+        self._by_added = sorted((meta.get("added_date", ""), doc_id) for doc_id, meta in metas.items())
+        self.attributes.rebuild(metas)
+    
+    @staticmethod
+    def _remove_key(index: List, key: Tuple):
+        pos = bisect.bisect_left(index, key)
+        if pos < len(index) and index[pos] == key:
+            del index[pos]
+    
+    def _index_metadata(self, doc_id: str, metadata: Dict):
+        """Account for a document's metadata in the aggregates"""
+        self._total_words += metadata.get("word_count", 0)
+        self._total_chars += metadata.get("content_length", 0)
+        bisect.insort(self._by_words, (-metadata.get("word_count", 0), doc_id))
+        bisect.insort(self._by_added, (metadata.get("added_date", ""), doc_id))
+        self.attributes.add(doc_id, metadata)
+    
+    def _unindex_metadata(self, doc_id: str):
+        """Remove a document's metadata from the aggregates"""
+        metadata = self.document_metadata.get(doc_id)
+        if metadata is None:
+            return
+        self._total_words -= metadata.get("word_count", 0)
+        self._total_chars -= metadata.get("content_length", 0)
+        self._remove_key(self._by_words, (-metadata.get("word_count", 0), doc_id))
+        self._remove_key(self._by_added, (metadata.get("added_date", ""), doc_id))
+        self.attributes.remove(doc_id, metadata)
+    
+    def _dump_state(self) -> Dict:
+        """Snapshot of in-memory state for compaction"""
+        # Written first: a crash before metadata.json is replaced leaves a sidecar that simply doesn't match
+        self._save_lexical_snapshot(self.store.generation)
+        return {
+            "documents": self.documents,
+            "metadata": self.document_metadata,
+            "zdicts": self.codec.export_dictionaries()
+        }
+    
+    def _apply_op(self, op: Dict):
+        """Apply a single journal operation to in-memory state"""
+        kind = op.get("op")
+        if kind == "put":
+            self._put(op["doc_id"], op["content"], self.codec.decode(op["content"]), op["metadata"])
+        elif kind == "revise":
+            # Rebuilt from the current version; the journal order guarantees it is the one the diff was taken from
+            old = self._content(op["doc_id"])
+            content = "".join(old[segment[0]:segment[1]] if isinstance(segment, list) else segment
+                              for segment in op["segments"])
+            self._put(op["doc_id"], self.codec.encode(content), content, op["metadata"])
+        elif kind == "delete":
+            self._unindex_metadata(op["doc_id"])
+            self._decoded.discard(op["doc_id"])
+            self.documents.pop(op["doc_id"], None)
+            self.document_metadata.pop(op["doc_id"], None)
+            self.lexical.remove(op["doc_id"])
+        elif kind == "clear":
+            self.documents = {}
+            self.document_metadata = {}
+            self._decoded.clear()
+            self._rebuild_aggregates()
+            self.lexical.clear()
+        elif kind == "zdict":
+            self.codec.add_dictionary(op["id"], base64.b64decode(op["data"]))
+    
+    def _put(self, doc_id: str, stored: str, content: str, metadata: Dict):
+        """Store a document (new or a new version), re-indexing only the chunks that changed"""
+        self._unindex_metadata(doc_id)
+        self._decoded.discard(doc_id)
+        self.documents[doc_id] = stored
+        self.document_metadata[doc_id] = metadata
+        self._index_metadata(doc_id, metadata)
+        self.lexical.add(doc_id, content)
+    
+    def _refresh(self):
+        """Pick up writes made by other worker processes"""
+        self.store.refresh()
+    
+    @property
+    def generation(self) -> int:
+        """Monotonic counter bumped by every committed write, other workers' included"""
+        self._refresh()
+        return self.store.generation
+    
+    def _document_op(self, doc_id: str, content: str, metadata: Dict = None, revise: bool = True) -> Dict:
+        """Build the journal operation that stores one document"""
         # Store metadata
         if metadata is None:
             metadata = {}
         
-        self.document_metadata[doc_id] = {
+        doc_metadata = {
             "added_date": datetime.now().isoformat(),
             "content_length": len(content),
-            "word_count": len(content.split()),
+            "word_count": count_words(content),
             **metadata
         }
+        if revise and doc_id in self.documents:
+            revision = self._revision_op(doc_id, content, doc_metadata)
+            if revision is not None:
+                return revision
+        return {"op": "put", "doc_id": doc_id, "content": self.codec.encode(content), "metadata": doc_metadata}
+    
+    def _revision_op(self, doc_id: str, content: str, doc_metadata: Dict) -> Optional[Dict]:
+        """Journal a new version of a stored document as a chunk-level diff against the current one.
+        
+        Segments are either ``[start, end]`` ranges copied from the current
+        text (chunks whose hash is unchanged) or literal new text, so the
+        journal entry, like the re-indexing, scales with the edit rather than
+        the paper. Returns None when too little is shared for a diff to pay off.
+        """
+        old = self._content(doc_id)
+        known = self.lexical.spans_by_hash(doc_id)
+        segments: List[Any] = []
+        position = copied = 0
+        
+        def literal(text: str):
+            if text:
+                if segments and isinstance(segments[-1], str):
+                    segments[-1] += text
+                else:
+                    segments.append(text)
+        
+        for chunk in self.lexical.chunker.chunk(content):
+            span = known.get(chunk["hash"])
+            if span is None:
+                continue
+            gap = content[position:chunk["start"]]
+            if segments and isinstance(segments[-1], list) and old[segments[-1][1]:span[0]] == gap:
+                # Runs of unchanged chunks become one range, gaps included
+                segments[-1][1] = span[1]
+            else:
+                literal(gap)
+                segments.append(list(span))
+            copied += span[1] - span[0]
+            position = chunk["end"]
+        literal(content[position:])
         
-        self._save_documents()
-        print(f"✅ Document '{doc_id}' added to RAG system")
+        if copied < len(content) // 2:
+            return None
+        print(f"♻️ Document '{doc_id}' revised: {len(content) - copied} of {len(content)} characters changed")
+        return {"op": "revise", "doc_id": doc_id, "segments": segments, "metadata": doc_metadata}
+    
+    def _maybe_train_dictionary(self, ops: List[Dict], new_texts: List[str]):
+        """Train the shared compression dictionary once the corpus is big enough to learn from.
+        
+        Runs inside the write transaction so concurrent workers agree on a single dictionary.
+        """
+        if not self.codec.enabled or self.codec.current_id or \
+                len(self.documents) + len(new_texts) < DICT_MIN_DOCUMENTS:
+            return
+        existing = [self._content(doc_id) for doc_id in list(self.documents)[:100]]
+        data = train_dictionary(existing + new_texts[:100])
+        if not data:
+            return
+        op = {"op": "zdict", "id": 1, "data": base64.b64encode(data).decode("ascii")}
+        # Apply now so the documents in this same transaction are compressed with it
+        self._apply_op(op)
+        ops.append(op)
+    
+    def _content(self, doc_id: str) -> str:
+        """Decompressed text of a document (cached for recently read ones)"""
+        content = self._decoded.get(doc_id)
+        if content is None:
+            stored = self.documents.get(doc_id)
+            if stored is None:
+                return ""
+            content = self.codec.decode(stored)
+            self._decoded.put(doc_id, content)
+        return content
+    
+    def add_document(self, doc_id: str, content: str, metadata: Dict = None) -> List[Dict]:
+        """Add a document to the RAG system. Returns its near-duplicates already stored."""
+        return self.add_documents([(doc_id, content, metadata)])[doc_id]
+    
+    def add_documents(self, documents: List[Tuple[str, str, Dict]]) -> Dict[str, List[Dict]]:
+        """Add a batch of (doc_id, content, metadata) in one transaction and one fsync.
+        
+        Near-duplicates of earlier papers are flagged in metadata (``near_duplicate_of``)
+        and returned per doc_id.
+        """
+        signed, duplicates = self.duplicates.match_many([(doc_id, content) for doc_id, content, _ in documents])
+        with self.store.transaction() as ops:
+            self._maybe_train_dictionary(ops, [content for _, content, _ in documents])
+            seen = set()
+            for doc_id, content, metadata in documents:
+                # A diff is taken against the stored version, which a repeat within the batch has not replaced yet
+                ops.append(self._document_op(doc_id, content, flag_metadata(metadata, duplicates[doc_id]),
+                                             revise=doc_id not in seen))
+                seen.add(doc_id)
+        # Signatures only once the documents are stored, so a failed write cannot leave orphans
+        self.duplicates.store_signatures(signed)
+        if len(documents) == 1:
+            print(f"✅ Document '{documents[0][0]}' added to RAG system")
+        else:
+            print(f"✅ {len(documents)} documents added to RAG system")
+        return duplicates
     
     def remove_document(self, doc_id: str):
         """Remove a document from the RAG system"""
-        if doc_id in self.documents:
-            del self.documents[doc_id]
-        if doc_id in self.document_metadata:
-            del self.document_metadata[doc_id]
-        self._save_documents()
+        with self.store.transaction() as ops:
+            if doc_id in self.documents or doc_id in self.document_metadata:
+                ops.append({"op": "delete", "doc_id": doc_id})
+        self.duplicates.remove(doc_id)
         print(f"✅ Document '{doc_id}' removed from RAG system")
     
+    def find_duplicates(self, doc_id: str) -> List[Dict]:
+        """Stored near-duplicates of a document, most similar first"""
+        matches = self.duplicates.find(doc_id, self.get_document_content)
+        # A signature can outlive its document if a delete races the signature write
+        return [match for match in matches if match["doc_id"] in self.document_metadata]
+    
+    def _document_summary(self, doc_id: str) -> Dict:
+        metadata = self.document_metadata.get(doc_id, {})
+        return {
+            "id": doc_id,
+            "added_date": metadata.get("added_date", "Unknown"),
+            "content_length": metadata.get("content_length", 0),
+            "word_count": metadata.get("word_count", 0)
+        }
+    
+    @staticmethod
+    def _page(index: List[Tuple], limit: Optional[int], cursor: Optional[str]) -> Tuple[List[Tuple], Optional[str]]:
+        """Keyset pagination over a sorted index: O(log n) seek plus the page itself"""
+        try:
+            start = bisect.bisect_right(index, decode_cursor(cursor)) if cursor else 0
+        except TypeError:
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+        if limit is None:
+            return index[start:], None
+        page = index[start:start + limit]
+        next_cursor = encode_cursor(page[-1]) if page and start + limit < len(index) else None
+        return page, next_cursor
+    
     def list_documents(self) -> List[Dict]:
         """List all documents in the RAG system"""
-        documents = []
-        for doc_id, metadata in self.document_metadata.items():
-            documents.append({
-                "id": doc_id,
-                "added_date": metadata.get("added_date", "Unknown"),
-                "content_length": metadata.get("content_length", 0),
-                "word_count": metadata.get("word_count", 0)
+        return self.page_documents()[0]
+    
+    def page_documents(self, limit: int = None, cursor: str = None) -> Tuple[List[Dict], Optional[str]]:
+        """List documents oldest first, one page at a time. Returns (documents, next_cursor)."""
+        self._refresh()
+        page, next_cursor = self._page(self._by_added, limit, cursor)
+        return [self._document_summary(doc_id) for _, doc_id in page], next_cursor
+    
+    def count_documents(self) -> int:
+        """Number of documents in the RAG system"""
+        self._refresh()
+        return len(self.document_metadata)
+    
+    def search_documents(self, query: str, top_k: int = 3, filters: SearchFilter = None) -> List[Dict]:
+        """Search for relevant documents based on query, optionally within a filtered subset"""
+        with STAGE_SECONDS.time(stage="retrieval"):
+            self._refresh()
+            key = RetrievalCache.key("documents", query, self.generation, filters, top_k)
+            return self.retrieval_cache.get_or_compute(key, lambda: self._search_documents(query, top_k, filters))
+    
+    def _search_documents(self, query: str, top_k: int, filters: SearchFilter = None) -> List[Dict]:
+        candidates = self.attributes.candidates(filters)
+        if candidates is not None and not candidates:
+            return []
+        # Documents ranked by their best bm25 chunk, like the SQLite backend
+        results = []
+        for doc_id, _, score in self.lexical.best_per_document(query, top_k, candidates):
+            content = self._content(doc_id)
+            results.append({
+                "doc_id": doc_id,
+                "score": score,
+                "content": content[:500] + "..." if len(content) > 500 else content,
+                "metadata": self.document_metadata.get(doc_id, {})
             })
-        return documents
+        return results
+    
+    def search_chunks(self, query: str, top_k: int = 20, filters: SearchFilter = None) -> List[Dict]:
+        """Best-matching chunks across the corpus (or a filtered subset), highest bm25 score first"""
+        with STAGE_SECONDS.time(stage="retrieval"):
+            self._refresh()
+            key = RetrievalCache.key("chunks", query, self.generation, filters, top_k)
+            return self.retrieval_cache.get_or_compute(key, lambda: self._search_chunks(query, top_k, filters))
     
-    def search_documents(self, query: str, top_k: int = 3) -> List[Dict]:
-        """Search for relevant documents based on query"""
-        # Simple keyword-based search (can be enhanced with proper vector search)
-        query_lower = query.lower()
+    def _search_chunks(self, query: str, top_k: int, filters: SearchFilter = None) -> List[Dict]:
+        candidates = self.attributes.candidates(filters)
+        if candidates is not None and not candidates:
+            return []
         results = []
-        
-        for doc_id, content in self.documents.items():
-            content_lower = content.lower()
-            
-            # Simple relevance scoring based on keyword matches
-            score = 0
-            for word in query_lower.split():
-                if len(word) > 3:  # Only consider words longer than 3 characters
-                    score += content_lower.count(word) * len(word)
-            
-            if score > 0:
-                results.append({
-                    "doc_id": doc_id,
-                    "score": score,
-                    "content": content[:500] + "..." if len(content) > 500 else content,
-                    "metadata": self.document_metadata.get(doc_id, {})
-                })
-        
-        # Sort by score and return top_k results
-        results.sort(key=lambda x: x["score"], reverse=True)
-        return results[:top_k]
+        for doc_id, index, score in self.lexical.search(query, top_k, candidates):
+            start, end = self.lexical.chunk_span(doc_id, index)
+            results.append({
+                "doc_id": doc_id,
+                "chunk_index": index,
+                "score": score,
+                "text": self._content(doc_id)[start:end]
+            })
+        return results
     
     def get_document_content(self, doc_id: str) -> str:
         """Get the content of a specific document"""
-        return self.documents.get(doc_id, "")
+        self._refresh()
+        return self._content(doc_id)
     
-    def get_paper_overview(self) -> Dict[str, Any]:
-        """Get an overview of all papers in the system"""
-        total_documents = len(self.documents)
-        total_words = sum(meta.get("word_count", 0) for meta in self.document_metadata.values())
-        total_chars = sum(meta.get("content_length", 0) for meta in self.document_metadata.values())
+    def get_paper_overview(self, limit: int = None, cursor: str = None) -> Dict[str, Any]:
+        """Get an overview of all papers in the system, largest first"""
+        self._refresh()
+        page, next_cursor = self._page(self._by_words, limit, cursor)
         
-        # Get document statistics
         document_stats = []
-        for doc_id, metadata in self.document_metadata.items():
+        for _, doc_id in page:
+            metadata = self.document_metadata.get(doc_id, {})
             document_stats.append({
                 "id": doc_id,
                 "word_count": metadata.get("word_count", 0),
@@ -125,20 +423,18 @@ class RAGSystem:
                 "added_date": metadata.get("added_date", "Unknown")
             })
         
-        # Sort by word count (largest first)
-        document_stats.sort(key=lambda x: x["word_count"], reverse=True)
-        
         return {
-            "total_documents": total_documents,
-            "total_words": total_words,
-            "total_characters": total_chars,
+            "total_documents": len(self.document_metadata),
+            "total_words": self._total_words,
+            "total_characters": self._total_chars,
             "documents": document_stats,
+            "next_cursor": next_cursor,
             "last_updated": datetime.now().isoformat()
         }
     
     def clear_all_documents(self):
         """Clear all documents from the system"""
-        self.documents = {}
-        self.document_metadata = {}
-        self._save_documents()
+        with self.store.transaction() as ops:
+            ops.append({"op": "clear"})
+        self.duplicates.clear()
         print("✅ All documents cleared from RAG system")
\ No newline at end of file
@@ -0,0 +1,105 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from app.lexical_index import query_terms
+from app.metrics import CACHE_BYTES, CACHE_ENTRIES, record_cache
+from app.search_filter import SearchFilter
+
+
+def normalize_query(query: str) -> str:
+    """The terms retrieval actually uses, deduplicated and sorted.
+
+    Both backends score only words longer than three characters, and bm25
+    does not depend on term order, so "The Attention model" and "model
+    attention" share one cache entry.
+    """
+    return " ".join(sorted(set(query_terms(query))))
+
+
+def _estimate_size(value: Any) -> int:
+    """Rough in-memory size of a result (strings dominate)"""
+    if isinstance(value, str):
+        return 49 + len(value)
+    if isinstance(value, dict):
+        return 232 + sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 56 + 8 * len(value) + sum(_estimate_size(v) for v in value)
+    return 28
+
+
+class RetrievalCache:
+    """LRU cache of search results, keyed on the normalized query, the
+    arguments, the filter and the store's generation.
+
+    Every write bumps the store's generation, so entries computed before it
+    can never be hit again and simply age out of the LRU; nothing has to be
+    purged when documents change. Bounded by entry count and by estimated
+    bytes.
+    """
+
+    def __init__(self, name: str = "retrieval", max_entries: int = None, max_bytes: int = None):
+        self.name = name
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("RETRIEVAL_CACHE_SIZE", "512"))
+        self.max_bytes = max_bytes if max_bytes is not None else \
+            int(float(os.getenv("RETRIEVAL_CACHE_MB", "32")) * 1024 * 1024)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(kind: str, query: str, generation: int, filters: SearchFilter = None, *args) -> Tuple:
+        return (kind, normalize_query(query), generation, filters.key() if filters else None, *args)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        if not self.max_entries:
+            return compute()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if entry is not None:
+            record_cache(self.name, True)
+            return [dict(item) for item in entry[0]] if isinstance(entry[0], list) else entry[0]
+
+        value = compute()
+        record_cache(self.name, False)
+        size = _estimate_size(value)
+        with self._lock:
+            self.misses += 1
+            if size <= self.max_bytes:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._bytes -= old[1]
+                self._entries[key] = (value, size)
+                self._bytes += size
+                while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self._bytes -= evicted
+            CACHE_ENTRIES.set(len(self._entries), cache=self.name)
+            CACHE_BYTES.set(self._bytes, cache=self.name)
+        return [dict(item) for item in value] if isinstance(value, list) else value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            CACHE_ENTRIES.set(0, cache=self.name)
+            CACHE_BYTES.set(0, cache=self.name)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
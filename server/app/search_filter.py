@@ -0,0 +1,139 @@
+import bisect
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+CONTENT_TYPES = ("paper", "citation", "image_ocr")
+
+
+def content_type_of(metadata: Dict) -> str:
+    """A document's content type; documents stored before types were recorded are papers"""
+    return (metadata or {}).get("content_type") or "paper"
+
+
+class SearchFilter:
+    """Restricts retrieval to a subset of the corpus.
+
+    Every given attribute must match: one of ``doc_ids``, added within
+    ``[added_after, added_before]`` (ISO dates or timestamps, compared as
+    strings the way they are stored), the ``content_type`` and the
+    ``classification``.
+    """
+
+    def __init__(self, doc_ids: Iterable[str] = None, added_after: str = None, added_before: str = None,
+                 content_type: str = None, classification: str = None):
+        if content_type is not None and content_type not in CONTENT_TYPES:
+            raise ValueError(f"content_type must be one of {', '.join(CONTENT_TYPES)} (got {content_type!r})")
+        self.doc_ids = frozenset(doc_ids) if doc_ids else None
+        self.added_after = added_after or None
+        # A bare date as the upper bound includes that whole day
+        self.added_before = added_before + "T23:59:59.999999" if added_before and len(added_before) == 10 \
+            else added_before or None
+        self.content_type = content_type or None
+        self.classification = classification or None
+
+    def __bool__(self) -> bool:
+        return any(value is not None for value in self.key())
+
+    def key(self) -> Tuple:
+        """Hashable, order-independent identity (for caches)"""
+        return (tuple(sorted(self.doc_ids)) if self.doc_ids else None, self.added_after, self.added_before,
+                self.content_type, self.classification)
+
+    def to_dict(self) -> Dict:
+        return {
+            "doc_ids": sorted(self.doc_ids) if self.doc_ids else None,
+            "added_after": self.added_after,
+            "added_before": self.added_before,
+            "content_type": self.content_type,
+            "classification": self.classification,
+        }
+
+    def matches(self, doc_id: str, metadata: Dict) -> bool:
+        """Row-at-a-time check, for stores that have no attribute index"""
+        metadata = metadata or {}
+        added = metadata.get("added_date", "")
+        return ((self.doc_ids is None or doc_id in self.doc_ids)
+                and (self.added_after is None or added >= self.added_after)
+                and (self.added_before is None or added <= self.added_before)
+                and (self.content_type is None or content_type_of(metadata) == self.content_type)
+                and (self.classification is None or metadata.get("classification") == self.classification))
+
+
+class AttributeIndex:
+    """Per-attribute id sets over document metadata, for filter pushdown.
+
+    Content type and classification map to sets of doc ids, and added dates
+    are kept sorted for range lookups. :meth:`candidates` intersects only
+    the sets a filter names, smallest first, so resolving a filter costs
+    about as much as the subset it selects.
+    """
+
+    def __init__(self):
+        self.by_type: Dict[str, Set[str]] = {}
+        self.by_classification: Dict[str, Set[str]] = {}
+        self.by_added: List[Tuple[str, str]] = []  # sorted (added_date, doc_id)
+        self.doc_ids: Set[str] = set()
+
+    def clear(self):
+        self.by_type.clear()
+        self.by_classification.clear()
+        self.by_added = []
+        self.doc_ids.clear()
+
+    def rebuild(self, metadata: Dict[str, Dict]):
+        self.clear()
+        for doc_id, meta in metadata.items():
+            self._add_sets(doc_id, meta)
+        self.by_added = sorted((meta.get("added_date", ""), doc_id) for doc_id, meta in metadata.items())
+
+    def _add_sets(self, doc_id: str, metadata: Dict):
+        self.doc_ids.add(doc_id)
+        self.by_type.setdefault(content_type_of(metadata), set()).add(doc_id)
+        if metadata.get("classification"):
+            self.by_classification.setdefault(metadata["classification"], set()).add(doc_id)
+
+    def add(self, doc_id: str, metadata: Dict):
+        self._add_sets(doc_id, metadata)
+        bisect.insort(self.by_added, (metadata.get("added_date", ""), doc_id))
+
+    def remove(self, doc_id: str, metadata: Dict):
+        if doc_id not in self.doc_ids:
+            return
+        self.doc_ids.discard(doc_id)
+        for index, value in ((self.by_type, content_type_of(metadata)),
+                             (self.by_classification, metadata.get("classification"))):
+            ids = index.get(value)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del index[value]
+        key = (metadata.get("added_date", ""), doc_id)
+        pos = bisect.bisect_left(self.by_added, key)
+        if pos < len(self.by_added) and self.by_added[pos] == key:
+            del self.by_added[pos]
+
+    def candidates(self, search_filter: Optional[SearchFilter]) -> Optional[Set[str]]:
+        """Doc ids passing the filter, or None when there is no filter (everything passes)"""
+        if not search_filter:
+            return None
+        sets = []
+        if search_filter.doc_ids is not None:
+            sets.append(search_filter.doc_ids)
+        if search_filter.content_type is not None:
+            sets.append(self.by_type.get(search_filter.content_type, set()))
+        if search_filter.classification is not None:
+            sets.append(self.by_classification.get(search_filter.classification, set()))
+        if search_filter.added_after is not None or search_filter.added_before is not None:
+            start = bisect.bisect_left(self.by_added, (search_filter.added_after,)) \
+                if search_filter.added_after else 0
+            # (date, "\uffff") sorts after every doc id stamped with exactly that date
+            end = bisect.bisect_right(self.by_added, (search_filter.added_before, "\uffff")) \
+                if search_filter.added_before else len(self.by_added)
+            sets.append({doc_id for _, doc_id in self.by_added[start:end]})
+
+        sets.sort(key=len)
+        result = set(sets[0]) & self.doc_ids
+        for ids in sets[1:]:
+            if not result:
+                break
+            result &= ids
+        return result
@@ -0,0 +1,359 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """Cross-process advisory lock backed by a sidecar ``.lock`` file.
+
+    POSIX gets real shared/exclusive ``flock`` semantics. On Windows
+    ``msvcrt.locking`` only offers exclusive byte-range locks, so shared
+    requests are upgraded to exclusive there.
+    """
+
+    def __init__(self, lock_path: str):
+        self.lock_path = lock_path
+        self._thread_lock = threading.RLock()
+
+    @contextmanager
+    def acquire(self, exclusive: bool = True):
+        with self._thread_lock:
+            with open(self.lock_path, "a+b") as handle:
+                if fcntl is not None:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                else:
+                    handle.seek(0)
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+                    else:
+                        handle.seek(0)
+                        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+    @contextmanager
+    def try_acquire(self):
+        """Exclusive lock without waiting; yields False (and holds nothing) if another holder has it"""
+        if not self._thread_lock.acquire(blocking=False):
+            yield False
+            return
+        try:
+            with open(self.lock_path, "a+b") as handle:
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    else:
+                        handle.seek(0)
+                        msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+                except OSError:
+                    yield False
+                    return
+                try:
+                    yield True
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+                    else:
+                        handle.seek(0)
+                        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._thread_lock.release()
+
+
+class SharedStore:
+    """Multi-process safe persistence for a JSON snapshot plus an append-only journal.
+
+    Writers take an exclusive lock, catch up on whatever other workers wrote,
+    append their operations to ``<name>.journal`` and fsync once per
+    transaction. Readers call :meth:`refresh` (two ``stat`` calls when nothing
+    changed) and replay only the journal entries they have not seen yet.
+    Once the journal grows past ``compact_after`` entries the writer folds it
+    into ``<name>.json``. Both files are replaced atomically rather than
+    truncated, so a reader holding an old handle still sees a consistent
+    point-in-time view.
+
+    The owner supplies three callbacks:
+
+    - ``load_state(snapshot_dict)`` resets in-memory state from a snapshot
+    - ``apply_op(op)`` applies one journal operation
+    - ``dump_state()`` returns the dict written out on compaction
+    """
+
+    def __init__(self, storage_path: str, name: str,
+                 load_state: Callable[[Dict], None],
+                 apply_op: Callable[[Dict], None],
+                 dump_state: Callable[[], Dict],
+                 compact_after: int = None):
+        self.storage_path = storage_path
+        self.snapshot_file = os.path.join(storage_path, f"{name}.json")
+        self.journal_file = os.path.join(storage_path, f"{name}.journal")
+        self.lock = FileLock(os.path.join(storage_path, f"{name}.lock"))
+        self._load_state = load_state
+        self._apply_op = apply_op
+        self._dump_state = dump_state
+        self.compact_after = compact_after or int(os.getenv("STORE_COMPACT_AFTER", "200"))
+
+        self.generation = 0
+        self._snapshot_sig = None
+        self._journal_sig = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._mutex = threading.RLock()
+
+        os.makedirs(storage_path, exist_ok=True)
+        self.refresh(force=True)
+
+    @staticmethod
+    def _file_signature(path: str):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Bring in-memory state up to date with disk. Returns True if anything changed."""
+        with self._mutex:
+            snapshot_sig = self._file_signature(self.snapshot_file)
+            journal_sig = self._file_signature(self.journal_file)
+            if not force and snapshot_sig == self._snapshot_sig and journal_sig == self._journal_sig:
+                return False
+            with self.lock.acquire(exclusive=False):
+                self._catch_up(force)
+            return True
+
+    def _catch_up(self, force: bool = False):
+        """Reload snapshot and/or replay new journal entries. Caller holds the file lock."""
+        snapshot_sig = self._file_signature(self.snapshot_file)
+        journal_sig = self._file_signature(self.journal_file)
+
+        if force or snapshot_sig != self._snapshot_sig:
+            self._reload_snapshot()
+            self._snapshot_sig = snapshot_sig
+            self._journal_sig = None
+
+        # A replaced journal (new inode) means a compaction happened; replay from the start.
+        if self._journal_sig is None or journal_sig is None or journal_sig[0] != self._journal_sig[0]:
+            self._journal_offset = 0
+            self._journal_entries = 0
+        if journal_sig is not None and journal_sig[2] > self._journal_offset:
+            self._replay_journal()
+        self._journal_sig = self._file_signature(self.journal_file)
+
+    def _reload_snapshot(self):
+        data = {}
+        if os.path.exists(self.snapshot_file):
+            try:
+                with open(self.snapshot_file, "r") as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"Error loading {self.snapshot_file}: {e}")
+                data = {}
+        self.generation = data.get("generation", 0)
+        self._load_state(data)
+
+    def _replay_journal(self):
+        with open(self.journal_file, "rb") as f:
+            f.seek(self._journal_offset)
+            for raw_line in f:
+                if not raw_line.endswith(b"\n"):
+                    # A writer crashed mid-append; ignore the torn tail.
+                    break
+                self._journal_offset += len(raw_line)
+                self._journal_entries += 1
+                try:
+                    op = json.loads(raw_line)
+                except ValueError:
+                    continue
+                if op.get("gen", 0) <= self.generation:
+                    continue
+                self._apply_op(op)
+                self.generation = op["gen"]
+
+    @contextmanager
+    def transaction(self):
+        """Exclusive write section. Yields a list; append ops to it to commit them.
+
+        Ops are applied in memory and appended to the journal with a single
+        fsync when the block exits.
+        """
+        with self._mutex:
+            with self.lock.acquire(exclusive=True):
+                self._catch_up()
+                pending: List[Dict] = []
+                yield pending
+                if pending:
+                    self._commit(pending)
+
+    def _commit(self, ops: List[Dict]):
+        lines = []
+        for op in ops:
+            self.generation += 1
+            op["gen"] = self.generation
+            self._apply_op(op)
+            lines.append(json.dumps(op) + "\n")
+
+        with open(self.journal_file, "ab") as f:
+            f.write("".join(lines).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_offset = os.path.getsize(self.journal_file)
+        self._journal_entries += len(ops)
+        self._journal_sig = self._file_signature(self.journal_file)
+
+        if self._journal_entries >= self.compact_after:
+            self._compact()
+
+    def _compact(self):
+        """Fold the journal into a fresh snapshot. Caller holds the exclusive lock."""
+        data = self._dump_state()
+        data["generation"] = self.generation
+        data["last_updated"] = datetime.now().isoformat()
+
+        tmp_snapshot = self.snapshot_file + ".tmp"
+        with open(tmp_snapshot, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_snapshot, self.snapshot_file)
+
+        tmp_journal = self.journal_file + ".tmp"
+        open(tmp_journal, "wb").close()
+        os.replace(tmp_journal, self.journal_file)
+
+        self._snapshot_sig = self._file_signature(self.snapshot_file)
+        self._journal_sig = self._file_signature(self.journal_file)
+        self._journal_offset = 0
+        self._journal_entries = 0
+
+    def compact(self):
+        """Force a compaction now (e.g. before shutdown or a snapshot export)."""
+        with self._mutex:
+            with self.lock.acquire(exclusive=True):
+                self._catch_up()
+                self._compact()
+
+
+@contextmanager
+def open_store_files(storage_path: str, name: str):
+    """Point-in-time handles on a shared store's files, without holding up writers.
+
+    Yields ``(snapshot, journal, journal_length)``; either handle is None if
+    the file does not exist. The files are opened and the journal length
+    recorded under the store's shared lock, which is released before the
+    caller reads anything. Compaction replaces files rather than rewriting
+    them and writers only append, so reading the open handles (the journal
+    up to ``journal_length``) sees exactly the state at the time of the call.
+    """
+    lock = FileLock(os.path.join(storage_path, f"{name}.lock"))
+    handles = []
+    try:
+        with lock.acquire(exclusive=False):
+            for suffix in ("json", "journal"):
+                try:
+                    handles.append(open(os.path.join(storage_path, f"{name}.{suffix}"), "rb"))
+                except FileNotFoundError:
+                    handles.append(None)
+            journal_length = os.fstat(handles[1].fileno()).st_size if handles[1] else 0
+        yield handles[0], handles[1], journal_length
+    finally:
+        for handle in handles:
+            if handle is not None:
+                handle.close()
+
+
+def _disk_generation(snapshot_path: str, journal_path: str) -> int:
+    """Highest generation recorded in a store's files (0 if there are none)"""
+    generation = 0
+    if os.path.exists(snapshot_path):
+        try:
+            with open(snapshot_path, "r") as f:
+                generation = json.load(f).get("generation", 0)
+        except ValueError:
+            pass
+    if os.path.exists(journal_path):
+        with open(journal_path, "rb") as f:
+            for raw_line in f:
+                try:
+                    generation = max(generation, json.loads(raw_line).get("gen", 0))
+                except ValueError:
+                    continue
+    return generation
+
+
+def _rebase_files(snapshot_path: str, journal_path: str, offset: int) -> int:
+    """Shift every generation in a store's files by offset; returns the snapshot's new generation"""
+    with open(snapshot_path, "r") as f:
+        try:
+            data = json.load(f)
+        except ValueError:
+            data = {}
+    data["generation"] = data.get("generation", 0) + offset
+    with open(snapshot_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    lines = []
+    with open(journal_path, "rb") as f:
+        for raw_line in f:
+            if not raw_line.endswith(b"\n"):
+                break
+            try:
+                op = json.loads(raw_line)
+            except ValueError:
+                continue
+            op["gen"] = op.get("gen", 0) + offset
+            lines.append(json.dumps(op) + "\n")
+    with open(journal_path, "wb") as f:
+        f.write("".join(lines).encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+    return data["generation"]
+
+
+def install_store_files(storage_path: str, name: str, write_snapshot: Callable, write_journal: Callable = None,
+                        before_swap: Callable[[int], None] = None) -> int:
+    """Atomically replace a shared store's snapshot and journal.
+
+    ``write_snapshot(f)`` and ``write_journal(f)`` fill binary files; the
+    journal is left empty when no writer is given. Both files are swapped in
+    under the store's exclusive lock, so running workers pick up the new
+    state on their next refresh.
+
+    If the store already has state, the installed generations are shifted
+    above the current ones. Generations then never run backwards, so caches
+    and ETags keyed on them cannot mistake the new state for an old one.
+    ``before_swap(generation)`` is called under the lock with the installed
+    snapshot's generation, before the files go live. Returns that generation.
+    """
+    os.makedirs(storage_path, exist_ok=True)
+    lock = FileLock(os.path.join(storage_path, f"{name}.lock"))
+    paths = {suffix: os.path.join(storage_path, f"{name}.{suffix}") for suffix in ("json", "journal")}
+    with lock.acquire(exclusive=True):
+        for suffix, write in (("json", write_snapshot), ("journal", write_journal)):
+            with open(paths[suffix] + ".tmp", "wb") as f:
+                if write is not None:
+                    write(f)
+                f.flush()
+                os.fsync(f.fileno())
+        current = _disk_generation(paths["json"], paths["journal"])
+        if current:
+            generation = _rebase_files(paths["json"] + ".tmp", paths["journal"] + ".tmp", current + 1)
+        else:
+            generation = _disk_generation(paths["json"] + ".tmp", os.devnull)
+        if before_swap is not None:
+            before_swap(generation)
+        for path in paths.values():
+            os.replace(path + ".tmp", path)
+    return generation
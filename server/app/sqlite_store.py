@@ -0,0 +1,475 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Tuple, Optional
+
+from app.metrics import STAGE_SECONDS
+from app.rag_system import RAGSystem, encode_cursor, decode_cursor
+from app.dedup import NearDuplicateIndex, flag_metadata
+from app.doc_codec import DocumentCodec, train_dictionary, DICT_MIN_DOCUMENTS
+from app.text_chunker import TextChunker, count_words
+from app.search_filter import SearchFilter
+from app.retrieval_cache import RetrievalCache
+
+# Filtered searches over at most this many documents seek each one's chunk rowid range
+FILTER_SEEK_LIMIT = 16
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    added_date TEXT NOT NULL,
+    content_length INTEGER NOT NULL,
+    word_count INTEGER NOT NULL,
+    metadata TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_documents_added ON documents(added_date, doc_id);
+CREATE INDEX IF NOT EXISTS idx_documents_words ON documents(word_count DESC, doc_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+    doc_id UNINDEXED,
+    chunk_index UNINDEXED,
+    text,
+    tokenize = 'porter unicode61'
+);
+CREATE TABLE IF NOT EXISTS chunk_ranges (
+    doc_id TEXT PRIMARY KEY,
+    first_rowid INTEGER NOT NULL,
+    last_rowid INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS zdicts (
+    id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('generation', 0);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('total_documents', 0);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('total_words', 0);
+INSERT OR IGNORE INTO store_meta (key, value) VALUES ('total_characters', 0);
+"""
+
+
+class SQLiteRAGSystem:
+    """RAGSystem backend that keeps documents and chunk text in SQLite with FTS5.
+
+    Drop-in replacement for :class:`app.rag_system.RAGSystem`: same public
+    methods, but storage is transactional and on disk, search is bm25-ranked
+    full-text search, and the corpus does not have to fit in RAM. WAL mode
+    lets several worker processes read while one writes.
+    """
+
+    def __init__(self, storage_path: str = "data/vector_store", db_name: str = "documents.db"):
+        self.storage_path = storage_path
+        self.db_path = os.path.join(storage_path, db_name)
+        self.chunker = TextChunker()
+        self._local = threading.local()
+        os.makedirs(storage_path, exist_ok=True)
+        self.duplicates = NearDuplicateIndex(storage_path)
+        # documents.content holds zlib-compressed BLOBs (plain TEXT rows from older versions still read fine)
+        self.codec = DocumentCodec()
+        # Keyed on store_meta's generation, which every worker's writes bump
+        self.retrieval_cache = RetrievalCache()
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+        self._load_dictionaries()
+        self._import_json_store()
+
+    def _import_json_store(self):
+        """Seed an empty database from the JSON store so switching backends keeps the corpus"""
+        metadata_file = os.path.join(self.storage_path, "metadata.json")
+        conn = self._connect()
+        if not os.path.exists(metadata_file) or conn.execute("SELECT 1 FROM documents LIMIT 1").fetchone():
+            return
+
+        # Go through RAGSystem so any unflushed journal entries are included
+        json_store = RAGSystem(self.storage_path)
+        with conn:
+            for doc_id in json_store.documents:
+                self._insert_document(conn, doc_id, json_store.get_document_content(doc_id),
+                                      json_store.document_metadata.get(doc_id))
+            self._bump_generation(conn)
+        print(f"📥 Imported {len(json_store.documents)} documents from {metadata_file}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; sqlite3 connections are not thread-safe"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _load_dictionaries(self):
+        for row in self._connect().execute("SELECT id, data FROM zdicts"):
+            self.codec.add_dictionary(row["id"], bytes(row["data"]))
+
+    def _maybe_train_dictionary(self, conn: sqlite3.Connection, new_texts: List[str]):
+        """Train the shared compression dictionary once the corpus is big enough to learn from"""
+        if not self.codec.enabled or self.codec.current_id:
+            return
+        existing = conn.execute("SELECT value FROM store_meta WHERE key = 'total_documents'").fetchone()["value"]
+        if existing + len(new_texts) < DICT_MIN_DOCUMENTS:
+            return
+        samples = [self._decode(row["content"]) for row in conn.execute("SELECT content FROM documents LIMIT 100")]
+        data = train_dictionary(samples + new_texts[:100])
+        if data:
+            # Another worker may have won the race; everyone then uses the stored one
+            conn.execute("INSERT OR IGNORE INTO zdicts (id, data) VALUES (1, ?)", (data,))
+            self._load_dictionaries()
+
+    def _decode(self, stored) -> str:
+        try:
+            return self.codec.decompress(stored)
+        except KeyError:
+            # Compressed with a dictionary another worker trained after we loaded ours
+            self._load_dictionaries()
+            return self.codec.decompress(stored)
+
+    @property
+    def generation(self) -> int:
+        """Monotonic counter bumped by every committed write"""
+        row = self._connect().execute("SELECT value FROM store_meta WHERE key = 'generation'").fetchone()
+        return row["value"] if row else 0
+
+    @staticmethod
+    def _bump_generation(conn: sqlite3.Connection):
+        conn.execute("UPDATE store_meta SET value = value + 1 WHERE key = 'generation'")
+
+    @staticmethod
+    def _adjust_totals(conn: sqlite3.Connection, documents: int, words: int, characters: int):
+        """Keep the running aggregates in step with a write, inside the same transaction"""
+        conn.executemany(
+            "UPDATE store_meta SET value = value + ? WHERE key = ?",
+            [(documents, "total_documents"), (words, "total_words"), (characters, "total_characters")]
+        )
+
+    def _forget_document(self, conn: sqlite3.Connection, doc_id: str) -> bool:
+        """Delete a document and its chunks, backing it out of the aggregates"""
+        old = conn.execute(
+            "SELECT word_count, content_length FROM documents WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        if old is None:
+            return False
+        conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+        chunk_range = conn.execute(
+            "SELECT first_rowid, last_rowid FROM chunk_ranges WHERE doc_id = ?", (doc_id,)
+        ).fetchone()
+        if chunk_range:
+            conn.execute("DELETE FROM chunks WHERE rowid BETWEEN ? AND ?", tuple(chunk_range))
+            conn.execute("DELETE FROM chunk_ranges WHERE doc_id = ?", (doc_id,))
+        else:
+            # Stored before chunk ranges were recorded
+            conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+        self._adjust_totals(conn, -1, -old["word_count"], -old["content_length"])
+        return True
+
+    @staticmethod
+    def _row_metadata(row: sqlite3.Row) -> Dict:
+        return {
+            "added_date": row["added_date"],
+            "content_length": row["content_length"],
+            "word_count": row["word_count"],
+            **json.loads(row["metadata"] or "{}")
+        }
+
+    def _insert_document(self, conn: sqlite3.Connection, doc_id: str, content: str, metadata: Dict = None):
+        extra = dict(metadata or {})
+        added_date = extra.pop("added_date", datetime.now().isoformat())
+        word_count = count_words(content)
+        self._forget_document(conn, doc_id)
+        conn.execute(
+            "INSERT INTO documents (doc_id, content, added_date, content_length, word_count, metadata) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (doc_id, self.codec.compress(content) if self.codec.enabled else content,
+             added_date, len(content), word_count, json.dumps(extra))
+        )
+        self._adjust_totals(conn, 1, word_count, len(content))
+        chunks = [(doc_id, chunk["index"], chunk["text"]) for chunk in self.chunker.chunk(content)]
+        conn.executemany("INSERT INTO chunks (doc_id, chunk_index, text) VALUES (?, ?, ?)", chunks)
+        if chunks:
+            # Inserted back to back under the write lock, so the rowids are contiguous;
+            # a rowid range lets filtered searches seek straight to this document's chunks
+            last = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            conn.execute("INSERT INTO chunk_ranges (doc_id, first_rowid, last_rowid) VALUES (?, ?, ?)",
+                         (doc_id, last - len(chunks) + 1, last))
+
+    def add_document(self, doc_id: str, content: str, metadata: Dict = None) -> List[Dict]:
+        """Add a document to the RAG system. Returns its near-duplicates already stored."""
+        signed, duplicates = self.duplicates.match_many([(doc_id, content)])
+        duplicates = duplicates[doc_id]
+        conn = self._connect()
+        with conn:
+            self._maybe_train_dictionary(conn, [content])
+            self._insert_document(conn, doc_id, content, flag_metadata(metadata, duplicates))
+            self._bump_generation(conn)
+        # Signatures only once the document is stored, so a failed write cannot leave orphans
+        self.duplicates.store_signatures(signed)
+        print(f"✅ Document '{doc_id}' added to RAG system")
+        return duplicates
+
+    def add_documents(self, documents: List[Tuple[str, str, Dict]]) -> Dict[str, List[Dict]]:
+        """Add a batch of (doc_id, content, metadata) in a single transaction"""
+        signed, duplicates = self.duplicates.match_many([(doc_id, content) for doc_id, content, _ in documents])
+        conn = self._connect()
+        with conn:
+            self._maybe_train_dictionary(conn, [content for _, content, _ in documents])
+            for doc_id, content, metadata in documents:
+                self._insert_document(conn, doc_id, content, flag_metadata(metadata, duplicates[doc_id]))
+            self._bump_generation(conn)
+        self.duplicates.store_signatures(signed)
+        print(f"✅ {len(documents)} documents added to RAG system")
+        return duplicates
+
+    def remove_document(self, doc_id: str):
+        """Remove a document from the RAG system"""
+        conn = self._connect()
+        with conn:
+            if self._forget_document(conn, doc_id):
+                self._bump_generation(conn)
+        self.duplicates.remove(doc_id)
+        print(f"✅ Document '{doc_id}' removed from RAG system")
+
+    def find_duplicates(self, doc_id: str) -> List[Dict]:
+        """Stored near-duplicates of a document, most similar first"""
+        matches = self.duplicates.find(doc_id, self.get_document_content)
+        if not matches:
+            return matches
+        # A signature can outlive its document if a delete races the signature write
+        ids = [match["doc_id"] for match in matches]
+        stored = {row[0] for row in self._connect().execute(
+            f"SELECT doc_id FROM documents WHERE doc_id IN ({','.join('?' * len(ids))})", ids)}
+        return [match for match in matches if match["doc_id"] in stored]
+
+    def list_documents(self) -> List[Dict]:
+        """List all documents in the RAG system"""
+        return self.page_documents()[0]
+
+    def page_documents(self, limit: int = None, cursor: str = None) -> Tuple[List[Dict], Optional[str]]:
+        """List documents oldest first, one page at a time. Returns (documents, next_cursor)."""
+        sql = "SELECT doc_id, added_date, content_length, word_count FROM documents"
+        params = []
+        if cursor:
+            added_date, doc_id = decode_cursor(cursor)
+            sql += " WHERE (added_date, doc_id) > (?, ?)"
+            params += [added_date, doc_id]
+        sql += " ORDER BY added_date, doc_id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+
+        rows = self._connect().execute(sql, params).fetchall()
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor((rows[-1]["added_date"], rows[-1]["doc_id"]))
+        return [{
+            "id": row["doc_id"],
+            "added_date": row["added_date"],
+            "content_length": row["content_length"],
+            "word_count": row["word_count"]
+        } for row in rows], next_cursor
+
+    def _totals(self) -> Dict[str, int]:
+        rows = self._connect().execute("SELECT key, value FROM store_meta")
+        return {row["key"]: row["value"] for row in rows}
+
+    def count_documents(self) -> int:
+        """Number of documents in the RAG system"""
+        return self._totals().get("total_documents", 0)
+
+    @staticmethod
+    def _fts_query(query: str) -> str:
+        """Turn free text into an FTS5 OR-query of quoted terms"""
+        # Same rule as the in-memory backend: only words longer than 3 characters count
+        terms = [t for t in re.findall(r"\w+", query.lower()) if len(t) > 3]
+        return " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+
+    @staticmethod
+    def _filter_sql(filters: SearchFilter) -> Tuple[str, List]:
+        """WHERE clause over documents (aliased d) for a search filter"""
+        clauses, params = [], []
+        if filters.doc_ids is not None:
+            clauses.append(f"d.doc_id IN ({', '.join('?' * len(filters.doc_ids))})")
+            params += sorted(filters.doc_ids)
+        if filters.added_after is not None:
+            clauses.append("d.added_date >= ?")
+            params.append(filters.added_after)
+        if filters.added_before is not None:
+            clauses.append("d.added_date <= ?")
+            params.append(filters.added_before)
+        if filters.content_type is not None:
+            clauses.append("COALESCE(json_extract(d.metadata, '$.content_type'), 'paper') = ?")
+            params.append(filters.content_type)
+        if filters.classification is not None:
+            clauses.append("json_extract(d.metadata, '$.classification') = ?")
+            params.append(filters.classification)
+        return " AND ".join(clauses), params
+
+    def _filtered_chunks(self, conn: sqlite3.Connection, match: str, filters: SearchFilter,
+                         limit: Optional[int], columns: str, per_document: int = None) -> Iterable[sqlite3.Row]:
+        """FTS rows for a filtered search, best (lowest rank) first.
+
+        ``per_document`` caps the rows taken from each document (1 is enough
+        to rank documents by their best chunk); ``limit`` caps the total.
+
+        The filter is resolved on the documents table first. A small subset is
+        searched one rowid range per document, which FTS5 turns into seeks
+        within the postings, so the cost follows the subset rather than the
+        corpus. Large subsets, or documents stored before chunk ranges were
+        recorded, fall back to a doc_id semi-join inside the ranking query.
+        """
+        where, params = self._filter_sql(filters)
+        subset = conn.execute(
+            "SELECT d.doc_id, r.first_rowid, r.last_rowid FROM documents d "
+            f"LEFT JOIN chunk_ranges r ON r.doc_id = d.doc_id WHERE {where}",
+            params
+        ).fetchall()
+        if not subset:
+            return []
+        if len(subset) <= FILTER_SEEK_LIMIT and all(row["first_rowid"] is not None for row in subset):
+            rows = []
+            for row in subset:
+                rows += conn.execute(
+                    f"SELECT {columns} FROM chunks WHERE chunks MATCH ? AND rowid BETWEEN ? AND ? "
+                    "ORDER BY rank LIMIT ?",
+                    (match, row["first_rowid"], row["last_rowid"], per_document or limit or -1)
+                ).fetchall()
+            rows.sort(key=lambda r: r["rank"])
+            return rows[:limit] if limit else rows
+        return conn.execute(
+            f"SELECT {columns} FROM chunks WHERE chunks MATCH ? "
+            f"AND doc_id IN (SELECT d.doc_id FROM documents d WHERE {where}) ORDER BY rank LIMIT ?",
+            [match, *params, limit or -1]
+        )
+
+    def search_documents(self, query: str, top_k: int = 3, filters: SearchFilter = None) -> List[Dict]:
+        """Search for relevant documents based on query, ranked by bm25, optionally within a filtered subset"""
+        with STAGE_SECONDS.time(stage="retrieval"):
+            # Read the generation before searching: a write landing in between
+            # leaves newer results under an older key, which is never hit again
+            key = RetrievalCache.key("documents", query, self.generation, filters, top_k)
+            return self.retrieval_cache.get_or_compute(key, lambda: self._search_documents(query, top_k, filters))
+
+    def _search_documents(self, query: str, top_k: int, filters: SearchFilter = None) -> List[Dict]:
+        match = self._fts_query(query)
+        if not match:
+            return []
+
+        # Walk chunks in bm25 order (lower is better) and keep each document's best chunk
+        conn = self._connect()
+        best = {}
+        if filters:
+            ranked = self._filtered_chunks(conn, match, filters, None, "doc_id, rank", per_document=1)
+        else:
+            ranked = conn.execute("SELECT doc_id, rank FROM chunks WHERE chunks MATCH ? ORDER BY rank", (match,))
+        for row in ranked:
+            if row["doc_id"] not in best:
+                best[row["doc_id"]] = row["rank"]
+                if len(best) >= top_k:
+                    break
+
+        results = []
+        for doc_id, rank in best.items():
+            row = conn.execute(
+                "SELECT content, added_date, content_length, word_count, metadata "
+                "FROM documents WHERE doc_id = ?",
+                (doc_id,)
+            ).fetchone()
+            if row is None:
+                continue
+            preview = self._decode(row["content"])[:501]
+            results.append({
+                "doc_id": doc_id,
+                "score": -rank,
+                "content": preview[:500] + "..." if len(preview) > 500 else preview,
+                "metadata": self._row_metadata(row)
+            })
+        return results
+
+    def search_chunks(self, query: str, top_k: int = 20, filters: SearchFilter = None) -> List[Dict]:
+        """Best-matching chunks across the corpus (or a filtered subset), highest bm25 score first"""
+        with STAGE_SECONDS.time(stage="retrieval"):
+            key = RetrievalCache.key("chunks", query, self.generation, filters, top_k)
+            return self.retrieval_cache.get_or_compute(key, lambda: self._search_chunks(query, top_k, filters))
+
+    def _search_chunks(self, query: str, top_k: int, filters: SearchFilter = None) -> List[Dict]:
+        match = self._fts_query(query)
+        if not match:
+            return []
+        conn = self._connect()
+        if filters:
+            rows = list(self._filtered_chunks(conn, match, filters, top_k, "doc_id, chunk_index, text, rank"))
+        else:
+            rows = conn.execute(
+                "SELECT doc_id, chunk_index, text, rank FROM chunks WHERE chunks MATCH ? ORDER BY rank LIMIT ?",
+                (match, top_k)
+            ).fetchall()
+        return [
+            {"doc_id": row["doc_id"], "chunk_index": row["chunk_index"], "score": -row["rank"], "text": row["text"]}
+            for row in rows
+        ]
+
+    def get_document_content(self, doc_id: str) -> str:
+        """Get the content of a specific document"""
+        row = self._connect().execute("SELECT content FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+        return self._decode(row["content"]) if row else ""
+
+    def get_paper_overview(self, limit: int = None, cursor: str = None) -> Dict[str, Any]:
+        """Get an overview of all papers in the system, largest first"""
+        sql = "SELECT doc_id, word_count, content_length, added_date FROM documents"
+        params = []
+        if cursor:
+            neg_words, doc_id = decode_cursor(cursor)
+            sql += " WHERE word_count < ? OR (word_count = ? AND doc_id > ?)"
+            params += [-neg_words, -neg_words, doc_id]
+        sql += " ORDER BY word_count DESC, doc_id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+
+        rows = self._connect().execute(sql, params).fetchall()
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            # Same cursor shape as the JSON backend: (-word_count, doc_id)
+            next_cursor = encode_cursor((-rows[-1]["word_count"], rows[-1]["doc_id"]))
+        document_stats = [{
+            "id": row["doc_id"],
+            "word_count": row["word_count"],
+            "content_length": row["content_length"],
+            "added_date": row["added_date"]
+        } for row in rows]
+
+        totals = self._totals()
+        return {
+            "total_documents": totals.get("total_documents", 0),
+            "total_words": totals.get("total_words", 0),
+            "total_characters": totals.get("total_characters", 0),
+            "documents": document_stats,
+            "next_cursor": next_cursor,
+            "last_updated": datetime.now().isoformat()
+        }
+
+    def clear_all_documents(self):
+        """Clear all documents from the system"""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM documents")
+            conn.execute("DELETE FROM chunks")
+            conn.execute("DELETE FROM chunk_ranges")
+            conn.execute(
+                "UPDATE store_meta SET value = 0 "
+                "WHERE key IN ('total_documents', 'total_words', 'total_characters')"
+            )
+            self._bump_generation(conn)
+        self.duplicates.clear()
+        print("✅ All documents cleared from RAG system")
@@ -0,0 +1,201 @@
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from app.context_packer import ContextPacker, CONTEXT_SLOT, clean_context, estimate_tokens
+from app.llm_scheduler import Priority
+from app.metrics import CACHE_ENTRIES, STAGE_SECONDS, record_cache, log_event
+from app.ollama_client import OllamaClient
+from app.shared_store import SharedStore
+from app.text_chunker import TextChunker
+
+# Bump when the map prompt changes so stale partial summaries are not reused
+MAP_PROMPT_VERSION = 1
+MAP_TEMPLATE = f"""Summarize this excerpt of a research paper in a few sentences.
+Keep concrete claims, methods, datasets, numbers and named results. Do not add commentary.
+
+Excerpt:
+{CONTEXT_SLOT}
+
+Summary:"""
+REDUCE_TEMPLATE = f"""These are summaries of consecutive parts of one research paper.
+Merge them into a single coherent summary that keeps the important specifics.
+
+{CONTEXT_SLOT}
+
+Merged summary:"""
+DIRECT_TEMPLATE = f"""Research paper:
+
+{CONTEXT_SLOT}
+
+{{instruction}}"""
+FINAL_TEMPLATE = f"""These are summaries of consecutive parts of one research paper:
+
+{CONTEXT_SLOT}
+
+{{instruction}}"""
+
+MAP_TOKENS = 200
+REDUCE_TOKENS = 400
+# Target excerpt size for the map stage; ~4 characters per token
+CHUNK_TOKENS = 1500
+# Partial summaries kept in the shared store; the oldest written are evicted first
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "5000"))
+
+
+def _digest(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class MapReduceSummarizer:
+    """Hierarchical summaries for papers longer than one context window.
+
+    Map: the cleaned paper is cut into excerpts that are summarized in
+    parallel, at most as many at once as the LLM scheduler admits. Each
+    partial summary is cached by the hash of its excerpt in a shared store,
+    so a second pass over the same paper (e.g. with a different final
+    instruction) only pays for the reduce. The cache holds at most
+    ``max_partials`` entries; beyond that the oldest written are evicted in
+    the same transaction, so partials of deleted or re-uploaded papers age
+    out instead of accumulating.
+
+    Reduce: partial summaries are merged in groups that fit the window,
+    level by level, until one final call can see them all. Text short enough
+    for a single prompt skips straight to that final call.
+    """
+
+    def __init__(self, client: OllamaClient, model: str, storage_path: str = "data/vector_store",
+                 max_partials: int = None):
+        self.client = client
+        self.max_partials = max_partials if max_partials is not None else SUMMARY_CACHE_SIZE
+        self.model = model
+        self.packer = ContextPacker(model)
+        self.chunker = TextChunker(chunk_size=CHUNK_TOKENS * 4)
+        self.partials = {}
+        self.store = SharedStore(
+            storage_path, "summaries",
+            load_state=self._load_state,
+            apply_op=self._apply_op,
+            dump_state=self._dump_state,
+        )
+
+    def _load_state(self, data: Dict):
+        self.partials = data.get("partials", {})
+
+    def _dump_state(self) -> Dict:
+        return {"partials": self.partials}
+
+    def _apply_op(self, op: Dict):
+        kind = op.get("op")
+        if kind == "put":
+            # Re-inserted so dict order stays oldest-written first
+            self.partials.pop(op["key"], None)
+            self.partials[op["key"]] = op["summary"]
+        elif kind == "evict":
+            for key in op["keys"]:
+                self.partials.pop(key, None)
+
+    def _generate(self, prompt: str, max_tokens: int, priority: Priority, caller: str) -> str:
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "options": {"temperature": 0.2, "num_predict": max_tokens, **self.packer.options()},
+        }
+        return self.client.generate(payload, timeout=120, caller=caller, priority=priority).strip()
+
+    def _cached_parallel(self, keyed_prompts: List[tuple], max_tokens: int,
+                         priority: Priority, caller: str) -> List[str]:
+        """Run (key, prompt) generations not already cached, in parallel, and persist the results"""
+        self.store.refresh()
+        results = {}
+        missing = []
+        for key, prompt in keyed_prompts:
+            hit = key in self.partials
+            record_cache("summary_partials", hit)
+            if hit:
+                results[key] = self.partials[key]
+            elif key not in results:
+                results[key] = None
+                missing.append((key, prompt))
+
+        if missing:
+            workers = max(1, min(len(missing), self.client.scheduler.max_in_flight))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [(key, pool.submit(self._generate, prompt, max_tokens, priority, caller))
+                           for key, prompt in missing]
+                generated = {}
+                try:
+                    for key, future in futures:
+                        generated[key] = future.result()
+                finally:
+                    # Keep whatever finished even if a sibling failed
+                    if generated:
+                        with self.store.transaction() as ops:
+                            for key, summary in generated.items():
+                                ops.append({"op": "put", "key": key, "summary": summary})
+                            overflow = len(self.partials.keys() | generated.keys()) - self.max_partials
+                            if overflow > 0:
+                                stale = [key for key in self.partials if key not in generated][:overflow]
+                                ops.append({"op": "evict", "keys": stale})
+                        CACHE_ENTRIES.set(len(self.partials), cache="summary_partials")
+            results.update(generated)
+        return [results[key] for key, _ in keyed_prompts]
+
+    def _map(self, text: str, priority: Priority) -> List[str]:
+        chunks = self.chunker.chunk(text)
+        keyed = []
+        for chunk in chunks:
+            key = _digest("map", str(MAP_PROMPT_VERSION), self.model, chunk["text"])
+            keyed.append((key, MAP_TEMPLATE.replace(CONTEXT_SLOT, chunk["text"])))
+        with STAGE_SECONDS.time(stage="summarize_map"):
+            return self._cached_parallel(keyed, MAP_TOKENS, priority, "summarizer_map")
+
+    def _group(self, summaries: List[str], budget: int) -> List[List[str]]:
+        groups, current, used = [], [], 0
+        for summary in summaries:
+            cost = estimate_tokens(summary) + 2
+            if current and used + cost > budget:
+                groups.append(current)
+                current, used = [], 0
+            current.append(summary)
+            used += cost
+        if current:
+            groups.append(current)
+        return groups
+
+    def summarize(self, text: str, instruction: str = "Write a concise summary of the paper.",
+                  priority: Priority = Priority.SUMMARY, max_tokens: int = 800) -> str:
+        text = clean_context(text)
+        final_template = FINAL_TEMPLATE.replace("{instruction}", instruction)
+        final_budget = self.packer.budget(final_template.replace(CONTEXT_SLOT, ""), max_tokens)
+
+        if estimate_tokens(text) <= final_budget:
+            prompt = DIRECT_TEMPLATE.replace("{instruction}", instruction).replace(CONTEXT_SLOT, text)
+            return self._generate(prompt, max_tokens, priority, "summarizer_final")
+
+        summaries = self._map(text, priority)
+        chunk_count = len(summaries)
+        reduce_budget = self.packer.budget(REDUCE_TEMPLATE.replace(CONTEXT_SLOT, ""), REDUCE_TOKENS)
+        level = 0
+        with STAGE_SECONDS.time(stage="summarize_reduce"):
+            while len(summaries) > 1 and sum(estimate_tokens(s) + 2 for s in summaries) > final_budget:
+                groups = self._group(summaries, reduce_budget)
+                if len(groups) == len(summaries):
+                    # Every summary alone fills the budget; merging pairs is the only way to shrink
+                    groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+                keyed = []
+                for group in groups:
+                    joined = "\n\n".join(group)
+                    key = _digest("reduce", str(MAP_PROMPT_VERSION), self.model, joined)
+                    keyed.append((key, REDUCE_TEMPLATE.replace(CONTEXT_SLOT, self.packer.pack(joined, None, reduce_budget))))
+                summaries = self._cached_parallel(keyed, REDUCE_TOKENS, priority, "summarizer_reduce")
+                level += 1
+
+        log_event("summarize", chunks=chunk_count, reduce_levels=level)
+        joined = "\n\n".join(summaries)
+        return self._generate(final_template.replace(CONTEXT_SLOT, joined), max_tokens, priority, "summarizer_final")
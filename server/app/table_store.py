@@ -0,0 +1,254 @@
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.shared_store import SharedStore
+
+TABLE_EXTRACTION_ENABLED = os.getenv("TABLE_EXTRACTION", "true").lower() == "true"
+
+_NUMBER = re.compile(r"([-+−]?\d*\.?\d+)\s*(?:(?:±|\+/-|\+-)\s*\d*\.?\d+)?\s*%?")
+_MARKS = str.maketrans("", "", "*†‡§,")
+
+
+def parse_number(cell: str) -> float:
+    """Numeric value of a table cell ("76.1", "76.1 ± 0.3", "**80.2%**", "1,024"); NaN otherwise"""
+    match = _NUMBER.fullmatch(cell.translate(_MARKS).strip())
+    return float(match.group(1).replace("−", "-")) if match else float("nan")
+
+
+def clean_table(rows: List[List[Optional[str]]], page: int, index: int) -> Optional[Dict]:
+    """A pdfplumber table as {page, index, header, rows}; None if too small to be a table"""
+    rows = [[" ".join((cell or "").split()) for cell in row] for row in rows]
+    rows = [row for row in rows if any(row)]
+    if len(rows) < 2 or max(len(row) for row in rows) < 2:
+        return None
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    header = [name or f"col{i}" for i, name in enumerate(rows[0])]
+    return {"page": page, "index": index, "header": header, "rows": rows[1:]}
+
+
+def summarize(values: np.ndarray) -> Dict:
+    """count/mean/median/min/max/std/sum of the finite values"""
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return {"count": 0}
+    return {
+        "count": int(len(values)),
+        "mean": float(values.mean()),
+        "median": float(np.median(values)),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "std": float(values.std()),
+        "sum": float(values.sum()),
+    }
+
+
+class TableStore:
+    """Tables extracted from papers, held as flat columnar arrays for vectorized queries.
+
+    Every cell of every table is one entry in a set of parallel NumPy
+    arrays: document, table, page, row, column, header id, row id and the
+    parsed numeric value. Filters over headers and row text are resolved
+    against the (small) header and row vocabularies first, then applied to
+    the cell arrays with ``np.isin`` masks, so a query across thousands of
+    tables is a handful of array operations rather than a Python loop over
+    cells. The arrays are rebuilt lazily after writes.
+
+    Tables persist per document in a shared ``tables`` store.
+    """
+
+    def __init__(self, storage_path: str = "data/vector_store"):
+        self.tables: Dict[str, List[Dict]] = {}
+        self._columns: Optional[Dict[str, np.ndarray]] = None
+        self._build_lock = threading.Lock()
+        self.store = SharedStore(
+            storage_path, "tables",
+            load_state=self._load_state,
+            apply_op=self._apply_op,
+            dump_state=self._dump_state,
+        )
+
+    def _load_state(self, data: Dict):
+        self.tables = data.get("tables", {})
+        self._columns = None
+
+    def _dump_state(self) -> Dict:
+        return {"tables": self.tables}
+
+    def _apply_op(self, op: Dict):
+        kind = op.get("op")
+        if kind == "put":
+            if op["tables"]:
+                self.tables[op["doc_id"]] = op["tables"]
+            else:
+                self.tables.pop(op["doc_id"], None)
+        elif kind == "delete":
+            self.tables.pop(op["doc_id"], None)
+        elif kind == "clear":
+            self.tables = {}
+        self._columns = None
+
+    def add_many(self, documents: Iterable[Tuple[str, List[Dict]]]):
+        """Store each document's tables (replacing earlier ones) in one transaction"""
+        with self.store.transaction() as ops:
+            for doc_id, tables in documents:
+                if tables or doc_id in self.tables:
+                    ops.append({"op": "put", "doc_id": doc_id, "tables": tables})
+
+    def add(self, doc_id: str, tables: List[Dict]):
+        self.add_many([(doc_id, tables)])
+
+    def remove(self, doc_id: str):
+        with self.store.transaction() as ops:
+            if doc_id in self.tables:
+                ops.append({"op": "delete", "doc_id": doc_id})
+
+    def clear(self):
+        with self.store.transaction() as ops:
+            ops.append({"op": "clear"})
+
+    def get(self, doc_id: str) -> List[Dict]:
+        self.store.refresh()
+        return self.tables.get(doc_id, [])
+
+    def stats(self) -> Dict:
+        columns = self._arrays()
+        return {"documents": len(self.tables), "tables": len(columns["table_ref"]), "cells": len(columns["value"]),
+                "numeric_cells": int(np.isfinite(columns["value"]).sum())}
+
+    def _arrays(self) -> Dict[str, np.ndarray]:
+        self.store.refresh()
+        columns = self._columns
+        if columns is not None:
+            return columns
+        with self._build_lock:
+            if self._columns is None:
+                self._columns = self._build()
+            return self._columns
+
+    def _build(self) -> Dict[str, np.ndarray]:
+        """Flatten every table into parallel per-cell arrays"""
+        headers: Dict[str, int] = {}  # lowercased name -> id; the first spelling seen is displayed
+        header_display = []
+        table_ref, row_text, row_label, row_table = [], [], [], []
+        cell_table, cell_row, cell_col, cell_header, cell_text, cell_value = [], [], [], [], [], []
+        for doc_id, tables in self.tables.items():
+            for table in tables:
+                t = len(table_ref)
+                table_ref.append((doc_id, table["page"], table["index"]))
+                header_ids = []
+                for name in table["header"]:
+                    if name.lower() not in headers:
+                        headers[name.lower()] = len(headers)
+                        header_display.append(name)
+                    header_ids.append(headers[name.lower()])
+                for row in table["rows"]:
+                    row_id = len(row_text)
+                    row_text.append(" ".join(row).lower())
+                    row_label.append(row[0])
+                    row_table.append(t)
+                    for c, cell in enumerate(row):
+                        cell_table.append(t)
+                        cell_row.append(row_id)
+                        cell_col.append(c)
+                        cell_header.append(header_ids[c])
+                        cell_text.append(cell)
+                        cell_value.append(parse_number(cell))
+        return {
+            "table_ref": np.array(table_ref, dtype=object).reshape(-1, 3),
+            "header_names": np.array(list(headers), dtype=object),
+            "header_display": np.array(header_display, dtype=object),
+            "row_text": np.array(row_text, dtype=object),
+            "row_label": np.array(row_label, dtype=object),
+            "row_table": np.array(row_table, dtype=np.int32),
+            "table": np.array(cell_table, dtype=np.int32),
+            "row": np.array(cell_row, dtype=np.int32),
+            "col": np.array(cell_col, dtype=np.int32),
+            "header": np.array(cell_header, dtype=np.int32),
+            "text": np.array(cell_text, dtype=object),
+            "value": np.array(cell_value, dtype=np.float64),
+        }
+
+    @staticmethod
+    def _contains(vocabulary: np.ndarray, needle: str) -> np.ndarray:
+        """Indices of vocabulary entries containing needle (case-insensitive)"""
+        needle = needle.lower()
+        return np.flatnonzero([needle in entry for entry in vocabulary])
+
+    def _mask(self, columns: Dict[str, np.ndarray], column: str = None, mention: str = None,
+              doc_ids: List[str] = None, min_value: float = None, max_value: float = None,
+              numeric: bool = True) -> np.ndarray:
+        mask = np.ones(len(columns["value"]), dtype=bool)
+        if numeric:
+            mask &= np.isfinite(columns["value"])
+        if column:
+            mask &= np.isin(columns["header"], self._contains(columns["header_names"], column))
+        if mention:
+            # Mentioned in the cell's row, or in its own column header; a match elsewhere
+            # in the header row ("ImageNet") must not pull in the neighbouring columns ("CIFAR")
+            rows = self._contains(columns["row_text"], mention)
+            headers = self._contains(columns["header_names"], mention)
+            mask &= np.isin(columns["row"], rows) | np.isin(columns["header"], headers)
+        if doc_ids:
+            wanted = np.flatnonzero(np.isin(columns["table_ref"][:, 0], list(doc_ids)))
+            mask &= np.isin(columns["table"], wanted)
+        if min_value is not None:
+            mask &= columns["value"] >= min_value
+        if max_value is not None:
+            mask &= columns["value"] <= max_value
+        return mask
+
+    def query(self, column: str = None, mention: str = None, doc_ids: List[str] = None,
+              min_value: float = None, max_value: float = None, numeric: bool = True,
+              group_by: str = None, limit: int = 100) -> Dict:
+        """Cells matching the filters, with page provenance and vectorized aggregates.
+
+        ``column`` matches header names (e.g. "acc" for "Top-1 Acc."),
+        ``mention`` matches the row text or the cell's own column header
+        ("imagenet"). ``group_by`` is
+        "doc", "column" or "row" for per-group aggregates.
+        """
+        columns = self._arrays()
+        idx = np.flatnonzero(self._mask(columns, column, mention, doc_ids, min_value, max_value, numeric))
+        values = columns["value"][idx]
+
+        result = {"summary": summarize(values), "total": int(len(idx))}
+        if group_by:
+            if group_by == "doc":
+                keys = columns["table_ref"][columns["table"][idx], 0]
+            elif group_by == "column":
+                keys = columns["header_display"][columns["header"][idx]]
+            elif group_by == "row":
+                keys = columns["row_label"][columns["row"][idx]]
+            else:
+                raise ValueError(f"group_by must be one of doc, column, row (got {group_by!r})")
+            labels, inverse = np.unique(keys.astype(str), return_inverse=True)
+            order = np.argsort(inverse, kind="stable")
+            bounds = np.flatnonzero(np.diff(inverse[order])) + 1
+            result["groups"] = [
+                {"key": str(labels[inverse[group[0]]]), **summarize(values[group])}
+                for group in np.split(order, bounds) if len(group)
+            ]
+
+        # Highest values first for numeric queries, table order otherwise
+        if numeric:
+            idx = idx[np.argsort(-values, kind="stable")]
+        idx = idx[:limit]
+        refs = columns["table_ref"][columns["table"][idx]]
+        result["cells"] = [
+            {
+                "doc_id": ref[0],
+                "page": ref[1],
+                "table": ref[2],
+                "row": str(columns["row_label"][columns["row"][i]]),
+                "column": str(columns["header_display"][columns["header"][i]]),
+                "text": str(columns["text"][i]),
+                "value": None if np.isnan(columns["value"][i]) else float(columns["value"][i]),
+            }
+            for ref, i in zip(refs, idx)
+        ]
+        return result
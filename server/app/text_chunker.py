@@ -0,0 +1,98 @@
+import re
+import zlib
+import hashlib
+from typing import List, Dict
+
+_WORD_RE = re.compile(r"\S+")
+# How far before the minimum size to start reading words, so the first candidate has a predecessor
+_LOOKBEHIND = 64
+
+
+def count_words(text: str) -> int:
+    """Whitespace word count without materialising a list of words"""
+    return sum(1 for _ in _WORD_RE.finditer(text))
+
+
+def chunk_hash(text: str) -> str:
+    """Content hash identifying a chunk across re-uploads and revisions"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class TextChunker:
+    """Split extracted paper text into retrieval-sized, content-defined chunks.
+
+    Boundaries come from the text itself, not from fixed offsets. A chunk
+    ends between ``chunk_size // 2`` and ``chunk_size`` characters, after
+    the word pair in that window with the highest hash, and paragraph breaks
+    win over plain word pairs. The winner is a local maximum. When an edit
+    shifts the window a little it usually stays the winner, so boundaries
+    fall back into step right after the edit. (Cutting at the first pair
+    hitting a hash mask does not: which pair comes first depends on exactly
+    where the window starts.) Only text without whitespace is cut at
+    ``chunk_size``. Chunks before and after keep their exact text and
+    :func:`chunk_hash`, so indexes can diff a revised paper chunk by chunk.
+    """
+
+    def __init__(self, chunk_size: int = 1200):
+        self.chunk_size = chunk_size
+        self.min_size = chunk_size // 2
+
+    def _boundary(self, text: str, start: int) -> int:
+        """End of the chunk starting at start"""
+        length = len(text)
+        limit = start + self.chunk_size
+        if limit >= length:
+            return length
+        floor = start + self.min_size
+
+        best, best_key = -1, None
+        previous = None
+        scan_from = max(start, floor - _LOOKBEHIND)
+        for match in _WORD_RE.finditer(text, scan_from, limit):
+            if previous is None and match.start() > start and not text[match.start() - 1].isspace():
+                # Started mid-word; that fragment depends on where scanning began
+                previous = ""
+                continue
+            if match.end() > floor and previous and match.end() < limit:
+                key = (text.startswith("\n\n", match.end()),
+                       zlib.crc32(f"{previous} {match.group()}".encode("utf-8")))
+                if best_key is None or key > best_key:
+                    best, best_key = match.end(), key
+            previous = match.group()
+
+        if best != -1:
+            return best
+        cut = max(text.rfind(" ", floor, limit), text.rfind("\n", floor, limit))
+        return cut if cut != -1 else limit
+
+    def chunk(self, text: str) -> List[Dict]:
+        """Split text into chunks that end on whitespace.
+
+        Each chunk records its character span in the original text so callers
+        can slice it back out instead of storing the text twice, and the
+        :func:`chunk_hash` of its text.
+        """
+        chunks = []
+        start = 0
+        length = len(text)
+
+        while start < length:
+            # Skip leading whitespace so chunks start on a word
+            while start < length and text[start].isspace():
+                start += 1
+            if start >= length:
+                break
+
+            end = self._boundary(text, start)
+            chunk_text = text[start:end].rstrip()
+            if chunk_text:
+                chunks.append({
+                    "index": len(chunks),
+                    "start": start,
+                    "end": start + len(chunk_text),
+                    "text": chunk_text,
+                    "hash": chunk_hash(chunk_text)
+                })
+            start = end
+
+        return chunks
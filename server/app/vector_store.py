@@ -1,107 +1,182 @@
 ﻿import numpy as np
-import json
 import os
+import zlib
+import base64
+from collections import Counter
+from datetime import datetime
 from typing import List, Dict, Any
-import hashlib
+
+from app.metrics import STAGE_SECONDS
+from app.shared_store import SharedStore
+from app.text_chunker import TextChunker, count_words
+from app.search_filter import AttributeIndex, SearchFilter
+
+EMBEDDING_DIM = 256
+
+
+def _encode_vector(vector: np.ndarray) -> str:
+    return base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii")
+
+
+def _decode_vector(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
 
 class VectorStore:
+    """Chunk embeddings per document, stored once per distinct chunk.
+
+    Documents are chunked like the lexical index, and each chunk's embedding
+    is keyed by its content hash. Re-adding a revised document only embeds,
+    and only journals, the chunks whose hash is new. Embeddings no longer
+    referenced by any document are dropped. A document's similarity to a
+    query is that of its best chunk.
+    """
+
     def __init__(self, storage_path: str = "data/vector_store"):
         self.storage_path = storage_path
-        self.vectors = {}
+        self.chunker = TextChunker()
+        self.embeddings: Dict[str, np.ndarray] = {}  # chunk hash -> unit vector
+        self.chunks: Dict[str, List[str]] = {}  # doc_id -> chunk hashes
         self.metadata = {}
+        self._refs = Counter()  # documents referencing each chunk hash
+        self._matrix = None  # (hashes, stacked embeddings), rebuilt lazily after writes
+        # Id sets per metadata attribute, so filtered searches only compare the matching vectors
+        self.attributes = AttributeIndex()
         os.makedirs(storage_path, exist_ok=True)
-        self._load_vectors()
+        self.store = SharedStore(
+            storage_path, "vectors",
+            load_state=self._load_state,
+            apply_op=self._apply_op,
+            dump_state=self._dump_state,
+        )
+    
+    def _load_state(self, data: Dict):
+        """Reset in-memory state from a storage snapshot"""
+        # Whole-document vectors from before chunk embeddings are ignored; those documents are re-embedded on re-upload
+        self.embeddings = {digest: _decode_vector(vector) for digest, vector in data.get("embeddings", {}).items()}
+        self.chunks = data.get("chunks", {})
+        self.metadata = {doc_id: meta for doc_id, meta in data.get("metadata", {}).items() if doc_id in self.chunks}
+        self._refs = Counter(digest for hashes in self.chunks.values() for digest in set(hashes))
+        self._matrix = None
+        self.attributes.rebuild(self.metadata)
+    
+    def _dump_state(self) -> Dict:
+        """Snapshot of in-memory state for compaction"""
+        return {
+            "embeddings": {digest: _encode_vector(vector) for digest, vector in self.embeddings.items()},
+            "chunks": self.chunks,
+            "metadata": self.metadata
+        }
+    
+    def _release(self, doc_id: str):
+        """Drop a document's references, and the embeddings nothing else uses"""
+        self.attributes.remove(doc_id, self.metadata.pop(doc_id, {}))
+        for digest in set(self.chunks.pop(doc_id, ())):
+            self._refs[digest] -= 1
+            if self._refs[digest] <= 0:
+                del self._refs[digest]
+                self.embeddings.pop(digest, None)
     
-    def _load_vectors(self):
-        """Load vectors from storage"""
-        vectors_file = os.path.join(self.storage_path, "vectors.json")
-        if os.path.exists(vectors_file):
-            try:
-                with open(vectors_file, 'r') as f:
-                    data = json.load(f)
-                    self.vectors = data.get("vectors", {})
-                    self.metadata = data.get("metadata", {})
-            except Exception as e:
-                print(f"Error loading vectors: {e}")
-                self.vectors = {}
-                self.metadata = {}
+    def _apply_op(self, op: Dict):
+        """Apply a single journal operation to in-memory state"""
+        kind = op.get("op")
+        if kind == "put":
+            for digest, vector in op["embeddings"].items():
+                self.embeddings[digest] = _decode_vector(vector)
+            # Count the new version's references first, so chunks it shares with the old one survive the release
+            self._refs.update(set(op["chunks"]))
+            self._release(op["doc_id"])
+            self.chunks[op["doc_id"]] = op["chunks"]
+            self.metadata[op["doc_id"]] = op["metadata"]
+            self.attributes.add(op["doc_id"], op["metadata"])
+            self._matrix = None
+        elif kind == "delete":
+            self._release(op["doc_id"])
+            self._matrix = None
     
-    def _save_vectors(self):
-        """Save vectors to storage"""
-        vectors_file = os.path.join(self.storage_path, "vectors.json")
-        try:
-            data = {
-                "vectors": self.vectors,
-                "metadata": self.metadata
-            }
-            with open(vectors_file, 'w') as f:
-                json.dump(data, f, indent=2)
-        except Exception as e:
-            print(f"Error saving vectors: {e}")
+    @property
+    def generation(self) -> int:
+        """Monotonic counter bumped by every committed write"""
+        return self.store.generation
     
-    def _text_to_vector(self, text: str) -> List[float]:
-        """Convert text to a simple vector representation"""
-        # Simple bag-of-words like representation
+    def _text_to_vector(self, text: str) -> np.ndarray:
+        """Unit-length hashed bag-of-words vector of a text"""
+        # Feature hashing keeps every vector in one fixed space, so any two compare directly.
         # In a real system, you'd use sentence transformers or similar
-        words = text.lower().split()
-        word_counts = {}
-        for word in words:
+        vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+        for word in text.lower().split():
             if len(word) > 2:  # Ignore very short words
-                word_counts[word] = word_counts.get(word, 0) + 1
-        
-        # Create a simple vector (this is very basic)
-        # A real implementation would use proper embeddings
-        vector = [word_counts.get(word, 0) for word in sorted(word_counts.keys())]
-        
-        # Normalize
+                vector[zlib.crc32(word.encode("utf-8")) % EMBEDDING_DIM] += 1
         magnitude = np.linalg.norm(vector)
-        if magnitude > 0:
-            vector = [v / magnitude for v in vector]
-        
-        return vector
-    
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
-        if not vec1 or not vec2:
-            return 0.0
-        
-        # Pad vectors to same length
-        max_len = max(len(vec1), len(vec2))
-        vec1_padded = vec1 + [0] * (max_len - len(vec1))
-        vec2_padded = vec2 + [0] * (max_len - len(vec2))
-        
-        dot_product = np.dot(vec1_padded, vec2_padded)
-        norm1 = np.linalg.norm(vec1_padded)
-        norm2 = np.linalg.norm(vec2_padded)
-        
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
-        
-        return dot_product / (norm1 * norm2)
+        return vector / magnitude if magnitude > 0 else vector
     
     def add_document(self, doc_id: str, content: str, metadata: Dict = None):
-        """Add a document to the vector store"""
-        vector = self._text_to_vector(content)
-        self.vectors[doc_id] = vector
-        
+        """Add a document to the vector store. Returns how many chunks had to be embedded."""
         if metadata is None:
             metadata = {}
         
-        self.metadata[doc_id] = {
+        doc_metadata = {
+            "added_date": datetime.now().isoformat(),
             "content_length": len(content),
-            "word_count": len(content.split()),
+            "word_count": count_words(content),
             **metadata
         }
         
-        self._save_vectors()
+        chunks = self.chunker.chunk(content)
+        with self.store.transaction() as ops:
+            new = {}
+            for chunk in chunks:
+                if chunk["hash"] not in self.embeddings and chunk["hash"] not in new:
+                    new[chunk["hash"]] = _encode_vector(self._text_to_vector(chunk["text"]))
+            ops.append({"op": "put", "doc_id": doc_id, "chunks": [chunk["hash"] for chunk in chunks],
+                        "embeddings": new, "metadata": doc_metadata})
+        return len(new)
+    
+    def remove_document(self, doc_id: str):
+        """Remove a document from the vector store"""
+        with self.store.transaction() as ops:
+            if doc_id in self.chunks:
+                ops.append({"op": "delete", "doc_id": doc_id})
+    
+    def search_similar(self, query: str, top_k: int = 5, filters: SearchFilter = None) -> List[Dict]:
+        """Search for similar documents, optionally within a filtered subset"""
+        with STAGE_SECONDS.time(stage="vector_search"):
+            return self._search_similar(query, top_k, filters)
+    
+    def _embedding_matrix(self):
+        if self._matrix is None:
+            hashes = list(self.embeddings)
+            matrix = np.stack([self.embeddings[digest] for digest in hashes]) if hashes \
+                else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+            self._matrix = ({digest: row for row, digest in enumerate(hashes)}, matrix)
+        return self._matrix
     
-    def search_similar(self, query: str, top_k: int = 5) -> List[Dict]:
-        """Search for similar documents"""
+    def _search_similar(self, query: str, top_k: int, filters: SearchFilter = None) -> List[Dict]:
+        self.store.refresh()
         query_vector = self._text_to_vector(query)
+        if not query_vector.any():
+            return []
+        rows, matrix = self._embedding_matrix()
+        candidates = self.attributes.candidates(filters)
+        if candidates is None:
+            # Every stored chunk is scored once, however many documents share it
+            candidates = self.chunks.keys()
+            chunk_scores = matrix @ query_vector
+        else:
+            # The filter picks the candidates up front; only their chunks are scored
+            candidates = [doc_id for doc_id in candidates if self.chunks.get(doc_id)]
+            digests = list({digest for doc_id in candidates for digest in self.chunks[doc_id]})
+            if not digests:
+                return []
+            chunk_scores = matrix[[rows[digest] for digest in digests]] @ query_vector
+            rows = {digest: i for i, digest in enumerate(digests)}
         results = []
         
-        for doc_id, doc_vector in self.vectors.items():
-            similarity = self._cosine_similarity(query_vector, doc_vector)
+        for doc_id in candidates:
+            hashes = self.chunks.get(doc_id)
+            if not hashes:
+                continue
+            similarity = float(chunk_scores[[rows[digest] for digest in hashes]].max())
             if similarity > 0.1:  # Minimum similarity threshold
                 results.append({
                     "doc_id": doc_id,
@@ -115,4 +190,5 @@ class VectorStore:
     
     def get_document_count(self) -> int:
         """Get the number of documents in the vector store"""
-        return len(self.vectors)
\ No newline at end of file
+        self.store.refresh()
+        return len(self.chunks)
\ No newline at end of file
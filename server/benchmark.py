@@ -0,0 +1,367 @@
+"""Reproducible performance benchmarks for the analyzer pipeline.
+
+    python benchmark.py                         # default small corpus
+    python benchmark.py --papers 2000 --pages 12 --queries 500 --output bench.json
+    python benchmark.py --e2e                   # also drive the HTTP API against a mock Ollama
+
+Everything is generated from --seed, so two runs with the same arguments on
+two versions of the code are directly comparable. Results are emitted as JSON.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import socket
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import requests
+
+# Keep per-stage JSON log lines out of the benchmark's own output
+os.environ.setdefault("STRUCTURED_LOGS", "false")
+
+from app.pdf_processor import PDFProcessor
+from app.vector_store import VectorStore
+from ingest import open_rag_system
+from mock_ollama import MockOllamaServer
+
+# --- Synthetic corpus -------------------------------------------------------
+
+SYLLABLES = ["ra", "to", "mi", "ne", "ka", "lo", "su", "vi", "de", "po", "an", "el", "or", "is", "tu", "gen"]
+
+
+class SyntheticCorpus:
+    """Deterministic fake papers with a Zipf-like vocabulary"""
+
+    def __init__(self, seed: int, vocabulary_size: int = 5000):
+        self.rng = random.Random(seed)
+        vocab = set()
+        while len(vocab) < vocabulary_size:
+            vocab.add("".join(self.rng.choice(SYLLABLES) for _ in range(self.rng.randint(2, 4))))
+        self.vocabulary = sorted(vocab)
+        self.rng.shuffle(self.vocabulary)
+        # Zipf weights: a handful of very common words and a long tail
+        self.weights = [1.0 / (rank + 1) for rank in range(len(self.vocabulary))]
+
+    def page(self, words: int) -> str:
+        tokens = self.rng.choices(self.vocabulary, weights=self.weights, k=words)
+        lines, line = [], []
+        for token in tokens:
+            line.append(token)
+            if len(line) >= 12:
+                lines.append(" ".join(line))
+                line = []
+        if line:
+            lines.append(" ".join(line))
+        return "\n".join(lines)
+
+    def paper(self, pages: int, words_per_page: int):
+        return [self.page(words_per_page) for _ in range(pages)]
+
+    def query(self, terms: int = 3) -> str:
+        # Bias toward mid-frequency words, like real search terms
+        return " ".join(self.rng.choice(self.vocabulary[20:2000]) for _ in range(terms))
+
+
+def write_pdf(path: str, pages):
+    """Write a minimal text-only PDF (Helvetica, one text object per page)"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for page_text in pages:
+        escaped = [line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+                   for line in page_text.split("\n")]
+        stream = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(f"({line}) Tj T*" for line in escaped) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_ref = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_ref} 0 R >>")
+        page_refs.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{r} 0 R' for r in page_refs)}] /Count {len(page_refs)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref_at = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+# --- Measurement helpers ----------------------------------------------------
+
+def percentile(samples, pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def latency_summary(samples) -> dict:
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+        "max_ms": round(max(samples) * 1000, 3) if samples else 0.0,
+    }
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+class _Quiet:
+    """Silence the pipeline's progress prints while timing"""
+
+    def __enter__(self):
+        self._devnull = open(os.devnull, "w")
+        self._redirect = redirect_stdout(self._devnull)
+        self._redirect.__enter__()
+
+    def __exit__(self, *exc):
+        self._redirect.__exit__(*exc)
+        self._devnull.close()
+
+
+# --- Benchmarks ---------------------------------------------------------------
+
+def bench_extraction(corpus_dir: str, papers, pages_per_paper: int) -> dict:
+    processor = PDFProcessor()
+    paths = []
+    for i, pages in enumerate(papers):
+        path = os.path.join(corpus_dir, f"paper_{i:05d}.pdf")
+        write_pdf(path, pages)
+        paths.append(path)
+
+    total_bytes = sum(os.path.getsize(p) for p in paths)
+    samples = []
+    with _Quiet():
+        for path in paths:
+            elapsed, _ = timed(processor.extract_text, path)
+            samples.append(elapsed)
+    total = sum(samples)
+    return {
+        "papers": len(paths),
+        "pages": len(paths) * pages_per_paper,
+        "megabytes": round(total_bytes / 1e6, 3),
+        "pages_per_sec": round(len(paths) * pages_per_paper / total, 2) if total else None,
+        "mb_per_sec": round(total_bytes / 1e6 / total, 3) if total else None,
+        "per_paper": latency_summary(samples),
+    }
+
+
+def bench_store(store_dir: str, backend: str, documents, queries, top_k: int) -> dict:
+    with _Quiet():
+        rag = open_rag_system(backend, store_dir)
+        index_time, _ = timed(rag.add_documents, documents)
+        if hasattr(rag, "store"):
+            save_time, _ = timed(rag.store.compact)
+        else:
+            save_time = 0.0
+        load_time, rag = timed(open_rag_system, backend, store_dir)
+
+        search_samples = []
+        for query in queries:
+            elapsed, _ = timed(rag.search_documents, query, top_k)
+            search_samples.append(elapsed)
+
+        overview_time, _ = timed(rag.get_paper_overview, 50)
+
+    return {
+        "backend": backend,
+        "documents": len(documents),
+        "index_seconds": round(index_time, 4),
+        "save_seconds": round(save_time, 4),
+        "load_seconds": round(load_time, 4),
+        "overview_page_ms": round(overview_time * 1000, 3),
+        "search_documents": latency_summary(search_samples),
+    }
+
+
+def bench_vector_store(store_dir: str, documents, queries, top_k: int) -> dict:
+    with _Quiet():
+        store = VectorStore(store_dir)
+        start = time.perf_counter()
+        for doc_id, content, metadata in documents:
+            store.add_document(doc_id, content, metadata)
+        index_time = time.perf_counter() - start
+        save_time, _ = timed(store.store.compact)
+        load_time, store = timed(VectorStore, store_dir)
+
+        samples = []
+        for query in queries:
+            elapsed, _ = timed(store.search_similar, query, top_k)
+            samples.append(elapsed)
+
+    return {
+        "documents": len(documents),
+        "index_seconds": round(index_time, 4),
+        "save_seconds": round(save_time, 4),
+        "load_seconds": round(load_time, 4),
+        "search_similar": latency_summary(samples),
+    }
+
+
+def start_api(work_dir: str, ollama_url: str, backend: str = "json", extra_env: dict = None):
+    """Run the real API (uvicorn subprocess) with its data directory under work_dir.
+
+    Returns (process, base_url) once /health answers.
+    """
+    server_dir = os.path.dirname(os.path.abspath(__file__))
+    api_dir = os.path.join(work_dir, "api")
+    os.makedirs(api_dir, exist_ok=True)
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    env = {**os.environ, "OLLAMA_BASE_URL": ollama_url, "OLLAMA_ENABLED": "true",
+           "RAG_BACKEND": backend, "STRUCTURED_LOGS": "false",
+           "PYTHONPATH": server_dir + os.pathsep + os.environ.get("PYTHONPATH", ""),
+           **(extra_env or {})}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=api_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return proc, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("API did not start within 60s")
+
+
+def bench_end_to_end(work_dir: str, pdf_paths, queries, ollama_url: str, backend: str) -> dict:
+    """Start the real API against the mock Ollama and time full requests"""
+    proc, base_url = start_api(work_dir, ollama_url, backend)
+    try:
+        upload_samples = []
+        for path in pdf_paths:
+            with open(path, "rb") as f:
+                files = {"file": (os.path.basename(path), f, "application/pdf")}
+                elapsed, response = timed(requests.post, f"{base_url}/analyze-pdf", files=files,
+                                          data={"question": "What is the main contribution?"}, timeout=300)
+            response.raise_for_status()
+            upload_samples.append(elapsed)
+
+        question_samples = []
+        for query in queries:
+            elapsed, response = timed(requests.post, f"{base_url}/ask-question",
+                                      data={"question": query}, timeout=300)
+            response.raise_for_status()
+            question_samples.append(elapsed)
+
+        return {
+            "analyze_pdf_with_question": latency_summary(upload_samples),
+            "ask_question": latency_summary(question_samples),
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, retrieval and answer latency")
+    parser.add_argument("--papers", type=int, default=200, help="Documents in the synthetic corpus")
+    parser.add_argument("--pages", type=int, default=8, help="Pages per paper")
+    parser.add_argument("--words-per-page", type=int, default=450)
+    parser.add_argument("--pdf-papers", type=int, default=20, help="Papers rendered to PDF for extraction timing")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--backend", default="json", choices=["json", "sqlite"])
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--e2e", action="store_true", help="Also benchmark the HTTP API against a mock Ollama")
+    parser.add_argument("--e2e-requests", type=int, default=20)
+    parser.add_argument("--ollama-latency", default="fixed:0", help="Mock Ollama time-to-first-token distribution")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="Mock Ollama token rate (0 = unpaced)")
+    parser.add_argument("--output", default=None, help="Write JSON results here instead of stdout")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary corpus directory")
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(args.seed)
+    work_dir = tempfile.mkdtemp(prefix="paper-bench-")
+    try:
+        papers = [corpus.paper(args.pages, args.words_per_page) for _ in range(args.papers)]
+        documents = [(f"paper_{i:05d}.pdf", "\n".join(pages), {"source": "benchmark"})
+                     for i, pages in enumerate(papers)]
+        queries = [corpus.query() for _ in range(args.queries)]
+
+        pdf_dir = os.path.join(work_dir, "pdfs")
+        os.makedirs(pdf_dir)
+        results = {
+            "version": 1,
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "parameters": vars(args),
+            "extraction": bench_extraction(pdf_dir, papers[:args.pdf_papers], args.pages),
+            "rag_store": bench_store(os.path.join(work_dir, "rag"), args.backend, documents, queries, args.top_k),
+            "vector_store": bench_vector_store(os.path.join(work_dir, "vectors"), documents, queries, args.top_k),
+        }
+
+        if args.e2e:
+            mock = MockOllamaServer(latency=args.ollama_latency, tokens_per_sec=args.tokens_per_sec,
+                                    seed=args.seed).start()
+            try:
+                pdf_paths = sorted(os.path.join(pdf_dir, name) for name in os.listdir(pdf_dir))
+                results["end_to_end"] = bench_end_to_end(
+                    work_dir, pdf_paths[:args.e2e_requests], queries[:args.e2e_requests], mock.url, args.backend)
+            finally:
+                mock.stop()
+
+        results["peak_rss_mb"] = peak_rss_mb()
+    finally:
+        if args.keep:
+            print(f"Corpus kept at {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
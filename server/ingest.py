@@ -0,0 +1,314 @@
+"""Bulk-import a directory or archive of papers without going through the HTTP API.
+
+    python ingest.py path/to/papers/
+    python ingest.py papers.zip --workers 8 --batch-size 100
+    python ingest.py papers.tar.gz --backend sqlite
+
+Extraction runs in a process pool. Documents are written through the
+configured store in batches (one transaction and one fsync per batch), and a
+checkpoint file records finished files so an interrupted run can be resumed
+by re-running the same command.
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import tarfile
+import zipfile
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from dotenv import load_dotenv
+
+from app.pdf_processor import PDFProcessor
+from app.rag_system import RAGSystem
+from app.sqlite_store import SQLiteRAGSystem
+from app.table_store import TableStore, TABLE_EXTRACTION_ENABLED
+from app.citations import CitationIndex, CITATION_PREAMBLE, parse_citations
+
+load_dotenv()
+
+PAPER_EXTENSIONS = ('.pdf',)
+
+_pdf_processor = None
+
+
+def _init_worker():
+    global _pdf_processor
+    # Keep worker output quiet; the parent prints the progress report
+    sys.stdout = open(os.devnull, "w")
+    _pdf_processor = PDFProcessor()
+
+
+def _extract_job(job: dict) -> dict:
+    """Runs in a worker process: materialise the file, extract text and count pages"""
+    tmp_dir = None
+    try:
+        path = job["path"]
+        if job.get("member"):
+            tmp_dir = tempfile.mkdtemp(prefix="ingest-")
+            path = os.path.join(tmp_dir, os.path.basename(job["member"]))
+            with open(path, "wb") as out:
+                out.write(_read_zip_member(job["path"], job["member"]))
+
+        tables = [] if job.get("tables") else None
+        text = _pdf_processor.extract_text(path, tables)
+        pages = _pdf_processor.count_pages(path)
+        return {
+            "key": job["key"],
+            "signature": job["signature"],
+            "content": text,
+            "tables": tables,
+            "pages": pages,
+            "size": job["size"],
+        }
+    except Exception as e:
+        return {"key": job["key"], "signature": job["signature"], "error": str(e), "size": job["size"]}
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        if job.get("spooled"):
+            os.remove(job["path"])
+
+
+def _read_zip_member(archive_path: str, member: str) -> bytes:
+    # Zip members are addressed by offset, so each worker reading its own is a cheap seek
+    with zipfile.ZipFile(archive_path) as zf:
+        return zf.read(member)
+
+
+def _spooler(tf: tarfile.TarFile, info: tarfile.TarInfo, spool_dir: str):
+    """Copies a tar member out of the stream into spool_dir; call before the next member is read"""
+    def spool() -> str:
+        fd, path = tempfile.mkstemp(dir=spool_dir, suffix=os.path.splitext(info.name)[1])
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(tf.extractfile(info), out, 1 << 20)
+        return path
+    return spool
+
+
+def discover_jobs(source: str, spool_dir: str = None):
+    """Yield one job per paper found in a directory tree or a zip/tar archive.
+
+    A (possibly compressed) tar is read once, front to back. Its jobs carry a
+    ``spool`` callable that copies the member to a file in spool_dir. It
+    must be called before the generator moves on, while the stream is
+    positioned on that member; reopening the archive per member would
+    decompress it from the start every time.
+    """
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if not name.lower().endswith(PAPER_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                yield {
+                    "key": os.path.relpath(path, source).replace(os.sep, "/"),
+                    "path": path,
+                    "size": st.st_size,
+                    "signature": [st.st_size, int(st.st_mtime)],
+                }
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(PAPER_EXTENSIONS):
+                    continue
+                yield {
+                    "key": info.filename,
+                    "path": source,
+                    "member": info.filename,
+                    "size": info.file_size,
+                    "signature": [info.file_size, info.CRC],
+                }
+    elif tarfile.is_tarfile(source):
+        with tarfile.open(source) as tf:
+            for info in tf:
+                if not info.isfile() or not info.name.lower().endswith(PAPER_EXTENSIONS):
+                    continue
+                yield {
+                    "key": info.name,
+                    "path": source,
+                    "size": info.size,
+                    "signature": [info.size, int(info.mtime)],
+                    "spool": _spooler(tf, info, spool_dir or tempfile.gettempdir()),
+                }
+    else:
+        raise ValueError(f"{source} is not a directory, zip or tar archive")
+
+
+class Checkpoint:
+    """Tracks which files have been committed so a rerun can skip them"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done = {}
+        self.failed = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                data = json.load(f)
+            self.done = data.get("done", {})
+            self.failed = data.get("failed", {})
+
+    def should_skip(self, job: dict, retry_failed: bool) -> bool:
+        key = job["key"]
+        if self.done.get(key) == job["signature"]:
+            return True
+        return not retry_failed and self.failed.get(key, {}).get("signature") == job["signature"]
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"done": self.done, "failed": self.failed}, f)
+        os.replace(tmp_path, self.path)
+
+
+class IngestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.documents = 0
+        self.failed = 0
+        self.skipped = 0
+        self.near_duplicates = 0
+        self.tables = 0
+        self.citation_records = 0
+        self.pages = 0
+        self.bytes = 0
+
+    def report(self) -> dict:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            "documents": self.documents,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "near_duplicates": self.near_duplicates,
+            "tables": self.tables,
+            "citation_records": self.citation_records,
+            "pages": self.pages,
+            "megabytes": round(self.bytes / 1e6, 2),
+            "elapsed_seconds": round(elapsed, 2),
+            "docs_per_sec": round(self.documents / elapsed, 2),
+            "pages_per_sec": round(self.pages / elapsed, 2),
+            "mb_per_sec": round(self.bytes / 1e6 / elapsed, 2),
+        }
+
+
+def open_rag_system(backend: str, storage_path: str):
+    if backend == "sqlite":
+        return SQLiteRAGSystem(storage_path)
+    return RAGSystem(storage_path)
+
+
+def ingest(source: str, rag_system, checkpoint: Checkpoint, workers: int, batch_size: int,
+           retry_failed: bool = False, table_store: TableStore = None,
+           citation_index: CitationIndex = None) -> dict:
+    stats = IngestStats()
+    batch = []
+
+    def flush():
+        if not batch:
+            return
+        duplicates = rag_system.add_documents([
+            (r["key"], r["content"], {"source": "bulk_ingest", "pages": r["pages"], "file_size": r["size"],
+                                      "content_type": "citation" if r["content"].startswith(CITATION_PREAMBLE) else "paper"})
+            for r in batch
+        ])
+        stats.near_duplicates += sum(1 for matches in duplicates.values() if matches)
+        if table_store is not None:
+            table_store.add_many((r["key"], r["tables"] or []) for r in batch)
+            stats.tables += sum(len(r["tables"] or []) for r in batch)
+        if citation_index is not None:
+            # Same structured records as an uploaded citation export gets
+            for r in batch:
+                if r["content"].startswith(CITATION_PREAMBLE):
+                    stats.citation_records += citation_index.add_source(
+                        r["key"], parse_citations(io.StringIO(r["content"])))
+        for r in batch:
+            checkpoint.done[r["key"]] = r["signature"]
+            checkpoint.failed.pop(r["key"], None)
+        checkpoint.save()
+        batch.clear()
+        report = stats.report()
+        print(f"💾 {report['documents']} docs committed | "
+              f"{report['pages_per_sec']} pages/s | {report['mb_per_sec']} MB/s")
+
+    def collect(future):
+        result = future.result()
+        if "error" not in result and not (result["content"] or "").strip():
+            # Same rule as /analyze-pdf: nothing to index
+            result["error"] = "No text content found in PDF. This might be a scanned PDF or image-based PDF."
+        if "error" in result:
+            stats.failed += 1
+            checkpoint.failed[result["key"]] = {"signature": result["signature"], "error": result["error"]}
+            print(f"❌ {result['key']}: {result['error']}")
+            return
+        stats.documents += 1
+        stats.pages += result["pages"]
+        stats.bytes += result["size"]
+        batch.append(result)
+        if len(batch) >= batch_size:
+            flush()
+
+    # Bounded submission window so huge corpora don't queue every job up front
+    max_pending = workers * 4
+    pending = set()
+    spool_dir = tempfile.mkdtemp(prefix="ingest-spool-")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for job in discover_jobs(source, spool_dir):
+                spool = job.pop("spool", None)
+                if checkpoint.should_skip(job, retry_failed):
+                    stats.skipped += 1
+                    continue
+                if spool is not None:
+                    # Tar member: copied out now, at most max_pending of them on disk at once
+                    job["path"], job["spooled"] = spool(), True
+                job["tables"] = table_store is not None
+                pending.add(pool.submit(_extract_job, job))
+                if len(pending) >= max_pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        collect(future)
+            for future in pending:
+                collect(future)
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    flush()
+    checkpoint.save()
+    return stats.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import papers into the document store")
+    parser.add_argument("source", help="Directory, .zip or .tar(.gz) archive of PDFs")
+    parser.add_argument("--backend", default=os.getenv("RAG_BACKEND", "json").lower(),
+                        choices=["json", "sqlite"], help="Document store backend")
+    parser.add_argument("--storage-path", default="data/vector_store")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--batch-size", type=int, default=50, help="Documents per store commit")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Checkpoint file (default: <storage-path>/ingest_checkpoint.json)")
+    parser.add_argument("--retry-failed", action="store_true", help="Retry files that failed previously")
+    parser.add_argument("--no-tables", action="store_true", help="Skip table extraction")
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or os.path.join(args.storage_path, "ingest_checkpoint.json")
+    os.makedirs(args.storage_path, exist_ok=True)
+
+    print(f"📚 Ingesting {args.source} with {args.workers} workers ({args.backend} backend)")
+    rag_system = open_rag_system(args.backend, args.storage_path)
+    table_store = TableStore(args.storage_path) if TABLE_EXTRACTION_ENABLED and not args.no_tables else None
+    report = ingest(args.source, rag_system, Checkpoint(checkpoint_path),
+                    workers=args.workers, batch_size=args.batch_size, retry_failed=args.retry_failed,
+                    table_store=table_store, citation_index=CitationIndex(args.storage_path))
+
+    print("\n📊 Ingest complete")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Fixed-concurrency load generator for the analyzer API.
+
+    # against an already running server
+    python load_test.py --url http://localhost:8000 --scenario ask --concurrency 16 --duration 60
+
+    # self-contained: starts the mock Ollama and the API, then drives them
+    python load_test.py --spawn --scenario mixed --concurrency 8 --requests 400 --ollama-latency uniform:0.1,0.4
+
+Each worker thread issues requests back to back, so offered concurrency stays
+constant. Prints a JSON report with throughput, status counts and latency
+percentiles (overall and per endpoint).
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+
+import requests
+
+from benchmark import SyntheticCorpus, write_pdf, percentile, start_api
+from mock_ollama import MockOllamaServer
+
+
+class LoadGenerator:
+    def __init__(self, base_url: str, scenario: str, pdf_path: str, corpus: SyntheticCorpus, seed: int):
+        self.base_url = base_url
+        self.scenario = scenario
+        self.pdf_path = pdf_path
+        self.corpus = corpus
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(int)
+        self.issued = 0
+
+    def _next_request(self):
+        with self.lock:
+            choice = self.scenario
+            if choice == "mixed":
+                choice = self.rng.choices(["ask", "analyze", "documents", "overview"], weights=[6, 1, 2, 1])[0]
+            query = self.corpus.query()
+            self.issued += 1
+            return choice, query
+
+    def _send(self, session: requests.Session, kind: str, query: str):
+        if kind == "ask":
+            return session.post(f"{self.base_url}/ask-question", data={"question": query}, timeout=300)
+        if kind == "analyze":
+            with open(self.pdf_path, "rb") as f:
+                files = {"file": (f"load_{threading.get_ident()}.pdf", f, "application/pdf")}
+                return session.post(f"{self.base_url}/analyze-pdf", files=files,
+                                    data={"question": query}, timeout=300)
+        if kind == "documents":
+            return session.get(f"{self.base_url}/documents", params={"limit": 50}, timeout=60)
+        return session.get(f"{self.base_url}/paper-overview", params={"limit": 50}, timeout=60)
+
+    def _worker(self, stop_at: float, max_requests: int):
+        session = requests.Session()
+        while time.perf_counter() < stop_at:
+            with self.lock:
+                if max_requests and self.issued >= max_requests:
+                    return
+            kind, query = self._next_request()
+            start = time.perf_counter()
+            try:
+                status = str(self._send(session, kind, query).status_code)
+            except requests.RequestException as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.latencies[kind].append(elapsed)
+                self.statuses[status] += 1
+
+    def run(self, concurrency: int, duration: float, max_requests: int) -> dict:
+        started = time.perf_counter()
+        stop_at = started + duration if duration else float("inf")
+        threads = [threading.Thread(target=self._worker, args=(stop_at, max_requests), daemon=True)
+                   for _ in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        all_samples = [x for samples in self.latencies.values() for x in samples]
+        ok = sum(n for status, n in self.statuses.items() if status.startswith("2"))
+        return {
+            "scenario": self.scenario,
+            "concurrency": concurrency,
+            "elapsed_seconds": round(elapsed, 2),
+            "requests": len(all_samples),
+            "throughput_rps": round(len(all_samples) / elapsed, 2) if elapsed else None,
+            "success_rps": round(ok / elapsed, 2) if elapsed else None,
+            "statuses": dict(self.statuses),
+            "latency": _summary(all_samples),
+            "by_endpoint": {kind: _summary(samples) for kind, samples in self.latencies.items()},
+        }
+
+
+def _summary(samples) -> dict:
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 1),
+        "p90_ms": round(percentile(samples, 90) * 1000, 1),
+        "p99_ms": round(percentile(samples, 99) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1) if samples else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the API at fixed concurrency and report tail latency")
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL (ignored with --spawn)")
+    parser.add_argument("--scenario", choices=["ask", "analyze", "documents", "overview", "mixed"], default="ask")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run (0 = until --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests (0 = no cap)")
+    parser.add_argument("--pdf", default=None, help="PDF to upload in analyze scenarios (default: synthetic)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--spawn", action="store_true", help="Start a mock Ollama and the API locally")
+    parser.add_argument("--backend", default="json", choices=["json", "sqlite"])
+    parser.add_argument("--ollama-latency", default="fixed:0.2")
+    parser.add_argument("--tokens-per-sec", type=float, default=30.0)
+    parser.add_argument("--ollama-slots", type=int, default=2, help="Concurrent generations the mock allows")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(args.seed)
+    work_dir = tempfile.mkdtemp(prefix="paper-load-")
+    mock = proc = None
+    try:
+        pdf_path = args.pdf
+        if not pdf_path:
+            pdf_path = os.path.join(work_dir, "load.pdf")
+            write_pdf(pdf_path, corpus.paper(4, 400))
+
+        base_url = args.url
+        if args.spawn:
+            mock = MockOllamaServer(latency=args.ollama_latency, tokens_per_sec=args.tokens_per_sec,
+                                    slots=args.ollama_slots, error_rate=args.error_rate, seed=args.seed).start()
+            proc, base_url = start_api(work_dir, mock.url, args.backend)
+            print(f"🧪 Mock Ollama at {mock.url}, API at {base_url}", file=sys.stderr)
+
+        generator = LoadGenerator(base_url, args.scenario, pdf_path, corpus, args.seed)
+        report = generator.run(args.concurrency, args.duration, args.requests)
+        if mock:
+            report["mock_ollama"] = dict(mock.stats)
+        print(json.dumps(report, indent=2))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=30)
+        if mock:
+            mock.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
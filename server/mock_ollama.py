@@ -0,0 +1,217 @@
+"""Local stand-in for the Ollama API, for load testing without a GPU.
+
+    python mock_ollama.py --port 11434 --latency lognormal:-1.5,0.5 --tokens-per-sec 40 --error-rate 0.02
+    OLLAMA_BASE_URL=http://localhost:11434 python run.py
+
+Implements ``/api/tags``, ``/api/version`` and ``/api/generate``, streaming and
+non-streaming. The latency distribution models prompt evaluation (time to
+first token). ``--tokens-per-sec`` paces generation, and ``--slots`` caps
+concurrent generations the way ``OLLAMA_NUM_PARALLEL`` does.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILLER = ("The paper proposes a method that improves results on the benchmark while reducing "
+          "computational cost and the authors discuss limitations and future work in detail").split()
+
+
+class LatencyDistribution:
+    """Parses ``fixed:S``, ``uniform:LO,HI`` or ``lognormal:MU,SIGMA`` (seconds)"""
+
+    def __init__(self, spec: str, rng: random.Random):
+        self.spec = spec
+        self.rng = rng
+        kind, _, params = spec.partition(":")
+        values = [float(v) for v in params.split(",")] if params else []
+        if kind == "fixed":
+            self._sample = lambda: values[0] if values else 0.0
+        elif kind == "uniform":
+            self._sample = lambda: rng.uniform(values[0], values[1])
+        elif kind == "lognormal":
+            self._sample = lambda: rng.lognormvariate(values[0], values[1])
+        else:
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self) -> float:
+        return max(0.0, self._sample())
+
+
+class MockOllamaServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, model: str = "llama3",
+                 latency: str = "fixed:0", tokens_per_sec: float = 0.0, max_tokens: int = 64,
+                 error_rate: float = 0.0, error_mode: str = "http", slots: int = 0, seed: int = None):
+        self.model = model
+        self.rng = random.Random(seed)
+        self.latency = LatencyDistribution(latency, self.rng)
+        self.tokens_per_sec = tokens_per_sec
+        self.max_tokens = max_tokens
+        self.error_rate = error_rate
+        self.error_mode = error_mode
+        self.slots = threading.BoundedSemaphore(slots) if slots else None
+        self.stats = {"requests": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0}
+        self._stats_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def _track(self, delta: int):
+        with self._stats_lock:
+            self.stats["in_flight"] += delta
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+            if delta > 0:
+                self.stats["requests"] += 1
+
+    def _tokens(self, payload: dict):
+        limit = payload.get("options", {}).get("num_predict") or self.max_tokens
+        count = max(1, min(int(limit), self.max_tokens))
+        return [(" " if i else "") + FILLER[i % len(FILLER)] for i in range(count)]
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, body: dict):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json(200, {"models": [{"name": mock.model, "model": mock.model, "size": 0}]})
+                elif self.path == "/api/version":
+                    self._send_json(200, {"version": "mock"})
+                elif self.path == "/stats":
+                    self._send_json(200, dict(mock.stats))
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                if self.path != "/api/generate":
+                    self._send_json(404, {"error": "not found"})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+
+                if mock.slots:
+                    mock.slots.acquire()
+                mock._track(1)
+                try:
+                    self._generate(payload)
+                finally:
+                    mock._track(-1)
+                    if mock.slots:
+                        mock.slots.release()
+
+            def _generate(self, payload: dict):
+                start = time.perf_counter()
+                fail = mock.rng.random() < mock.error_rate
+                if fail and mock.error_mode == "http":
+                    with mock._stats_lock:
+                        mock.stats["errors"] += 1
+                    self._send_json(500, {"error": "injected failure"})
+                    return
+
+                time.sleep(mock.latency.sample())
+                tokens = mock._tokens(payload)
+                per_token = 1.0 / mock.tokens_per_sec if mock.tokens_per_sec else 0.0
+                created_at = datetime.now(timezone.utc).isoformat()
+
+                if not payload.get("stream", True):
+                    time.sleep(per_token * len(tokens))
+                    self._send_json(200, {
+                        "model": payload.get("model", mock.model), "created_at": created_at,
+                        "response": "".join(tokens), "done": True,
+                        "total_duration": int((time.perf_counter() - start) * 1e9),
+                        "eval_count": len(tokens),
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                # Fail roughly halfway through the stream in "stream" error mode
+                fail_at = len(tokens) // 2 if fail else None
+                for i, token in enumerate(tokens):
+                    if i == fail_at:
+                        with mock._stats_lock:
+                            mock.stats["errors"] += 1
+                        self._chunk({"error": "injected failure mid-stream"})
+                        break
+                    if per_token:
+                        time.sleep(per_token)
+                    self._chunk({"model": payload.get("model", mock.model), "created_at": created_at,
+                                 "response": token, "done": False})
+                else:
+                    self._chunk({"model": payload.get("model", mock.model), "created_at": created_at,
+                                 "response": "", "done": True,
+                                 "total_duration": int((time.perf_counter() - start) * 1e9),
+                                 "eval_count": len(tokens)})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, message: dict):
+                data = (json.dumps(message) + "\n").encode()
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Ollama server for offline load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--model", default="llama3")
+    parser.add_argument("--latency", default="fixed:0.2",
+                        help="Time to first token: fixed:S | uniform:LO,HI | lognormal:MU,SIGMA")
+    parser.add_argument("--tokens-per-sec", type=float, default=30.0, help="0 = as fast as possible")
+    parser.add_argument("--max-tokens", type=int, default=64, help="Cap on generated tokens per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-mode", choices=["http", "stream"], default="http",
+                        help="Fail with HTTP 500 up front, or abort mid-stream")
+    parser.add_argument("--slots", type=int, default=0, help="Max concurrent generations (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = MockOllamaServer(args.host, args.port, args.model, args.latency, args.tokens_per_sec,
+                              args.max_tokens, args.error_rate, args.error_mode, args.slots, args.seed)
+    print(f"🧪 Mock Ollama listening on {server.url} (latency={args.latency}, "
+          f"{args.tokens_per_sec} tok/s, error_rate={args.error_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
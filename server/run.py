@@ -1,4 +1,5 @@
-﻿import uvicorn
+﻿import os
+import uvicorn
 from app.main import app
 
 if __name__ == "__main__":
@@ -10,10 +11,16 @@ if __name__ == "__main__":
     print("📝 No Project ID Required")
     print("\nPress CTRL+C to stop the server\n")
     
+    # The document store is safe to share between processes, so API_WORKERS > 1
+    # runs several workers (auto-reload only works with a single worker).
+    # LLM_MAX_IN_FLIGHT stays a server-wide limit: workers share slot files.
+    workers = int(os.getenv("API_WORKERS", "1"))
+    
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        reload=workers == 1,
+        workers=workers,
         access_log=True
     )
\ No newline at end of file
@@ -0,0 +1,232 @@
+"""Export and restore point-in-time snapshots of the document store.
+
+    python snapshot.py export corpus.rpsnap
+    python snapshot.py verify corpus.rpsnap
+    python snapshot.py restore corpus.rpsnap --storage-path data/vector_store
+
+A snapshot is one checksummed archive (see app/archive.py) holding the
+document store, its lexical index and every other shared store in the
+storage directory: near-duplicate signatures, vectors, summaries, paper
+analyses, citations and tables. Export never holds a lock while copying.
+JSON stores are read through handles opened at one instant, and the SQLite
+database is copied with the online backup API, so the server keeps
+accepting uploads during an export. Restore copies sections out of the
+mapped archive, and lifts restored generations above the ones they
+replace, so caches and ETags keyed on generations never see one reused. For the JSON backend the lexical index comes from stored
+postings and is not rebuilt from text, so a new replica starts serving as
+soon as the files are in place.
+"""
+import os
+import sys
+import json
+import glob
+import shutil
+import sqlite3
+import argparse
+import tempfile
+
+from dotenv import load_dotenv
+
+from app.archive import ArchiveReader, ArchiveWriter, ArchiveError
+from app.rag_system import RAGSystem, LEXICAL_SNAPSHOT_FILE
+from app.shared_store import install_store_files, open_store_files
+
+load_dotenv()
+
+SQLITE_DB = "documents.db"
+
+
+def store_names(storage_path: str):
+    """Shared stores present in a storage directory (each has a .lock file)"""
+    return sorted(os.path.basename(path)[:-len(".lock")]
+                  for path in glob.glob(os.path.join(storage_path, "*.lock")))
+
+
+def _copy_store_files(storage_path: str, name: str, destination: str):
+    """Point-in-time copy of one shared store into another directory"""
+    with open_store_files(storage_path, name) as (snapshot, journal, journal_length):
+        if snapshot is not None:
+            with open(os.path.join(destination, f"{name}.json"), "wb") as out:
+                shutil.copyfileobj(snapshot, out)
+        if journal is not None:
+            with open(os.path.join(destination, f"{name}.journal"), "wb") as out:
+                out.write(journal.read(journal_length))
+
+
+def _export_json_corpus(storage_path: str, archive: ArchiveWriter, work_dir: str):
+    """Documents plus lexical index of the JSON backend, from a private copy of the store"""
+    _copy_store_files(storage_path, "metadata", work_dir)
+    corpus = RAGSystem(work_dir)
+    corpus.store.compact()
+    with open(os.path.join(work_dir, "metadata.json"), "rb") as f:
+        archive.add_stream("store/metadata.json", f)
+    archive.add_group("lexical", corpus.lexical.to_arrays())
+    return corpus.generation, corpus.count_documents()
+
+
+def _export_sqlite_corpus(storage_path: str, archive: ArchiveWriter, work_dir: str):
+    """The SQLite database (documents and FTS5 index) via the online backup API"""
+    copy_path = os.path.join(work_dir, SQLITE_DB)
+    source = sqlite3.connect(os.path.join(storage_path, SQLITE_DB), timeout=30)
+    copy = sqlite3.connect(copy_path)
+    try:
+        # One step is one read transaction: a consistent copy, and in WAL mode writers carry on
+        source.backup(copy)
+        copy.execute("PRAGMA journal_mode=DELETE")
+        generation = copy.execute("SELECT value FROM store_meta WHERE key = 'generation'").fetchone()[0]
+        documents = copy.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+    finally:
+        copy.close()
+        source.close()
+    with open(copy_path, "rb") as f:
+        archive.add_stream(f"sqlite/{SQLITE_DB}", f)
+    return generation, documents
+
+
+def export_snapshot(storage_path: str, output: str, backend: str) -> dict:
+    work_dir = tempfile.mkdtemp(prefix="snapshot-")
+    try:
+        with ArchiveWriter(output) as archive:
+            if backend == "sqlite":
+                generation, documents = _export_sqlite_corpus(storage_path, archive, work_dir)
+            else:
+                generation, documents = _export_json_corpus(storage_path, archive, work_dir)
+
+            stores = [name for name in store_names(storage_path) if name != "metadata"]
+            for name in stores:
+                with open_store_files(storage_path, name) as (snapshot, journal, journal_length):
+                    if snapshot is not None:
+                        archive.add_stream(f"store/{name}.json", snapshot)
+                    if journal is not None:
+                        archive.add_stream(f"store/{name}.journal", journal, journal_length)
+            archive.meta.update(backend=backend, generation=generation, documents=documents, stores=stores)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {"snapshot": output, "backend": backend, "generation": generation, "documents": documents,
+            "stores": stores, "bytes": os.path.getsize(output)}
+
+
+def _has_corpus(storage_path: str) -> bool:
+    return any(os.path.exists(os.path.join(storage_path, name)) and os.path.getsize(os.path.join(storage_path, name))
+               for name in ("metadata.json", "metadata.journal", SQLITE_DB))
+
+
+def _sqlite_generation(db_path: str) -> int:
+    """Generation of an existing database (0 if there is none)"""
+    if not os.path.exists(db_path):
+        return 0
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        row = conn.execute("SELECT value FROM store_meta WHERE key = 'generation'").fetchone()
+        return row[0] if row else 0
+    except sqlite3.DatabaseError:
+        return 0
+    finally:
+        conn.close()
+
+
+def _rebase_sqlite_generation(db_path: str, current: int) -> int:
+    """Lift a restored database's generation above the one it replaces (see install_store_files)"""
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            if current:
+                conn.execute("UPDATE store_meta SET value = value + ? WHERE key = 'generation'", (current + 1,))
+            return conn.execute("SELECT value FROM store_meta WHERE key = 'generation'").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _install_sqlite(restored_path: str, db_path: str):
+    """Copy a restored database into the live one through SQLite itself.
+
+    Servers may hold the live file open, so it is never unlinked or
+    replaced, and its -wal/-shm are left to SQLite. The backup API writes
+    the pages under the database's own write lock (waiting out writers) and
+    running connections see the new contents on their next transaction.
+    """
+    restored = sqlite3.connect(restored_path)
+    live = sqlite3.connect(db_path, timeout=30)
+    try:
+        restored.backup(live)
+        live.execute("PRAGMA journal_mode=WAL")
+    finally:
+        live.close()
+        restored.close()
+    os.remove(restored_path)
+
+
+def restore_snapshot(source: str, storage_path: str, force: bool = False) -> dict:
+    """Verify an archive and install its contents into storage_path"""
+    with ArchiveReader(source) as archive:
+        archive.verify()
+        if _has_corpus(storage_path) and not force:
+            raise ValueError(f"{storage_path} already holds documents; pass --force to replace them")
+        os.makedirs(storage_path, exist_ok=True)
+        manifest = archive.manifest
+
+        def section_writer(name):
+            if name not in archive:
+                return None
+            return lambda f: archive.copy_to(name, f)
+
+        if manifest["backend"] == "sqlite":
+            db_path = os.path.join(storage_path, SQLITE_DB)
+            with open(db_path + ".tmp", "wb") as f:
+                archive.copy_to(f"sqlite/{SQLITE_DB}", f)
+                f.flush()
+                os.fsync(f.fileno())
+            generation = _rebase_sqlite_generation(db_path + ".tmp", _sqlite_generation(db_path))
+            _install_sqlite(db_path + ".tmp", db_path)
+        else:
+            def write_index(generation):
+                # The index goes in first, so a worker that sees the new metadata finds a matching index
+                with ArchiveWriter(os.path.join(storage_path, LEXICAL_SNAPSHOT_FILE)) as index:
+                    index.add_group("lexical", archive.group("lexical"))
+                    index.meta.update(generation=generation)
+
+            generation = install_store_files(storage_path, "metadata", section_writer("store/metadata.json"),
+                                             before_swap=write_index)
+
+        for name in manifest["stores"]:
+            install_store_files(storage_path, name,
+                                section_writer(f"store/{name}.json") or (lambda f: f.write(b"{}")),
+                                section_writer(f"store/{name}.journal"))
+    return {"restored": source, "storage_path": storage_path, "generation": generation,
+            "snapshot_generation": manifest["generation"],
+            **{key: manifest[key] for key in ("backend", "documents", "stores", "created")}}
+
+
+def verify_snapshot(source: str) -> dict:
+    with ArchiveReader(source) as archive:
+        archive.verify()
+        manifest = archive.manifest
+    return {"snapshot": source, "ok": True, "sections": len(manifest["sections"]),
+            **{key: manifest[key] for key in ("backend", "generation", "documents", "stores", "created")}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot export/restore for replica bootstrap")
+    parser.add_argument("command", choices=["export", "restore", "verify"])
+    parser.add_argument("archive", help="Snapshot file to write (export) or read (restore, verify)")
+    parser.add_argument("--backend", default=os.getenv("RAG_BACKEND", "json").lower(),
+                        choices=["json", "sqlite"], help="Document store backend (export)")
+    parser.add_argument("--storage-path", default="data/vector_store")
+    parser.add_argument("--force", action="store_true", help="Restore over an existing corpus")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "export":
+            report = export_snapshot(args.storage_path, args.archive, args.backend)
+        elif args.command == "restore":
+            report = restore_snapshot(args.archive, args.storage_path, args.force)
+        else:
+            report = verify_snapshot(args.archive)
+    except (ArchiveError, ValueError, FileNotFoundError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()